@@ -0,0 +1,89 @@
+"""
+Compare `Model.from_dict` with the compiled decoders of `leakix.fast_decode` and with a field projection.
+
+    python benchmarks/bench_decode.py [--count N]
+"""
+
+import argparse
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+from l9format import l9format
+
+from leakix.fast_decode import decode_aggregation, decode_event
+from leakix.projection import Projection
+
+FIELDS = ["ip", "port", "host", "event_source", "time", "geoip.country_name"]
+
+HOST_FIXTURE = (
+    Path(__file__).parent.parent
+    / "tests"
+    / "results"
+    / "host"
+    / "success"
+    / "78.47.222.185.json"
+)
+
+
+def make_aggregation(events: list[dict]) -> dict:
+    return {
+        "summary": None,
+        "ip": events[0]["ip"],
+        "resource_id": events[0]["ip"],
+        "open_ports": sorted({event["port"] for event in events}),
+        "leak_count": 0,
+        "leak_event_count": 0,
+        "events": events,
+        "plugins": [],
+        "geoip": events[0]["geoip"],
+        "network": events[0]["network"],
+        "creation_date": "2021-11-21T21:46:52Z",
+        "update_date": "2021-11-22T21:46:52Z",
+        "fresh": False,
+    }
+
+
+def measure(decode: Callable[[Any], Any], payloads: list[dict]) -> float:
+    start = time.perf_counter()
+    for payload in payloads:
+        decode(payload)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=500)
+    args = parser.parse_args()
+
+    with open(HOST_FIXTURE) as f:
+        events = json.load(f)["Services"]
+    cases = [
+        ("L9Event", l9format.L9Event.from_dict, decode_event, events),
+        (
+            "L9Event fields",
+            l9format.L9Event.from_dict,
+            Projection(l9format.L9Event, FIELDS),
+            events,
+        ),
+        (
+            "L9Aggregation",
+            l9format.L9Aggregation.from_dict,
+            decode_aggregation,
+            [make_aggregation(events)],
+        ),
+    ]
+    for name, reference, compiled, samples in cases:
+        payloads = [samples[i % len(samples)] for i in range(args.count)]
+        slow = measure(reference, payloads)
+        fast = measure(compiled, payloads)
+        print(
+            f"{name:<15} from_dict {args.count / slow:>10.0f}/s"
+            f"  compiled {args.count / fast:>10.0f}/s  x{slow / fast:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
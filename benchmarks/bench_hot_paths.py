@@ -0,0 +1,290 @@
+"""
+Micro-benchmarks of the parsing and serialization hot paths, on synthetic payloads (see `payloads.py`) so they
+run offline.
+
+    python benchmarks/bench_hot_paths.py [--lines N] [--pages N] [--repeat R] [--filter TEXT]
+                                         [--json-backend NAME] [--save FILE] [--compare FILE]
+
+Each case reports its throughput (best of `--repeat` runs) and, from one more run under tracemalloc, the peak
+memory it allocated and what was still allocated at the end. The `parse` cases call the response parsers of
+the clients on pre-loaded payloads, so they measure decoding alone. The `client` cases go through the public
+client API against a mocked server (requests_mock), and include the cost of the HTTP stack. Bulk cases stream an
+NDJSON body of `--lines` lines; try `--lines 1000000` to check that their memory stays flat.
+
+To compare two commits, `--save` the results of one and `--compare` the other against them: each case then
+shows its speedup over the saved run. The `leakix` package next to the script is measured, so copy
+`benchmarks/` into a checkout of the other commit to run it there. The cases fall back to what older versions
+offer; a case whose method or option does not exist there is reported as n/a.
+"""
+
+import argparse
+import dataclasses
+import gc
+import inspect
+import itertools
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable, Iterable
+from pathlib import Path
+from typing import Any
+
+# Measure the checkout this script belongs to, and make `benchmarks` importable from any directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import requests_mock  # noqa: E402
+from l9format import l9format  # noqa: E402
+
+import leakix  # noqa: E402
+from benchmarks.payloads import (  # noqa: E402
+    NDJSONBody,
+    host_result,
+    make_queries,
+    ndjson_lines,
+    search_page,
+)
+from leakix import Client, HostResult, Scope, SuccessResponse  # noqa: E402
+from leakix.base import BaseClient  # noqa: E402
+from leakix.query import serialize_queries  # noqa: E402
+
+try:
+    from leakix.fast_decode import decode_event
+except ImportError:
+    decode_event = l9format.L9Event.from_dict
+
+FIELDS = ["ip", "port", "host", "event_source", "time", "geoip.country_name"]
+# Distinct search pages and host results the cases cycle through.
+DISTINCT = 32
+
+
+@dataclasses.dataclass
+class Case:
+    name: str
+    unit: str
+    # Does the work once and returns the number of units processed, None when the feature is missing.
+    run: Callable[[], int] | None
+
+
+@dataclasses.dataclass
+class Result:
+    ops: float
+    unit: str
+    peak: int
+    retained: int
+
+
+def accepts(method: Callable[..., Any], *names: str) -> bool:
+    """Whether `method` takes all the keyword arguments `names`."""
+    return set(names) <= inspect.signature(method).parameters.keys()
+
+
+def serve(mocker: requests_mock.Mocker, args: argparse.Namespace) -> None:
+    """Answer the search, host and bulk endpoints with the synthetic payloads."""
+    pages = itertools.cycle(
+        [json.dumps(search_page(seed=seed)).encode() for seed in range(DISTINCT)]
+    )
+    hosts = itertools.cycle(
+        [json.dumps(host_result(seed=seed)).encode() for seed in range(DISTINCT)]
+    )
+    services = NDJSONBody(ndjson_lines("service"), args.lines)
+    aggregations = NDJSONBody(ndjson_lines("aggregation"), args.lines)
+    mocker.get(re.compile(r"/search\b"), content=lambda r, c: next(pages))
+    mocker.get(re.compile(r"/host/"), content=lambda r, c: next(hosts))
+    mocker.get(re.compile(r"/bulk/service\b"), body=lambda r, c: services.open())
+    mocker.get(re.compile(r"/bulk/search\b"), body=lambda r, c: aggregations.open())
+
+
+def count(records: Iterable[Any]) -> int:
+    return sum(1 for _ in records)
+
+
+def make_cases(args: argparse.Namespace) -> list[Case]:
+    options = {}
+    if accepts(Client, "json_decoder"):
+        options["json_decoder"] = args.json_backend
+    client = Client(api_key="bench", **options)
+    queries = make_queries()
+    pages = [search_page(seed=seed) for seed in range(DISTINCT)]
+    hosts = [host_result(seed=seed) for seed in range(DISTINCT)]
+    events = [decode_event(raw) for page in pages for raw in page]
+
+    def serialize() -> int:
+        for _ in range(args.pages * 20):
+            serialize_queries(queries)
+        return args.pages * 20
+
+    def parse_pages(*decoder: Callable[[Any], Any]) -> Callable[[], int]:
+        def run() -> int:
+            for i in range(args.pages):
+                response = SuccessResponse(None, pages[i % DISTINCT], 200)
+                BaseClient._parse_events(response, *decoder)
+            return args.pages
+
+        return run
+
+    def parse_pages_fields() -> Callable[[], int] | None:
+        if not hasattr(BaseClient, "_decoder"):
+            return None
+        return parse_pages(BaseClient._decoder(l9format.L9Event, FIELDS))
+
+    def parse_hosts() -> int:
+        for i in range(args.pages):
+            BaseClient._parse_host_result(
+                SuccessResponse(None, hosts[i % DISTINCT], 200)
+            )
+        return args.pages
+
+    def search(**kwargs: Any) -> Callable[[], int] | None:
+        if not accepts(client.search, *kwargs):
+            return None
+
+        def run() -> int:
+            for _ in range(args.pages):
+                client.search("*", scope=Scope.SERVICE, **kwargs).json()
+            return args.pages
+
+        return run
+
+    def get_host() -> int:
+        for _ in range(args.pages):
+            client.get_host("78.47.222.185").json()
+        return args.pages
+
+    def bulk_service(**kwargs: Any) -> Callable[[], int] | None:
+        if hasattr(client, "bulk_service_stream"):
+            if not accepts(client.bulk_service_stream, *kwargs):
+                return None
+            return lambda: count(client.bulk_service_stream(queries, **kwargs))
+        if kwargs:
+            return None
+        # Before bulk_service_stream, the list method was the only way to read services.
+        return lambda: len(client.bulk_service(queries).json())
+
+    def bulk_search() -> int:
+        return count(client.bulk_export_stream(queries))
+
+    def to_dict() -> int:
+        for event in events:
+            event.to_dict()
+        return len(events)
+
+    def round_trip() -> int:
+        for event in events:
+            decode_event(event.to_dict())
+        return len(events)
+
+    pipeline = getattr(leakix, "PipelineOptions", None)
+    return [
+        Case("serialize_queries", "call", serialize),
+        Case("parse search page", "page", parse_pages()),
+        Case("parse search page fields", "page", parse_pages_fields()),
+        Case("parse host result", "host", parse_hosts),
+        Case("client search page", "page", search()),
+        Case("client search fields", "page", search(fields=FIELDS)),
+        Case("client host result", "host", get_host),
+        Case("client bulk service", "line", bulk_service()),
+        Case("client bulk service fields", "line", bulk_service(fields=FIELDS)),
+        Case("client bulk service raw", "line", bulk_service(raw=True)),
+        Case(
+            "client bulk service pipelined",
+            "line",
+            bulk_service(pipeline=pipeline()) if pipeline is not None else None,
+        ),
+        Case("client bulk search", "line", bulk_search),
+        Case("event to_dict", "event", to_dict),
+        Case("event round trip", "event", round_trip),
+    ]
+
+
+def validate() -> None:
+    """Check that the synthetic payloads are accepted by the reference decoders of the models."""
+    for raw in search_page():
+        l9format.L9Event.from_dict(raw)
+    HostResult.from_dict(host_result())
+    l9format.L9Aggregation.from_dict(json.loads(ndjson_lines("aggregation")[0]))
+
+
+def measure(
+    run: Callable[[], int], unit: str, repeat: int, reset: Callable[[], None]
+) -> Result:
+    """`reset` is called before each run, to drop the requests recorded by the mocked server."""
+    best = float("inf")
+    units = 0
+    for _ in range(repeat):
+        reset()
+        gc.collect()
+        start = time.perf_counter()
+        units = run()
+        best = min(best, time.perf_counter() - start)
+    reset()
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    run()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Result(units / best, unit, peak - base, current - base)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--lines", type=int, default=100_000, help="lines of the bulk bodies"
+    )
+    parser.add_argument(
+        "--pages", type=int, default=1000, help="search pages and host results parsed"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--filter", default="", help="only run the cases whose name contains this"
+    )
+    parser.add_argument("--json-backend", default="auto")
+    parser.add_argument("--save", type=Path, help="write the results to this JSON file")
+    parser.add_argument(
+        "--compare", type=Path, help="show the speedup over results saved with --save"
+    )
+    args = parser.parse_args()
+
+    validate()
+    baseline = {}
+    if args.compare is not None:
+        baseline = json.loads(args.compare.read_text())["results"]
+    results = {}
+    with requests_mock.Mocker() as mocker:
+        serve(mocker, args)
+        for case in make_cases(args):
+            if args.filter not in case.name:
+                continue
+            if case.run is None:
+                print(f"{case.name:<30} {'n/a':>12}", flush=True)
+                continue
+            result = measure(case.run, case.unit, args.repeat, mocker.reset_mock)
+            results[case.name] = dataclasses.asdict(result)
+            line = (
+                f"{case.name:<30} {result.ops:>12.0f} {result.unit}/s"
+                f"  peak {result.peak / 1024:>9.0f} KiB  retained {result.retained / 1024:>7.0f} KiB"
+            )
+            if case.name in baseline:
+                line += f"  x{result.ops / baseline[case.name]['ops']:.2f}"
+            print(line, flush=True)
+    if args.save is not None:
+        args.save.write_text(
+            json.dumps(
+                {
+                    "python": platform.python_version(),
+                    "platform": sys.platform,
+                    "args": {k: str(v) for k, v in vars(args).items()},
+                    "results": results,
+                },
+                indent=2,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Synthetic but realistic API payloads for the benchmarks, generated offline from the host fixture of the tests.
+
+Every generator takes a seed, so two runs (or two commits) measure exactly the same input. Events vary in ip,
+port, host, plugin, country, time and summary length, and leak events carry a filled `leak` section, so
+decoding does not hit the same values over and over.
+"""
+
+import copy
+import io
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from leakix.field import (
+    CountryField,
+    IPField,
+    Operator,
+    PluginField,
+    PortField,
+    TimeField,
+)
+from leakix.plugin import Plugin
+from leakix.query import AbstractQuery, MustNotQuery, MustQuery, RawQuery, ShouldQuery
+
+HOST_FIXTURE = (
+    Path(__file__).parent.parent
+    / "tests"
+    / "results"
+    / "host"
+    / "success"
+    / "78.47.222.185.json"
+)
+
+_COUNTRIES = [
+    ("Germany", "DE", "Europe"),
+    ("France", "FR", "Europe"),
+    ("United States", "US", "North America"),
+    ("Japan", "JP", "Asia"),
+    ("Brazil", "BR", "South America"),
+]
+_PLUGINS = [
+    "HttpPlugin",
+    "GitConfigHttpPlugin",
+    "DotEnvConfigPlugin",
+    "ElasticSearchOpenPlugin",
+    "MongoOpenPlugin",
+    "RedisOpenPlugin",
+]
+_PORTS = [80, 443, 8080, 9200, 27017, 6379]
+# Number of distinct events generated; larger inputs reuse them, in a seeded order.
+_DISTINCT = 512
+# Lines after which the fake bulk bodies repeat.
+_PERIOD = 2048
+
+
+def _template() -> dict[str, Any]:
+    with open(HOST_FIXTURE) as f:
+        return dict(json.load(f)["Services"][0])
+
+
+def make_event(rng: random.Random, template: dict[str, Any]) -> dict[str, Any]:
+    """One raw event, a service or (one time in four) a leak, derived from `template`."""
+    event = copy.deepcopy(template)
+    ip = f"{rng.randint(1, 223)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randint(1, 254)}"
+    country, iso, continent = rng.choice(_COUNTRIES)
+    event.update(
+        ip=ip,
+        port=str(rng.choice(_PORTS)),
+        host=f"www{rng.randrange(100)}.example{rng.randrange(10000)}.com",
+        reverse=f"static.{ip}.clients.example.net",
+        event_source=rng.choice(_PLUGINS),
+        summary="HTTP/1.1 200 OK\nServer: nginx\n" * rng.randint(1, 20),
+        time=f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        f"T{rng.randrange(24):02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}Z",
+    )
+    event["geoip"].update(
+        country_name=country, country_iso_code=iso, continent_name=continent
+    )
+    if rng.random() < 0.25:
+        event["event_type"] = "leak"
+        event["leak"] = {
+            "stage": "open",
+            "type": "configuration",
+            "severity": rng.choice(["low", "medium", "high", "critical"]),
+            "dataset": {
+                "rows": rng.randrange(10**6),
+                "files": rng.randrange(100),
+                "size": rng.randrange(10**9),
+                "collections": rng.randrange(50),
+                "infected": rng.random() < 0.1,
+                "ransom_notes": None,
+            },
+        }
+    return event
+
+
+def make_events(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    template = _template()
+    return [make_event(rng, template) for _ in range(count)]
+
+
+def make_aggregation(events: list[dict[str, Any]]) -> dict[str, Any]:
+    """A raw aggregation (one line of `/bulk/search`) grouping `events` on the ip of the first."""
+    first = events[0]
+    events = [{**event, "ip": first["ip"]} for event in events]
+    return {
+        "summary": None,
+        "ip": first["ip"],
+        "resource_id": first["ip"],
+        "open_ports": sorted({int(event["port"]) for event in events}),
+        "leak_count": sum(event["event_type"] == "leak" for event in events),
+        "leak_event_count": sum(event["event_type"] == "leak" for event in events),
+        "events": events,
+        "plugins": sorted({event["event_source"] for event in events}),
+        "geoip": first["geoip"],
+        "network": first["network"],
+        "creation_date": "2021-11-21T21:46:52Z",
+        "update_date": first["time"],
+        "fresh": False,
+    }
+
+
+def search_page(size: int = 20, seed: int = 0) -> list[dict[str, Any]]:
+    """A page of `/search` results: a JSON array of raw events."""
+    return make_events(size, seed)
+
+
+def host_result(services: int = 10, leaks: int = 5, seed: int = 0) -> dict[str, Any]:
+    """A `/host` result with `services` services and `leaks` leaks."""
+    events = make_events(services + leaks, seed)
+    for event in events[services:]:
+        if event["event_type"] != "leak":
+            event["event_type"] = "leak"
+            event["leak"] = {**event["leak"], "stage": "open", "severity": "high"}
+    return {"Services": events[:services], "Leaks": events[services:]}
+
+
+def ndjson_lines(
+    kind: str = "service", seed: int = 0, events_per_line: int = 3
+) -> list[bytes]:
+    """
+    Distinct NDJSON lines (without the newline) of a bulk export: events for `kind="service"`, aggregations of
+    `events_per_line` events for `kind="aggregation"`.
+    """
+    if kind == "service":
+        records = make_events(_DISTINCT, seed)
+    elif kind == "aggregation":
+        events = make_events(_DISTINCT * events_per_line, seed)
+        records = [
+            make_aggregation(events[i : i + events_per_line])
+            for i in range(0, len(events), events_per_line)
+        ]
+    else:
+        raise ValueError(f"Unknown kind {kind!r}, expected 'service' or 'aggregation'")
+    return [json.dumps(record).encode() for record in records]
+
+
+class NDJSONBody:
+    """
+    Body of a bulk export of `count` lines drawn from `lines`. The body repeats a period of `_PERIOD` lines
+    joined once: replaying it with `open` costs nothing and holds little memory, whatever the size of the
+    export.
+    """
+
+    def __init__(self, lines: list[bytes], count: int, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        period = rng.choices(lines, k=_PERIOD)
+        full, rest = divmod(count, _PERIOD)
+        self.segments = [b"".join(line + b"\n" for line in period)] * full
+        if rest:
+            self.segments.append(b"".join(line + b"\n" for line in period[:rest]))
+
+    def open(self) -> "BodyReader":
+        """A new file-like reader of the body, to serve as the body of a mocked response."""
+        return BodyReader(self.segments)
+
+
+class BodyReader(io.RawIOBase):
+    """Reads through `segments` in turn, like the socket of a response."""
+
+    def __init__(self, segments: list[bytes]) -> None:
+        self.segments = segments
+        self.index = 0
+        self.offset = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self.closed or self.index == len(self.segments):
+            return 0
+        segment = self.segments[self.index]
+        size = min(len(buffer), len(segment) - self.offset)
+        buffer[:size] = segment[self.offset : self.offset + size]
+        self.offset += size
+        if self.offset == len(segment):
+            self.index += 1
+            self.offset = 0
+        return size
+
+
+def make_queries() -> list[AbstractQuery]:
+    """The queries of a typical filtered search."""
+    return [
+        MustQuery(PluginField(Plugin.GitConfigHttpPlugin)),
+        MustQuery(TimeField(datetime(2024, 1, 1), Operator.StrictlyGreater)),
+        MustNotQuery(CountryField("France")),
+        ShouldQuery(PortField(443)),
+        ShouldQuery(PortField(8443)),
+        MustQuery(IPField("78.46.0.0/15")),
+        RawQuery('+summary:"index of" -host:"*.example.com"'),
+    ]
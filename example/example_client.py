@@ -2,7 +2,7 @@ from datetime import datetime, timedelta
 
 import decouple
 
-from leakix import Client, Scope
+from leakix import APIError, Client, Scope
 from leakix.field import CountryField, Operator, PluginField, TimeField
 from leakix.plugin import Plugin
 from leakix.query import MustNotQuery, MustQuery, RawQuery
@@ -148,6 +148,16 @@ def example_bulk_export_stream():
             print(event.ip)
 
 
+def example_bulk_service_stream():
+    """Streaming bulk service export, raising APIError if the export fails."""
+    query = MustQuery(field=PluginField(Plugin.GitConfigHttpPlugin))
+    try:
+        for event in CLIENT.bulk_service_stream(queries=[query]):
+            print(event.ip, event.port)
+    except APIError as e:
+        print("Export failed:", e.response.status_code())
+
+
 if __name__ == "__main__":
     example_get_host_filter_plugin()
     example_get_service_filter_plugin()
@@ -165,3 +175,4 @@ if __name__ == "__main__":
     example_search_service()
     example_get_domain()
     example_bulk_export_stream()
+    example_bulk_service_stream()
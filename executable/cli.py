@@ -1,10 +1,9 @@
-import json
 from datetime import datetime
 
 import fire
 from decouple import config
 
-from leakix import Client
+from leakix import APIError, Client, NDJSONSink
 from leakix.field import Operator, UpdateDateField
 from leakix.query import MustQuery, RawQuery
 
@@ -19,7 +18,14 @@ class CLI:
         filename: str,
         before: str | None = None,
         after: str | None = None,
+        max_bytes: int | None = None,
+        fsync_every: int | None = 10_000,
     ):
+        """
+        Write the aggregations matching `query` to `filename` as NDJSON, one per line, while they are
+        downloaded. A `.gz` or `.zst` suffix compresses the file. With `max_bytes`, the export is split into
+        numbered files of about that size. If the export fails midway, the files written so far are removed.
+        """
         client = Client(api_key=API_KEY)
 
         queries = []
@@ -36,18 +42,26 @@ class CLI:
                 after_dt, operator=Operator.StrictlySmaller
             )
             queries.append(MustQuery(after_dt_field))
-        response = client.bulk_export(queries)
-        if response.is_success():
-            res = []
-            for j in response.json():
-                res.append(j.to_dict())
-            with open(filename, "w") as f:
-                f.write(json.dumps(res))
-        else:
+        try:
+            with client.bulk_export_stream(queries) as stream:
+                # Send the request first: an API error then leaves no output file behind.
+                stream.open()
+                sink = NDJSONSink(
+                    filename, max_bytes=max_bytes, fsync_every=fsync_every
+                )
+                try:
+                    sink.write_all(stream)
+                except BaseException:
+                    sink.close()
+                    for path in sink.paths:
+                        path.unlink(missing_ok=True)
+                    raise
+                sink.close()
+        except APIError as e:
             raise Exception(
                 "API error (code = %d, message = %s)"
-                % (response.status_code(), response.json())
-            )
+                % (e.response.status_code(), e.response.json())
+            ) from e
 
 
 if __name__ == "__main__":
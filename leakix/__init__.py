@@ -2,9 +2,13 @@ from importlib.metadata import version
 
 from leakix.async_client import AsyncClient as AsyncClient
 from leakix.base import HostResult as HostResult
+from leakix.base import RetryPolicy as RetryPolicy
+from leakix.cache import ResponseCache as ResponseCache
 from leakix.client import Client as Client
 from leakix.client import Scope as Scope
+from leakix.disk_cache import DiskCache as DiskCache
 from leakix.domain import L9Subdomain as L9Subdomain
+from leakix.event_store import EventStore as EventStore
 from leakix.field import (
     AgeField as AgeField,
 )
@@ -32,8 +36,12 @@ from leakix.field import (
 from leakix.field import (
     UpdateDateField as UpdateDateField,
 )
+from leakix.metrics import ClientMetrics as ClientMetrics
+from leakix.metrics import Hooks as Hooks
+from leakix.metrics import MetricsRegistry as MetricsRegistry
 from leakix.plugin import APIResult as APIResult
 from leakix.plugin import Plugin as Plugin
+from leakix.projection import Projection as Projection
 from leakix.query import (
     AbstractQuery as AbstractQuery,
 )
@@ -58,6 +66,9 @@ from leakix.query import (
 from leakix.response import (
     AbstractResponse as AbstractResponse,
 )
+from leakix.response import (
+    APIError as APIError,
+)
 from leakix.response import (
     ErrorResponse as ErrorResponse,
 )
@@ -67,6 +78,13 @@ from leakix.response import (
 from leakix.response import (
     SuccessResponse as SuccessResponse,
 )
+from leakix.sink import NDJSONSink as NDJSONSink
+from leakix.stream import BulkCursor as BulkCursor
+from leakix.stream import PipelineOptions as PipelineOptions
+from leakix.stream import ProgressOptions as ProgressOptions
+from leakix.stream import ResumeError as ResumeError
+from leakix.stream import StreamStats as StreamStats
+from leakix.watch import WatchState as WatchState
 
 __version__ = version("leakix")
 
@@ -74,8 +92,13 @@ __all__ = [
     "__version__",
     "AsyncClient",
     "Client",
+    "DiskCache",
+    "EventStore",
     "HostResult",
     "L9Subdomain",
+    "Projection",
+    "ResponseCache",
+    "RetryPolicy",
     "Scope",
     # Fields
     "AgeField",
@@ -87,6 +110,10 @@ __all__ = [
     "PortField",
     "TimeField",
     "UpdateDateField",
+    # Metrics
+    "ClientMetrics",
+    "Hooks",
+    "MetricsRegistry",
     # Plugin
     "APIResult",
     "Plugin",
@@ -100,7 +127,18 @@ __all__ = [
     "ShouldQuery",
     # Response
     "AbstractResponse",
+    "APIError",
     "ErrorResponse",
     "RateLimitResponse",
     "SuccessResponse",
+    # Sink
+    "NDJSONSink",
+    # Stream
+    "BulkCursor",
+    "PipelineOptions",
+    "ProgressOptions",
+    "ResumeError",
+    "StreamStats",
+    # Watch
+    "WatchState",
 ]
@@ -1,23 +1,60 @@
 """Async LeakIX API client using httpx."""
 
-import json
-from collections.abc import AsyncIterator
-from typing import Any, cast
+import asyncio
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable, Mapping
+from datetime import date
+from typing import Any
 
 import httpx
 from l9format import l9format
 
-from leakix.base import DEFAULT_URL, BaseClient
+from leakix.base import (
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DEFAULT_URL,
+    BaseClient,
+    RetryPolicy,
+)
+from leakix.cache import ResponseCache
 from leakix.client import Scope
+from leakix.disk_cache import CacheEntry, DiskCache, Freshness
+from leakix.fast_decode import newest_events
+from leakix.json_backend import AUTO, JSONDecoder
+from leakix.metrics import Hooks
 from leakix.query import AbstractQuery, serialize_queries
 from leakix.response import (
     AbstractResponse,
+    APIError,
     ErrorResponse,
     RateLimitResponse,
     SuccessResponse,
 )
-
-DEFAULT_TIMEOUT = 30.0
+from leakix.shard import (
+    DEFAULT_MERGE_BUFFER,
+    DEFAULT_SHARDS,
+    ShardEnd,
+    ShardMerger,
+    shard_queries,
+    shard_ranges,
+)
+from leakix.singleflight import AsyncSingleFlight
+from leakix.stream import (
+    AGGREGATIONS,
+    DEFAULT_MAX_RECONNECTS,
+    EVENTS,
+    AsyncBulkStream,
+    BulkCursor,
+    ProgressOptions,
+    RecordKind,
+)
+from leakix.watch import (
+    DEFAULT_MAX_PAGES,
+    DEFAULT_WATCH_INTERVAL,
+    Watcher,
+    WatchState,
+)
 
 
 class AsyncClient(BaseClient):
@@ -32,10 +69,30 @@ class AsyncClient(BaseClient):
         api_key: str | None = None,
         base_url: str | None = DEFAULT_URL,
         timeout: float = DEFAULT_TIMEOUT,
+        retry_policy: RetryPolicy | None = None,
+        cache: ResponseCache | None = None,
+        disk_cache: DiskCache | None = None,
+        json_decoder: str | JSONDecoder = AUTO,
+        hooks: Hooks | None = None,
     ) -> None:
-        super().__init__(api_key=api_key, base_url=base_url)
+        super().__init__(
+            api_key=api_key,
+            base_url=base_url,
+            retry_policy=retry_policy,
+            cache=cache,
+            disk_cache=disk_cache,
+            json_decoder=json_decoder,
+            hooks=hooks,
+        )
         self.timeout = timeout
         self._client: httpx.AsyncClient | None = None
+        self._background_tasks: set[asyncio.Task[None]] = set()
+        self._flight = AsyncSingleFlight()
+
+    @property
+    def coalesced_requests(self) -> int:
+        """Number of calls that were served by an identical request already in flight."""
+        return self._flight.coalesced
 
     async def _get_client(self) -> httpx.AsyncClient:
         """Get or create the HTTP client."""
@@ -59,21 +116,153 @@ class AsyncClient(BaseClient):
     async def __aexit__(self, *args: Any) -> None:
         await self.close()
 
+    async def __send(
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        stream: bool = False,
+        headers: Mapping[str, str] | None = None,
+    ) -> tuple[httpx.Response, int]:
+        """Send a GET request, retrying per the retry policy.
+
+        Returns the response and the number of retries. Streamed responses must be closed by the caller.
+        """
+        client = await self._get_client()
+        hooks = self.hooks
+        endpoint = self._endpoint(path) if hooks is not None else ""
+        if hooks is not None:
+            hooks.request_start(endpoint)
+        start = time.monotonic()
+        network = 0.0
+        retries = 0
+        pause = self._rate_limit_remaining()
+        while True:
+            if pause > 0:
+                await asyncio.sleep(pause)
+            request = client.build_request("GET", path, params=params, headers=headers)
+            sent = time.perf_counter()
+            r = await client.send(request, stream=stream)
+            network += time.perf_counter() - sent
+            delay = self._retry_delay(
+                retries, r.status_code, r.headers, time.monotonic() - start
+            )
+            self._report_attempt(endpoint, r.status_code, retries, delay)
+            if delay is None:
+                if hooks is not None:
+                    size = 0 if stream else len(r.content)
+                    hooks.request_end(endpoint, r.status_code, size, network, retries)
+                return r, retries
+            await r.aclose()
+            self._rate_limit_pause(delay)
+            pause = max(delay, self._rate_limit_remaining())
+            retries += 1
+
     async def __get(
-        self, path: str, params: dict[str, Any] | None = None
+        self,
+        path: str,
+        params: dict[str, Any] | None = None,
+        endpoint: str | None = None,
     ) -> AbstractResponse:
-        """Make a GET request and return an AbstractResponse."""
-        client = await self._get_client()
-        r = await client.get(path, params=params)
+        """
+        Make a GET request and return an AbstractResponse. Requests to a cacheable `endpoint` go through the disk
+        cache when one is configured.
+        """
+        key = None
+        entry = None
+        if endpoint is not None and self.disk_cache is not None:
+            key = self._disk_cache_key(f"{self.base_url}{path}", params)
+            entry = self.disk_cache.get(key)
+            if entry is not None:
+                freshness = self.disk_cache.freshness(endpoint, entry)
+                if freshness is Freshness.STALE:
+                    self.__revalidate(path, params, key, entry)
+                if freshness is not Freshness.EXPIRED:
+                    return self._response_from_disk_cache(entry)
+        r, retries = await self.__send(
+            path, params, headers=entry.validators() if entry else None
+        )
+        if key is not None:
+            self._disk_cache_update(key, r.status_code, r.content, r.headers)
+            if r.status_code == 304 and entry is not None:
+                return self._response_from_disk_cache(entry, retries)
         if r.status_code == 200:
-            response_json = r.json() if r.content else []
-            return SuccessResponse(response=r, response_json=response_json)
+            response_json = self._load_body(path, r.content) if r.content else []
+            return SuccessResponse(
+                response=r, response_json=response_json, retries=retries
+            )
         elif r.status_code == 429:
-            return RateLimitResponse(response=r)
+            return RateLimitResponse(response=r, retries=retries)
         elif r.status_code == 204:
-            return SuccessResponse(response=r, response_json=[])
+            return SuccessResponse(response=r, response_json=[], retries=retries)
         else:
-            return ErrorResponse(response=r, response_json=r.json())
+            return ErrorResponse(
+                response=r,
+                response_json=self._load_body(path, r.content),
+                retries=retries,
+            )
+
+    def __revalidate(
+        self, path: str, params: dict[str, Any] | None, key: str, entry: CacheEntry
+    ) -> None:
+        """Revalidate a stale disk cache entry in a background task."""
+        if not self._start_revalidation(key):
+            return
+
+        async def run() -> None:
+            try:
+                r, _ = await self.__send(path, params, headers=entry.validators())
+                self._disk_cache_update(key, r.status_code, r.content, r.headers)
+            except httpx.HTTPError:
+                pass
+            finally:
+                self._end_revalidation(key)
+
+        task = asyncio.ensure_future(run())
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def __lookup(
+        self,
+        endpoint: str,
+        path: str,
+        parse: Callable[[AbstractResponse], AbstractResponse],
+    ) -> AbstractResponse:
+        """GET an idempotent lookup endpoint, going through the response cache when enabled."""
+        cached = self._cache_get(path)
+        if cached is not None:
+            return cached
+
+        async def fetch() -> AbstractResponse:
+            response = self._timed_parse(
+                path, parse, await self.__get(path, endpoint=endpoint)
+            )
+            self._cache_set(endpoint, path, response)
+            return response
+
+        return await self._flight.do(self._cache_key(path), fetch)
+
+    async def __search_events(
+        self,
+        scope: Scope,
+        query: str,
+        page: int,
+        fields: Iterable[str] | None = None,
+    ) -> AbstractResponse:
+        """Parsed search results. Identical searches running concurrently share one request."""
+        if page < 0:
+            raise ValueError("Page argument must be a positive integer")
+        params = {"scope": scope.value, "q": query, "page": page}
+        decode = self._decoder(l9format.L9Event, fields)
+
+        async def fetch() -> AbstractResponse:
+            response = await self.__get("/search", params=params)
+            return self._timed_parse(
+                "/search", lambda r: self._parse_events(r, decode), response
+            )
+
+        return await self._flight.do(
+            (self._cache_key("/search", params), decode), fetch
+        )
 
     async def get(
         self,
@@ -91,102 +280,449 @@ class AsyncClient(BaseClient):
         )
 
     async def get_service(
-        self, queries: list[AbstractQuery] | None = None, page: int = 0
+        self,
+        queries: list[AbstractQuery] | None = None,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
-        """Shortcut for get with scope=Scope.SERVICE."""
-        return self._parse_events(
-            await self.get(Scope.SERVICE, queries=queries, page=page)
+        """Shortcut for get with scope=Scope.SERVICE, returning parsed events (or `fields` projections)."""
+        return await self.__search_events(
+            Scope.SERVICE, serialize_queries(queries), page, fields
         )
 
     async def get_leak(
-        self, queries: list[AbstractQuery] | None = None, page: int = 0
+        self,
+        queries: list[AbstractQuery] | None = None,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
-        """Shortcut for get with scope=Scope.LEAK."""
-        return self._parse_events(
-            await self.get(Scope.LEAK, queries=queries, page=page)
+        """Shortcut for get with scope=Scope.LEAK, returning parsed events (or `fields` projections)."""
+        return await self.__search_events(
+            Scope.LEAK, serialize_queries(queries), page, fields
         )
 
     async def search(
-        self, query: str, scope: Scope = Scope.LEAK, page: int = 0
+        self,
+        query: str,
+        scope: Scope = Scope.LEAK,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
         """
         Simple search using a raw query string (same syntax as the website).
+        `fields` decodes only the given fields into named tuples, see `Client.search`.
 
         Example:
             >>> await client.search("+plugin:GitConfigHttpPlugin", scope=Scope.LEAK)
         """
-        if page < 0:
+        return await self.__search_events(scope, query, page, fields)
+
+    async def aiter_search(
+        self,
+        query: str | list[AbstractQuery] | None = None,
+        scope: Scope = Scope.LEAK,
+        max_results: int | None = None,
+        prefetch: int = 1,
+        start_page: int = 0,
+        fields: Iterable[str] | None = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Async version of `Client.iter_search`. Walks the pages of a search automatically, fetching up to
+        `prefetch` pages ahead while the current one is consumed, each once the page before it came back full.
+        """
+        if start_page < 0:
             raise ValueError("Page argument must be a positive integer")
-        r = await self.__get(
-            "/search",
-            params={"scope": scope.value, "q": query, "page": page},
+        if max_results is not None and max_results <= 0:
+            return
+        q = self._search_query(query)
+        last_page = self._last_page(start_page, max_results)
+        pending: deque[asyncio.Task[AbstractResponse]] = deque()
+        next_page = start_page
+
+        def fetch() -> asyncio.Task[AbstractResponse] | None:
+            """Start requesting the next page, None past the last page needed."""
+            nonlocal next_page
+            if last_page is not None and next_page > last_page:
+                return None
+            task = asyncio.ensure_future(self.search(q, scope, next_page, fields))
+            next_page += 1
+            return task
+
+        def top_up(current_full: bool) -> None:
+            """Fetch up to `prefetch` pages ahead, each once the page before it came back full."""
+            while len(pending) < prefetch:
+                if pending:
+                    last = pending[-1]
+                    if not last.done() or last.cancelled() or last.exception():
+                        return
+                    if not self._full_page(last.result()):
+                        return
+                elif not current_full:
+                    return
+                task = fetch()
+                if task is None:
+                    return
+                pending.append(task)
+
+        count = 0
+        try:
+            first = fetch()
+            if first is not None:
+                pending.append(first)
+            while pending:
+                response = await pending.popleft()
+                if response.is_error():
+                    raise APIError(response)
+                events = response.json()
+                full_page = self._full_page(response)
+                for event in events:
+                    top_up(full_page)
+                    yield event
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+                if full_page and not pending and (task := fetch()) is not None:
+                    pending.append(task)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def watch(
+        self,
+        queries: str | list[AbstractQuery] | None = None,
+        interval: float = DEFAULT_WATCH_INTERVAL,
+        scope: Scope = Scope.LEAK,
+        state: WatchState | None = None,
+        fields: Iterable[str] | None = None,
+        max_polls: int | None = None,
+        max_pages: int = DEFAULT_MAX_PAGES,
+    ) -> AsyncIterator[Any]:
+        """Async version of `Client.watch`: poll a search and yield only the events not yielded before."""
+        if max_pages < 1:
+            raise ValueError("max_pages must be positive")
+        watcher = Watcher(
+            queries,
+            state,
+            self._decoder(l9format.L9Event, fields),
+            self.MAX_RESULTS_PER_PAGE,
         )
-        return self._parse_events(r)
+        polls = 0
+        while True:
+            watcher.start()
+            q = watcher.queries()
+            for page in range(max_pages):
+                response = await self.get(scope, q, page)
+                if response.is_error():
+                    raise APIError(response)
+                events, more = watcher.page(response.json())
+                for raw in events:
+                    yield watcher.emit(raw)
+                if not more:
+                    break
+            watcher.finish()
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                return
+            await asyncio.sleep(interval)
 
     async def get_host(self, ipv4: str) -> AbstractResponse:
         """Returns the list of services and associated leaks for a given host."""
-        return self._parse_host_result(await self.__get(f"/host/{ipv4}"))
+        return await self.__lookup("host", f"/host/{ipv4}", self._parse_host_result)
 
     async def get_domain(self, domain: str) -> AbstractResponse:
         """Returns the list of services and associated leaks for a given domain."""
-        return self._parse_host_result(await self.__get(f"/domain/{domain}"))
+        return await self.__lookup(
+            "domain", f"/domain/{domain}", self._parse_host_result
+        )
+
+    def get_hosts(
+        self, ips: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> AsyncIterator[tuple[str, AbstractResponse]]:
+        """
+        Async version of `Client.get_hosts`. At most `concurrency` lookups run at the same time, results are
+        yielded as `(ip, response)` in completion order.
+        """
+        return self.__batch(self._normalize_ips(ips), self.get_host, concurrency)
+
+    def get_domains(
+        self, domains: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> AsyncIterator[tuple[str, AbstractResponse]]:
+        """Batch version of `get_domain`, see `get_hosts`."""
+        return self.__batch(
+            self._normalize_domains(domains), self.get_domain, concurrency
+        )
+
+    def get_many_subdomains(
+        self, domains: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> AsyncIterator[tuple[str, AbstractResponse]]:
+        """Batch version of `get_subdomains`, see `get_hosts`."""
+        return self.__batch(
+            self._normalize_domains(domains), self.get_subdomains, concurrency
+        )
+
+    async def __batch(
+        self,
+        keys: list[str],
+        lookup: Callable[[str], Awaitable[AbstractResponse]],
+        concurrency: int,
+    ) -> AsyncIterator[tuple[str, AbstractResponse]]:
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
+        async def run(key: str) -> tuple[str, AbstractResponse]:
+            start = time.monotonic()
+            attempts = 0
+            while True:
+                response = await lookup(key)
+                attempts += response.retries
+                delay = self._batch_retry_delay(
+                    response, attempts, time.monotonic() - start
+                )
+                if delay is None:
+                    return key, self._with_retries(response, attempts)
+                self._rate_limit_pause(delay)
+                attempts += 1
+
+        remaining = iter(keys)
+        pending: set[asyncio.Task[tuple[str, AbstractResponse]]] = set()
+        try:
+            for key in remaining:
+                pending.add(asyncio.ensure_future(run(key)))
+                if len(pending) >= concurrency:
+                    break
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    next_key = next(remaining, None)
+                    if next_key is not None:
+                        pending.add(asyncio.ensure_future(run(next_key)))
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
 
     async def get_plugins(self) -> AbstractResponse:
         """Returns the list of plugins the authenticated user has access to."""
-        return self._parse_plugins(await self.__get("/api/plugins"))
+        return await self.__lookup("plugins", "/api/plugins", self._parse_plugins)
 
     async def get_plugin(self, name: str) -> AbstractResponse:
         """Returns the description of a plugin by its name."""
-        return self._parse_plugin(await self.__get(f"/api/plugins/{name}"))
+        return await self.__lookup("plugin", f"/api/plugins/{name}", self._parse_plugin)
 
     async def get_subdomains(self, domain: str) -> AbstractResponse:
         """Returns the list of subdomains for a given domain."""
-        return self._parse_subdomains(await self.__get(f"/api/subdomains/{domain}"))
+        return await self.__lookup(
+            "subdomains", f"/api/subdomains/{domain}", self._parse_subdomains
+        )
+
+    def __bulk_stream(
+        self,
+        path: str,
+        queries: list[AbstractQuery] | None,
+        decode: Callable[[Any], Any],
+        kind: RecordKind,
+        cursor: BulkCursor | None,
+        max_reconnects: int,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> AsyncBulkStream[Any]:
+        return AsyncBulkStream(
+            lambda q: self.__send(path, params={"q": q}, stream=True),
+            serialize_queries(queries),
+            decode,
+            self._loads,
+            kind,
+            cursor=cursor,
+            max_reconnects=max_reconnects,
+            backoff=(self.retry_policy or RetryPolicy()).backoff,
+            raw=raw,
+            hooks=self.hooks,
+            endpoint=self._endpoint(path),
+            progress=progress,
+        )
+
+    @staticmethod
+    async def __collect(stream: AsyncBulkStream[Any]) -> AbstractResponse:
+        """Read a whole bulk stream into a response, returning API errors instead of raising them."""
+        try:
+            await stream.open()
+        except APIError as e:
+            return e.response
+        records = [record async for record in stream]
+        return SuccessResponse(
+            response=stream.response, response_json=records, retries=stream.retries
+        )
 
     async def bulk_export(
-        self, queries: list[AbstractQuery] | None = None
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        raw: bool = False,
     ) -> AbstractResponse:
-        """Bulk export leaks (Pro API feature)."""
-        serialized_query = serialize_queries(queries)
-        client = await self._get_client()
-        async with client.stream(
-            "GET", "/bulk/search", params={"q": serialized_query}
-        ) as r:
-            if r.status_code == 200:
-                response_json = []
-                async for line in r.aiter_lines():
-                    if line:
-                        json_event = json.loads(line)
-                        response_json.append(
-                            l9format.L9Aggregation.from_dict(json_event)
-                        )
-                return SuccessResponse(response=r, response_json=response_json)
-            elif r.status_code == 429:
-                return RateLimitResponse(response=r)
-            elif r.status_code == 204:
-                return SuccessResponse(response=r, response_json=[])
-            else:
-                await r.aread()
-                return ErrorResponse(response=r, response_json=r.json())
+        """
+        Bulk export leaks (Pro API feature). `fields` selects a projection of `L9Aggregation`, `raw` returns
+        the undecoded NDJSON lines.
+        """
+        return await self.__collect(self.bulk_export_stream(queries, fields, raw=raw))
 
-    async def bulk_export_stream(
-        self, queries: list[AbstractQuery] | None = None
-    ) -> AsyncIterator[l9format.L9Aggregation]:
+    async def bulk_export_last_event(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        count: int = 1,
+        fields: Iterable[str] | None = None,
+    ) -> AbstractResponse:
+        """Bulk export leaks keeping the `count` newest events of each aggregation, newest first."""
+        return await self.__collect(
+            self.bulk_export_last_event_stream(queries, count, fields)
+        )
+
+    async def bulk_service(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        raw: bool = False,
+    ) -> AbstractResponse:
         """
-        Streaming version of bulk_export. Yields L9Aggregation objects one by one.
-        More memory efficient for large result sets.
+        Bulk export services (Pro API feature). `fields` selects a projection of `L9Event`, `raw` returns the
+        undecoded NDJSON lines.
         """
-        serialized_query = serialize_queries(queries)
-        client = await self._get_client()
-        async with client.stream(
-            "GET", "/bulk/search", params={"q": serialized_query}
-        ) as r:
-            if r.status_code != 200:
-                return
-            async for line in r.aiter_lines():
-                if line:
-                    json_event = json.loads(line)
-                    yield cast(
-                        l9format.L9Aggregation,
-                        l9format.L9Aggregation.from_dict(json_event),
-                    )
+        return await self.__collect(self.bulk_service_stream(queries, fields, raw=raw))
+
+    def bulk_export_stream(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> AsyncBulkStream[Any]:
+        """
+        Streaming version of bulk_export. Yields L9Aggregation objects (or projected records) one by one.
+        More memory efficient for large result sets. An `APIError` is raised when the export fails.
+        Reconnection, `cursor`, `raw` and `progress` work as for `Client.bulk_export_stream`.
+        """
+        if raw and fields is not None:
+            raise ValueError("fields cannot be combined with raw")
+        decode = self._decoder(l9format.L9Aggregation, fields)
+        return self.__bulk_stream(
+            "/bulk/search",
+            queries,
+            decode,
+            AGGREGATIONS,
+            cursor,
+            max_reconnects,
+            raw,
+            progress,
+        )
+
+    def bulk_export_last_event_stream(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        count: int = 1,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        progress: ProgressOptions | None = None,
+    ) -> AsyncBulkStream[Any]:
+        """
+        Streaming version of bulk_export_last_event, see `Client.bulk_export_last_event_stream`.
+        """
+        decode = newest_events(self._decoder(l9format.L9Aggregation, fields), count)
+        return self.__bulk_stream(
+            "/bulk/search",
+            queries,
+            decode,
+            AGGREGATIONS,
+            cursor,
+            max_reconnects,
+            progress=progress,
+        )
+
+    def bulk_service_stream(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> AsyncBulkStream[Any]:
+        """
+        Streaming version of bulk_service. Yields L9Event objects (or projected records) one by one.
+        An `APIError` is raised when the export fails. Reconnection, `cursor`, `raw` and `progress` work as for
+        `Client.bulk_export_stream`.
+        """
+        if raw and fields is not None:
+            raise ValueError("fields cannot be combined with raw")
+        decode = self._decoder(l9format.L9Event, fields)
+        return self.__bulk_stream(
+            "/bulk/service",
+            queries,
+            decode,
+            EVENTS,
+            cursor,
+            max_reconnects,
+            raw,
+            progress,
+        )
+
+    async def parallel_bulk_export(
+        self,
+        queries: list[AbstractQuery] | None,
+        start: date,
+        end: date,
+        shards: int = DEFAULT_SHARDS,
+        fields: Iterable[str] | None = None,
+        buffer: int = DEFAULT_MERGE_BUFFER,
+    ) -> AsyncIterator[Any]:
+        """
+        Async version of `Client.parallel_bulk_export`: the shards are exported by concurrent tasks and their
+        records merged, without duplicates, as they arrive.
+        """
+        ranges = shard_ranges(start, end, shards)
+        merger = ShardMerger(ranges)
+        decode = self._decoder(l9format.L9Aggregation, fields)
+        streams = [
+            self.__bulk_stream(
+                "/bulk/search",
+                shard,
+                lambda raw: (AGGREGATIONS.position(raw), decode(raw)),
+                AGGREGATIONS,
+                None,
+                DEFAULT_MAX_RECONNECTS,
+            )
+            for shard in shard_queries(queries, ranges)
+        ]
+        merged: asyncio.Queue[Any] = asyncio.Queue(maxsize=buffer)
+
+        async def run(shard: int) -> None:
+            try:
+                async for item in streams[shard]:
+                    await merged.put(item)
+            except Exception as e:
+                await merged.put(ShardEnd(shard, e))
+            else:
+                await merged.put(ShardEnd(shard))
+
+        tasks = [asyncio.ensure_future(run(shard)) for shard in range(len(streams))]
+        try:
+            remaining = len(streams)
+            while remaining:
+                item = await merged.get()
+                if isinstance(item, ShardEnd):
+                    if item.error is not None:
+                        raise item.error
+                    remaining -= 1
+                    continue
+                position, record = item
+                if merger.accept(position):
+                    yield record
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for stream in streams:
+                await stream.aclose()
@@ -1,17 +1,50 @@
 """Shared logic between sync and async LeakIX clients."""
 
+import copy
 import dataclasses
+import hashlib
+import ipaddress
+import random
+import re
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable, Mapping
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
 from importlib.metadata import version
 from typing import Any, cast
+from urllib.parse import urlencode
 
 from l9format import l9format
 from l9format.l9format import Model
 
+from leakix.cache import ResponseCache
+from leakix.disk_cache import CacheEntry, DiskCache
 from leakix.domain import L9Subdomain
+from leakix.fast_decode import compile_decoder, decode_event
+from leakix.json_backend import AUTO, JSONDecoder, get_decoder
+from leakix.metrics import Hooks, endpoint_name
 from leakix.plugin import APIResult
-from leakix.response import AbstractResponse
+from leakix.projection import projection
+from leakix.query import AbstractQuery, serialize_queries
+from leakix.response import AbstractResponse, RateLimitResponse, SuccessResponse
 
 DEFAULT_URL = "https://leakix.net"
+DEFAULT_BATCH_CONCURRENCY = 8
+STREAM_CHUNK_SIZE = 64 * 1024
+# Seconds to wait for a connection or for data from the server before giving up.
+DEFAULT_TIMEOUT = 30.0
+
+_GO_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ns|us|µs|ms|s|m|h)")
+_GO_DURATION_UNITS = {
+    "ns": 1e-9,
+    "us": 1e-6,
+    "µs": 1e-6,
+    "ms": 1e-3,
+    "s": 1.0,
+    "m": 60.0,
+    "h": 3600.0,
+}
 
 
 @dataclasses.dataclass
@@ -20,6 +53,86 @@ class HostResult(Model):
     Leaks: list[l9format.L9Event] | None = None
 
 
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """
+    Extract the number of seconds to wait from the rate-limit headers of a response.
+
+    `Retry-After` can be a number of seconds or an HTTP date. LeakIX also sends `X-Limited-For` as a Go duration
+    (e.g. `1.5s` or `1m30s`). Returns None when no usable header is present.
+    """
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+        try:
+            date = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            date = None
+        if date is not None:
+            if date.tzinfo is None:
+                date = date.replace(tzinfo=UTC)
+            return max(0.0, (date - datetime.now(UTC)).total_seconds())
+    limited_for = headers.get("X-Limited-For")
+    if limited_for:
+        try:
+            return max(0.0, float(limited_for))
+        except ValueError:
+            pass
+        parts = _GO_DURATION_RE.findall(limited_for)
+        if parts:
+            return sum(float(n) * _GO_DURATION_UNITS[unit] for n, unit in parts)
+    return None
+
+
+@dataclasses.dataclass
+class RetryPolicy:
+    """
+    Retry policy for rate-limited requests, shared by `Client` and `AsyncClient`.
+
+    The delay before a retry honours the rate-limit headers sent by the API and falls back to exponential backoff
+    with full jitter (`backoff_base * 2 ** attempt`, capped at `backoff_max`). Delays taken from headers get up to
+    `jitter` (as a ratio) added so that clients limited at the same time do not retry in lockstep. Retrying stops
+    after `max_retries` retries or when the next retry would happen more than `max_total_time` seconds after the
+    first attempt.
+
+    Subclass and override `get_delay` to plug in a different strategy.
+    """
+
+    max_retries: int = 5
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+    max_total_time: float = 300.0
+    jitter: float = 0.1
+    retry_statuses: frozenset[int] = frozenset({429})
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def get_delay(
+        self,
+        attempt: int,
+        status_code: int,
+        headers: Mapping[str, str],
+        elapsed: float,
+    ) -> float | None:
+        """
+        Return the number of seconds to wait before retry number `attempt + 1`, or None to stop retrying.
+        `elapsed` is the time in seconds since the first attempt was sent.
+        """
+        if status_code not in self.retry_statuses or attempt >= self.max_retries:
+            return None
+        delay = parse_retry_after(headers)
+        if delay is None:
+            delay = self.backoff(attempt)
+        else:
+            delay += random.uniform(0, delay * self.jitter)
+        if elapsed + delay > self.max_total_time:
+            return None
+        return delay
+
+
 class BaseClient:
     """Shared initialization and response transformation logic."""
 
@@ -29,8 +142,20 @@ class BaseClient:
         self,
         api_key: str | None = None,
         base_url: str | None = DEFAULT_URL,
+        retry_policy: RetryPolicy | None = None,
+        cache: ResponseCache | None = None,
+        disk_cache: DiskCache | None = None,
+        json_decoder: str | JSONDecoder = AUTO,
+        hooks: Hooks | None = None,
     ) -> None:
         self.api_key = api_key
+        self._loads = get_decoder(json_decoder)
+        self.hooks = hooks
+        self.retry_policy = retry_policy
+        self.cache = cache
+        self.disk_cache = disk_cache
+        self._revalidating: set[str] = set()
+        self._revalidating_lock = threading.Lock()
         self.base_url = base_url if base_url else DEFAULT_URL
         self.headers: dict[str, str] = {
             "Accept": "application/json",
@@ -38,14 +163,224 @@ class BaseClient:
         }
         if api_key:
             self.headers["api-key"] = api_key
+        # Shared pause set when a rate-limited request is retried, so that
+        # concurrent requests back off together.
+        self._rate_limited_until = 0.0
+        self._rate_limit_lock = threading.Lock()
+
+    def _retry_delay(
+        self,
+        attempt: int,
+        status_code: int,
+        headers: Mapping[str, str],
+        elapsed: float,
+    ) -> float | None:
+        """Delay before retrying a request according to the retry policy, None to give up."""
+        if self.retry_policy is None:
+            return None
+        return self.retry_policy.get_delay(attempt, status_code, headers, elapsed)
+
+    def _endpoint(self, url: str) -> str:
+        """Label of a request URL (or path) for the hooks, see `endpoint_name`."""
+        if url.startswith(self.base_url):
+            url = url[len(self.base_url) :]
+        return endpoint_name(url)
+
+    def _report_attempt(
+        self, endpoint: str, status_code: int, attempt: int, delay: float | None
+    ) -> None:
+        """Tell the hooks about a rate-limited or retried attempt."""
+        if self.hooks is None:
+            return
+        if status_code == 429:
+            self.hooks.rate_limit(endpoint, delay)
+        if delay is not None:
+            self.hooks.retry(endpoint, status_code, attempt, delay)
+
+    def _load_body(self, url: str, content: bytes) -> Any:
+        """Decode a JSON response body, timed for the hooks."""
+        if self.hooks is None:
+            return self._loads(content)
+        start = time.perf_counter()
+        value = self._loads(content)
+        self.hooks.decode(
+            self._endpoint(url), len(content), time.perf_counter() - start
+        )
+        return value
+
+    def _timed_parse(
+        self,
+        path: str,
+        parse: Callable[[AbstractResponse], AbstractResponse],
+        response: AbstractResponse,
+    ) -> AbstractResponse:
+        """Apply `parse` to a response, timed for the hooks."""
+        if self.hooks is None or not response.is_success():
+            return parse(response)
+        start = time.perf_counter()
+        response = parse(response)
+        elapsed = time.perf_counter() - start
+        data = response.json()
+        records = len(data) if isinstance(data, list) else 1
+        self.hooks.parse(self._endpoint(path), records, elapsed)
+        return response
+
+    def _rate_limit_pause(self, delay: float) -> None:
+        """Hold back every request of this client for the next `delay` seconds."""
+        until = time.monotonic() + delay
+        with self._rate_limit_lock:
+            self._rate_limited_until = max(self._rate_limited_until, until)
+
+    def _rate_limit_remaining(self) -> float:
+        """Seconds left before requests may be sent again."""
+        return max(0.0, self._rate_limited_until - time.monotonic())
+
+    def _batch_retry_delay(
+        self, response: AbstractResponse, attempt: int, elapsed: float
+    ) -> float | None:
+        """
+        Delay before retrying a rate-limited lookup of a batch, None to give up. Batches retry with a default
+        `RetryPolicy` when the client has none, so that they slow down instead of failing.
+        """
+        if not isinstance(response, RateLimitResponse):
+            return None
+        policy = self.retry_policy or RetryPolicy()
+        return policy.get_delay(
+            attempt, response.status_code(), response.response.headers, elapsed
+        )
+
+    @staticmethod
+    def _with_retries(response: AbstractResponse, retries: int) -> AbstractResponse:
+        """
+        `response` reporting `retries`, as a copy: responses can be shared through the caches and in-flight
+        requests, so they are never changed.
+        """
+        if response.retries == retries:
+            return response
+        result = copy.copy(response)
+        result.retries = retries
+        return result
+
+    def _cache_key(
+        self, path: str, params: Mapping[str, Any] | None = None
+    ) -> Hashable:
+        """Cache key of a request: server, API key, path and sorted parameters."""
+        items = tuple(sorted((params or {}).items()))
+        return (self.base_url, self.api_key, path.rstrip("/"), items)
+
+    def _cache_get(self, path: str) -> AbstractResponse | None:
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(path))
+
+    def _cache_set(self, endpoint: str, path: str, response: AbstractResponse) -> None:
+        if self.cache is not None:
+            self.cache.set(endpoint, self._cache_key(path), response)
+
+    def _disk_cache_key(self, url: str, params: Mapping[str, Any] | None) -> str:
+        """Disk cache key of a request. The API key is hashed so that it is never written to disk."""
+        owner = (
+            hashlib.sha256(self.api_key.encode()).hexdigest()[:16]
+            if self.api_key
+            else ""
+        )
+        query = urlencode(sorted((params or {}).items()))
+        return f"{owner}|{url.rstrip('/')}?{query}"
+
+    def _response_from_disk_cache(
+        self, entry: CacheEntry, retries: int = 0
+    ) -> AbstractResponse:
+        response_json = self._loads(entry.body) if entry.body else []
+        return SuccessResponse(
+            response=None, response_json=response_json, status_code=200, retries=retries
+        )
+
+    def _disk_cache_update(
+        self, key: str, status_code: int, content: bytes, headers: Mapping[str, str]
+    ) -> None:
+        """Store a fresh body, or mark the entry as revalidated on 304 Not Modified."""
+        if self.disk_cache is None:
+            return
+        if status_code == 304:
+            self.disk_cache.touch(key)
+        elif status_code == 200:
+            self.disk_cache.set(
+                key, content, headers.get("ETag"), headers.get("Last-Modified")
+            )
+
+    def _start_revalidation(self, key: str) -> bool:
+        """Claim the background revalidation of `key`, False if one is already running."""
+        with self._revalidating_lock:
+            if key in self._revalidating:
+                return False
+            self._revalidating.add(key)
+            return True
+
+    def _end_revalidation(self, key: str) -> None:
+        with self._revalidating_lock:
+            self._revalidating.discard(key)
+
+    @staticmethod
+    def _normalize_ips(ips: Iterable[str]) -> list[str]:
+        """Strip, validate, canonicalise and deduplicate IP addresses, keeping their order."""
+        normalized: dict[str, None] = {}
+        for ip in ips:
+            try:
+                normalized[str(ipaddress.ip_address(ip.strip()))] = None
+            except ValueError:
+                raise ValueError(f"Invalid IP address: {ip!r}") from None
+        return list(normalized)
+
+    @staticmethod
+    def _normalize_domains(domains: Iterable[str]) -> list[str]:
+        """Strip, lowercase and deduplicate domain names, keeping their order."""
+        normalized: dict[str, None] = {}
+        for domain in domains:
+            name = domain.strip().rstrip(".").lower()
+            if not name:
+                raise ValueError(f"Invalid domain: {domain!r}")
+            normalized[name] = None
+        return list(normalized)
+
+    @staticmethod
+    def _search_query(query: str | list[AbstractQuery] | None) -> str:
+        """Accept either a raw query string or a list of queries."""
+        if isinstance(query, str):
+            return query
+        return serialize_queries(query)
+
+    @classmethod
+    def _last_page(cls, start_page: int, max_results: int | None) -> int | None:
+        """Last page worth requesting to collect `max_results` results, None if unbounded."""
+        if max_results is None:
+            return None
+        return start_page + -(-max_results // cls.MAX_RESULTS_PER_PAGE) - 1
+
+    @classmethod
+    def _full_page(cls, response: AbstractResponse) -> bool:
+        """Whether a search response is a full page, so that the next page may hold more results."""
+        return (
+            response.is_success() and len(response.json()) >= cls.MAX_RESULTS_PER_PAGE
+        )
+
+    @staticmethod
+    def _decoder(
+        model: type[Model], fields: Iterable[str] | None = None
+    ) -> Callable[[Any], Any]:
+        """Decoder for `model`, or for a projection of it on `fields` when given."""
+        if fields is None:
+            return compile_decoder(model)
+        if isinstance(fields, str):
+            fields = [fields]
+        return projection(model, tuple(fields))
 
     @staticmethod
-    def _parse_events(response: AbstractResponse) -> AbstractResponse:
-        """Parse raw JSON dicts into L9Event objects on a success response."""
+    def _parse_events(
+        response: AbstractResponse, decode: Callable[[Any], Any] = decode_event
+    ) -> AbstractResponse:
+        """Parse raw JSON dicts into L9Event objects (or projected records) on a success response."""
         if response.is_success():
-            response.response_json = [
-                l9format.L9Event.from_dict(res) for res in response.response_json
-            ]
+            response.response_json = [decode(res) for res in response.response_json]
         return response
 
     @staticmethod
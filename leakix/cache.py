@@ -0,0 +1,95 @@
+"""In-memory TTL/LRU cache for the idempotent lookup endpoints."""
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Mapping
+
+from leakix.response import AbstractResponse
+
+DEFAULT_TTLS: dict[str, float] = {
+    "host": 300.0,
+    "domain": 300.0,
+    "subdomains": 300.0,
+    "plugins": 3600.0,
+    "plugin": 3600.0,
+}
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_NEGATIVE_TTL = 60.0
+
+
+class ResponseCache:
+    """
+    Cache of parsed responses for `get_host`, `get_domain`, `get_subdomains`, `get_plugins` and `get_plugin`.
+
+    Successful responses are kept for the TTL of their endpoint (see `DEFAULT_TTLS`), 404 responses for
+    `negative_ttl` seconds, and other errors are never cached. Once `max_entries` is reached the least recently
+    used entry is evicted. Cached responses are shared between callers and must not be mutated.
+
+    The cache is guarded by a lock that is never held across an `await`, so a single instance can be shared by
+    several `Client` and `AsyncClient` objects, from threads or from asyncio tasks.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttls: Mapping[str, float] | None = None,
+        negative_ttl: float = DEFAULT_NEGATIVE_TTL,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, AbstractResponse]] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def ttl_for(self, endpoint: str, response: AbstractResponse) -> float | None:
+        """How long `response` may be cached for, None if it must not be cached."""
+        if response.is_success():
+            return self.ttls.get(endpoint)
+        if response.status_code() == 404:
+            return self.negative_ttl
+        return None
+
+    def get(self, key: Hashable) -> AbstractResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > self.clock():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, endpoint: str, key: Hashable, response: AbstractResponse) -> None:
+        ttl = self.ttl_for(endpoint, response)
+        if not ttl or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self.clock() + ttl, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -1,20 +1,63 @@
-import json
-from collections.abc import Iterator
+import queue
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date
 from enum import Enum
-from typing import Any, cast
+from typing import Any
 
 import requests
 from l9format import l9format
+from requests.adapters import HTTPAdapter
 
-from leakix.base import BaseClient
+from leakix.base import (
+    DEFAULT_BATCH_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DEFAULT_URL,
+    BaseClient,
+    RetryPolicy,
+)
 from leakix.base import HostResult as HostResult
+from leakix.cache import ResponseCache
+from leakix.disk_cache import CacheEntry, DiskCache, Freshness
+from leakix.fast_decode import newest_events
+from leakix.json_backend import AUTO, JSONDecoder
+from leakix.metrics import Hooks
 from leakix.query import AbstractQuery, serialize_queries
 from leakix.response import (
     AbstractResponse,
+    APIError,
     ErrorResponse,
     RateLimitResponse,
     SuccessResponse,
 )
+from leakix.shard import (
+    DEFAULT_MERGE_BUFFER,
+    DEFAULT_SHARDS,
+    ShardEnd,
+    ShardMerger,
+    shard_queries,
+    shard_ranges,
+)
+from leakix.singleflight import SingleFlight
+from leakix.stream import (
+    AGGREGATIONS,
+    DEFAULT_MAX_RECONNECTS,
+    EVENTS,
+    BulkCursor,
+    BulkStream,
+    PipelineOptions,
+    ProgressOptions,
+    RecordKind,
+)
+from leakix.watch import (
+    DEFAULT_MAX_PAGES,
+    DEFAULT_WATCH_INTERVAL,
+    Watcher,
+    WatchState,
+)
 
 
 class Scope(Enum):
@@ -22,22 +65,251 @@ class Scope(Enum):
     LEAK = "leak"
 
 
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+
+
 class Client(BaseClient):
-    def __get(self, url: str, params: dict[str, Any] | None) -> AbstractResponse:
-        r = requests.get(
-            url,
-            params=params,
-            headers=self.headers,
+    """Sync client for the LeakIX API.
+
+    HTTP connections are kept alive and reused between calls through a pooled
+    `requests.Session`. A single client can be shared between threads.
+    Call `close()` (or use the client as a context manager) to release the pool.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        base_url: str | None = DEFAULT_URL,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        retry_policy: RetryPolicy | None = None,
+        cache: ResponseCache | None = None,
+        disk_cache: DiskCache | None = None,
+        json_decoder: str | JSONDecoder = AUTO,
+        hooks: Hooks | None = None,
+        timeout: float | None = DEFAULT_TIMEOUT,
+    ) -> None:
+        """
+        `pool_connections` is the number of per-host pools to cache and `pool_maxsize` the maximum number of
+        connections kept open to a single host. With `pool_block`, threads wait for a free connection instead of
+        opening throw-away ones once `pool_maxsize` is reached. Set `keep_alive` to False to close the connection
+        after every request.
+        Rate-limited requests are retried according to `retry_policy` when one is given. Lookups of hosts,
+        domains, subdomains and plugins are served from the in-memory `cache` and the persistent `disk_cache`
+        when they are given.
+        `json_decoder` selects the JSON backend, see `leakix.json_backend.get_decoder`.
+        `hooks` are called back on every request, retry and stream chunk, and with the time spent decoding and
+        building models; pass a `leakix.metrics.ClientMetrics` to collect them as Prometheus metrics.
+        `timeout` is the number of seconds to wait for a connection, and then between two reads from the server;
+        a stalled bulk stream raises `requests.Timeout` and reconnects. None waits forever.
+        """
+        super().__init__(
+            api_key=api_key,
+            base_url=base_url,
+            retry_policy=retry_policy,
+            cache=cache,
+            disk_cache=disk_cache,
+            json_decoder=json_decoder,
+            hooks=hooks,
+        )
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        if not keep_alive:
+            self.headers["Connection"] = "close"
+        self._session: requests.Session | None = None
+        self._session_lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    @property
+    def coalesced_requests(self) -> int:
+        """Number of calls that were served by an identical request already in flight."""
+        return self._flight.coalesced
+
+    def _get_session(self) -> requests.Session:
+        """Get or create the pooled HTTP session."""
+        session = self._session
+        if session is not None:
+            return session
+        with self._session_lock:
+            if self._session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self) -> None:
+        """Close the HTTP session and its pooled connections."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __send(
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        stream: bool = False,
+        headers: Mapping[str, str] | None = None,
+    ) -> tuple[requests.Response, int]:
+        """Send a GET request, retrying per the retry policy. Returns the response and the number of retries."""
+        session = self._get_session()
+        request_headers = {**self.headers, **headers} if headers else self.headers
+        hooks = self.hooks
+        endpoint = self._endpoint(url) if hooks is not None else ""
+        if hooks is not None:
+            hooks.request_start(endpoint)
+        start = time.monotonic()
+        network = 0.0
+        retries = 0
+        pause = self._rate_limit_remaining()
+        while True:
+            if pause > 0:
+                time.sleep(pause)
+            sent = time.perf_counter()
+            r = session.get(
+                url,
+                params=params,
+                headers=request_headers,
+                stream=stream,
+                timeout=self.timeout,
+            )
+            network += time.perf_counter() - sent
+            delay = self._retry_delay(
+                retries, r.status_code, r.headers, time.monotonic() - start
+            )
+            self._report_attempt(endpoint, r.status_code, retries, delay)
+            if delay is None:
+                if hooks is not None:
+                    size = 0 if stream else len(r.content)
+                    hooks.request_end(endpoint, r.status_code, size, network, retries)
+                return r, retries
+            r.close()
+            self._rate_limit_pause(delay)
+            pause = max(delay, self._rate_limit_remaining())
+            retries += 1
+
+    def __get(
+        self,
+        url: str,
+        params: dict[str, Any] | None,
+        endpoint: str | None = None,
+    ) -> AbstractResponse:
+        """
+        Make a GET request and return an AbstractResponse. Requests to a cacheable `endpoint` go through the disk
+        cache when one is configured.
+        """
+        key = None
+        entry = None
+        if endpoint is not None and self.disk_cache is not None:
+            key = self._disk_cache_key(url, params)
+            entry = self.disk_cache.get(key)
+            if entry is not None:
+                freshness = self.disk_cache.freshness(endpoint, entry)
+                if freshness is Freshness.STALE:
+                    self.__revalidate(url, params, key, entry)
+                if freshness is not Freshness.EXPIRED:
+                    return self._response_from_disk_cache(entry)
+        r, retries = self.__send(
+            url, params, headers=entry.validators() if entry else None
         )
+        if key is not None:
+            self._disk_cache_update(key, r.status_code, r.content, r.headers)
+            if r.status_code == 304 and entry is not None:
+                return self._response_from_disk_cache(entry, retries)
         if r.status_code == 200:
-            response_json = r.json() if r.content else []
-            return SuccessResponse(response=r, response_json=response_json)
+            response_json = self._load_body(url, r.content) if r.content else []
+            return SuccessResponse(
+                response=r, response_json=response_json, retries=retries
+            )
         elif r.status_code == 429:
-            return RateLimitResponse(response=r)
+            return RateLimitResponse(response=r, retries=retries)
         elif r.status_code == 204:
-            return SuccessResponse(response=r, response_json=[])
+            return SuccessResponse(response=r, response_json=[], retries=retries)
         else:
-            return ErrorResponse(response=r, response_json=r.json())
+            return ErrorResponse(
+                response=r,
+                response_json=self._load_body(url, r.content),
+                retries=retries,
+            )
+
+    def __revalidate(
+        self, url: str, params: dict[str, Any] | None, key: str, entry: CacheEntry
+    ) -> None:
+        """Revalidate a stale disk cache entry in a background thread."""
+        if not self._start_revalidation(key):
+            return
+
+        def run() -> None:
+            try:
+                r, _ = self.__send(url, params, headers=entry.validators())
+                self._disk_cache_update(key, r.status_code, r.content, r.headers)
+            except requests.RequestException:
+                pass
+            finally:
+                self._end_revalidation(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def __lookup(
+        self,
+        endpoint: str,
+        path: str,
+        parse: Callable[[AbstractResponse], AbstractResponse],
+    ) -> AbstractResponse:
+        """GET an idempotent lookup endpoint, going through the response cache when enabled."""
+        cached = self._cache_get(path)
+        if cached is not None:
+            return cached
+
+        def fetch() -> AbstractResponse:
+            response = self._timed_parse(
+                path,
+                parse,
+                self.__get(f"{self.base_url}{path}", params=None, endpoint=endpoint),
+            )
+            self._cache_set(endpoint, path, response)
+            return response
+
+        return self._flight.do(self._cache_key(path), fetch)
+
+    def __search_events(
+        self,
+        scope: Scope,
+        query: str,
+        page: int,
+        fields: Iterable[str] | None = None,
+    ) -> AbstractResponse:
+        """Parsed search results. Identical searches running concurrently share one request."""
+        if page < 0:
+            raise ValueError("Page argument must be a positive integer")
+        params = {"scope": scope.value, "q": query, "page": page}
+        decode = self._decoder(l9format.L9Event, fields)
+        return self._flight.do(
+            (self._cache_key("/search", params), decode),
+            lambda: self._timed_parse(
+                "/search",
+                lambda response: self._parse_events(response, decode),
+                self.__get(f"{self.base_url}/search", params=params),
+            ),
+        )
 
     def get(
         self,
@@ -81,24 +353,109 @@ class Client(BaseClient):
         )
 
     def get_service(
-        self, queries: list[AbstractQuery] | None = None, page: int = 0
+        self,
+        queries: list[AbstractQuery] | None = None,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
-        """Shortcut for `get` with the scope `Scope.SERVICE`."""
-        return self._parse_events(self.get(Scope.SERVICE, queries=queries, page=page))
+        """
+        Shortcut for `get` with the scope `Scope.SERVICE`, returning parsed events.
+        With `fields`, only those fields are decoded, see `search`.
+        """
+        return self.__search_events(
+            Scope.SERVICE, serialize_queries(queries), page, fields
+        )
 
     def get_leak(
-        self, queries: list[AbstractQuery] | None = None, page: int = 0
+        self,
+        queries: list[AbstractQuery] | None = None,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
-        """Shortcut for `get` with the scope `Scope.LEAK`."""
-        return self._parse_events(self.get(Scope.LEAK, queries=queries, page=page))
+        """
+        Shortcut for `get` with the scope `Scope.LEAK`, returning parsed events.
+        With `fields`, only those fields are decoded, see `search`.
+        """
+        return self.__search_events(
+            Scope.LEAK, serialize_queries(queries), page, fields
+        )
 
     def get_host(self, ipv4: str) -> AbstractResponse:
         """
         Returns the list of services and associated leaks for a given host. Only the ipv4 format is supported at the
         moment.
         """
-        url = f"{self.base_url}/host/{ipv4}"
-        return self._parse_host_result(self.__get(url, params=None))
+        return self.__lookup("host", f"/host/{ipv4}", self._parse_host_result)
+
+    def get_hosts(
+        self, ips: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> Iterator[tuple[str, AbstractResponse]]:
+        """
+        Look up many hosts concurrently. The IPs are validated, canonicalised and deduplicated before any request
+        is sent, and at most `concurrency` lookups run at the same time in a thread pool.
+
+        Yields `(ip, response)` tuples in completion order. When the API rate limits the batch, every worker
+        pauses and the lookup is retried (with the client retry policy, or a default `RetryPolicy`), so the batch
+        slows down instead of failing.
+        """
+        return self.__batch(self._normalize_ips(ips), self.get_host, concurrency)
+
+    def get_domains(
+        self, domains: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> Iterator[tuple[str, AbstractResponse]]:
+        """Batch version of `get_domain`, see `get_hosts`."""
+        return self.__batch(
+            self._normalize_domains(domains), self.get_domain, concurrency
+        )
+
+    def get_many_subdomains(
+        self, domains: Iterable[str], concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ) -> Iterator[tuple[str, AbstractResponse]]:
+        """Batch version of `get_subdomains`, see `get_hosts`."""
+        return self.__batch(
+            self._normalize_domains(domains), self.get_subdomains, concurrency
+        )
+
+    def __batch(
+        self,
+        keys: list[str],
+        lookup: Callable[[str], AbstractResponse],
+        concurrency: int,
+    ) -> Iterator[tuple[str, AbstractResponse]]:
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
+        def run(key: str) -> tuple[str, AbstractResponse]:
+            start = time.monotonic()
+            attempts = 0
+            while True:
+                response = lookup(key)
+                attempts += response.retries
+                delay = self._batch_retry_delay(
+                    response, attempts, time.monotonic() - start
+                )
+                if delay is None:
+                    return key, self._with_retries(response, attempts)
+                self._rate_limit_pause(delay)
+                attempts += 1
+
+        remaining = iter(keys)
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+        pending: set[Future[tuple[str, AbstractResponse]]] = set()
+        try:
+            for key in remaining:
+                pending.add(pool.submit(run, key))
+                if len(pending) >= concurrency:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_key = next(remaining, None)
+                    if next_key is not None:
+                        pending.add(pool.submit(run, next_key))
+                    yield future.result()
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
 
     def get_plugins(self) -> AbstractResponse:
         """
@@ -110,8 +467,7 @@ class Client(BaseClient):
         https://leakix.net/plugins.
         For the paid plans, have a look at https://leakix.net/plans.
         """
-        url = f"{self.base_url}/api/plugins"
-        return self._parse_plugins(self.__get(url, params=None))
+        return self.__lookup("plugins", "/api/plugins", self._parse_plugins)
 
     def get_plugin(self, name: str) -> AbstractResponse:
         """
@@ -119,8 +475,7 @@ class Client(BaseClient):
 
         The output is an `APIResult` object with `name` and `description` fields.
         """
-        url = f"{self.base_url}/api/plugins/{name}"
-        return self._parse_plugin(self.__get(url, params=None))
+        return self.__lookup("plugin", f"/api/plugins/{name}", self._parse_plugin)
 
     def get_subdomains(self, domain: str) -> AbstractResponse:
         """
@@ -128,103 +483,425 @@ class Client(BaseClient):
         The output is a list of `L9Subdomain` objects. The fields are `subdomain`, `distinct_ips` and `last_seen`.
         To get back a JSON/Python dictionary, use the method `to_dict` on the individual element of the response object.
         """
-        url = f"{self.base_url}/api/subdomains/{domain}"
-        return self._parse_subdomains(self.__get(url, params=None))
+        return self.__lookup(
+            "subdomains", f"/api/subdomains/{domain}", self._parse_subdomains
+        )
+
+    def __bulk_stream(
+        self,
+        path: str,
+        queries: list[AbstractQuery] | None,
+        decode: Callable[[Any], Any],
+        kind: RecordKind,
+        cursor: BulkCursor | None,
+        max_reconnects: int,
+        pipeline: PipelineOptions | None,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> BulkStream[Any]:
+        url = f"{self.base_url}{path}"
+        return BulkStream(
+            lambda q: self.__send(url, {"q": q}, stream=True),
+            serialize_queries(queries),
+            decode,
+            self._loads,
+            kind,
+            cursor=cursor,
+            max_reconnects=max_reconnects,
+            backoff=(self.retry_policy or RetryPolicy()).backoff,
+            pipeline=pipeline,
+            raw=raw,
+            hooks=self.hooks,
+            endpoint=self._endpoint(path),
+            progress=progress,
+        )
+
+    @staticmethod
+    def __collect(stream: BulkStream[Any]) -> AbstractResponse:
+        """Read a whole bulk stream into a response, returning API errors instead of raising them."""
+        try:
+            stream.open()
+        except APIError as e:
+            return e.response
+        records = list(stream)
+        return SuccessResponse(
+            response=stream.response, response_json=records, retries=stream.retries
+        )
 
     def bulk_export(
-        self, queries: list[AbstractQuery] | None = None
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        raw: bool = False,
     ) -> AbstractResponse:
-        url = f"{self.base_url}/bulk/search"
-        params = {"q": serialize_queries(queries)}
-        r = requests.get(url, params=params, headers=self.headers, stream=True)
-        if r.status_code == 200:
-            response_json = []
-            for line in r.iter_lines():
-                json_event = json.loads(line)
-                response_json.append(l9format.L9Aggregation.from_dict(json_event))
-            return SuccessResponse(response=r, response_json=response_json)
-        elif r.status_code == 429:
-            return RateLimitResponse(response=r)
-        elif r.status_code == 204:
-            return SuccessResponse(response=r, response_json=[])
-        else:
-            return ErrorResponse(response=r, response_json=r.json())
+        """
+        Export all the results of the queries as a list of `L9Aggregation`.
+        With `fields` (paths relative to `L9Aggregation`, e.g. `"ip"` or `"events.port"`), only those fields are
+        decoded into lightweight records. With `raw`, the list holds the undecoded NDJSON lines (`bytes`).
+        """
+        return self.__collect(self.bulk_export_stream(queries, fields, raw=raw))
 
     def bulk_export_last_event(
-        self, queries: list[AbstractQuery] | None = None
+        self,
+        queries: list[AbstractQuery] | None = None,
+        count: int = 1,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
-        response = self.bulk_export(queries)
-        if response.is_success():
-            for aggreg in response.json():
-                events = aggreg.events
-                sorted_events = sorted(
-                    events,
-                    key=lambda event: event.time,
-                    reverse=True,
-                )
-                aggreg.events = [sorted_events[0]]
-        return response
+        """
+        Same as bulk_export, but each `L9Aggregation` only keeps its newest event (its `count` newest events,
+        newest first). See `bulk_export_last_event_stream`.
+        """
+        return self.__collect(
+            self.bulk_export_last_event_stream(queries, count, fields)
+        )
 
     def bulk_service(
-        self, queries: list[AbstractQuery] | None = None
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        raw: bool = False,
     ) -> AbstractResponse:
-        url = f"{self.base_url}/bulk/service"
-        params = {"q": serialize_queries(queries)}
-        r = requests.get(url, params=params, headers=self.headers, stream=True)
-        if r.status_code == 200:
-            response_json = []
-            for line in r.iter_lines():
-                json_event = json.loads(line)
-                response_json.append(l9format.L9Event.from_dict(json_event))
-            return SuccessResponse(response=r, response_json=response_json)
-        elif r.status_code == 429:
-            return RateLimitResponse(response=r)
-        elif r.status_code == 204:
-            return SuccessResponse(response=r, response_json=[])
-        else:
-            return ErrorResponse(response=r, response_json=r.json())
+        """
+        Export all the services matching the queries as a list of `L9Event`.
+        With `fields`, only those fields are decoded, see `search`. `raw` works as for `bulk_export`.
+        """
+        return self.__collect(self.bulk_service_stream(queries, fields, raw=raw))
 
     def get_domain(self, domain: str) -> AbstractResponse:
         """
         Returns the list of services and associated leaks for a given domain.
         """
-        url = f"{self.base_url}/domain/{domain}"
-        return self._parse_host_result(self.__get(url, params=None))
+        return self.__lookup("domain", f"/domain/{domain}", self._parse_host_result)
 
     def search(
-        self, query: str, scope: Scope = Scope.LEAK, page: int = 0
+        self,
+        query: str,
+        scope: Scope = Scope.LEAK,
+        page: int = 0,
+        fields: Iterable[str] | None = None,
     ) -> AbstractResponse:
         """
         Simple search using a raw query string (same syntax as the website).
 
+        With `fields`, a list of dotted paths in `L9Event` such as `["ip", "port", "geoip.country_name"]`, only
+        those fields are decoded and the results are named tuples (`ip`, `port`, `geoip_country_name`) instead of
+        full `L9Event` objects, which is faster and much lighter in memory.
+
         Example:
             >>> client.search("+plugin:GitConfigHttpPlugin", scope=Scope.LEAK)
             >>> client.search("+country:FR +port:22", scope=Scope.SERVICE)
+            >>> client.search("+port:22", fields=["ip", "port", "time"])
         """
-        if page < 0:
+        return self.__search_events(scope, query, page, fields)
+
+    def iter_search(
+        self,
+        query: str | list[AbstractQuery] | None = None,
+        scope: Scope = Scope.LEAK,
+        max_results: int | None = None,
+        prefetch: int = 1,
+        start_page: int = 0,
+        fields: Iterable[str] | None = None,
+    ) -> Iterator[Any]:
+        """
+        Iterate over the results of a search, walking the pages automatically.
+        `query` is either a raw query string (as for `search`) or a list of queries (as for `get`).
+
+        Iteration stops after a page with less than `MAX_RESULTS_PER_PAGE` results, or once `max_results` events
+        have been yielded. While the current page is being consumed, up to `prefetch` pages ahead are fetched in
+        a background thread; a page is only requested once the one before it came back full, so no quota is
+        spent on pages past the end of the results. Use `prefetch=0` to fetch the pages one by one.
+        `fields` selects a projection of the events, as for `search`.
+        An `APIError` is raised if a page cannot be fetched.
+        """
+        if start_page < 0:
             raise ValueError("Page argument must be a positive integer")
-        url = f"{self.base_url}/search"
-        r = self.__get(
-            url=url,
-            params={"scope": scope.value, "q": query, "page": page},
+        if max_results is not None and max_results <= 0:
+            return
+        q = self._search_query(query)
+        last_page = self._last_page(start_page, max_results)
+        # Pages are requested one after the other: a single thread fetches them ahead.
+        pool = ThreadPoolExecutor(max_workers=1) if prefetch > 0 else None
+        pending: deque[Future[AbstractResponse]] = deque()
+        next_page = start_page
+
+        def fetch() -> Future[AbstractResponse] | None:
+            """Request the next page, None past the last page needed."""
+            nonlocal next_page
+            if last_page is not None and next_page > last_page:
+                return None
+            page = next_page
+            next_page += 1
+            if pool is None:
+                future: Future[AbstractResponse] = Future()
+                future.set_result(self.search(q, scope, page, fields))
+                return future
+            return pool.submit(self.search, q, scope, page, fields)
+
+        def top_up(current_full: bool) -> None:
+            """Fetch up to `prefetch` pages ahead, each once the page before it came back full."""
+            while len(pending) < prefetch:
+                if pending:
+                    last = pending[-1]
+                    if not last.done() or last.exception() is not None:
+                        return
+                    if not self._full_page(last.result()):
+                        return
+                elif not current_full:
+                    return
+                future = fetch()
+                if future is None:
+                    return
+                pending.append(future)
+
+        count = 0
+        try:
+            first = fetch()
+            if first is not None:
+                pending.append(first)
+            while pending:
+                response = pending.popleft().result()
+                if response.is_error():
+                    raise APIError(response)
+                events = response.json()
+                full_page = self._full_page(response)
+                for event in events:
+                    top_up(full_page)
+                    yield event
+                    count += 1
+                    if max_results is not None and count >= max_results:
+                        return
+                if full_page and not pending and (future := fetch()) is not None:
+                    pending.append(future)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def watch(
+        self,
+        queries: str | list[AbstractQuery] | None = None,
+        interval: float = DEFAULT_WATCH_INTERVAL,
+        scope: Scope = Scope.LEAK,
+        state: WatchState | None = None,
+        fields: Iterable[str] | None = None,
+        max_polls: int | None = None,
+        max_pages: int = DEFAULT_MAX_PAGES,
+    ) -> Iterator[Any]:
+        """
+        Poll a search every `interval` seconds and yield only the events not yielded before, as they appear.
+        `queries` and `fields` are as for `iter_search`.
+
+        Each poll only asks for the events from the day of the newest one seen (`state.high_water`), stops
+        walking the pages once it meets already seen events (or after `max_pages` pages) and decodes only the
+        new ones. Pass a `WatchState` and save it (`state.to_json()`) to carry on from the same point after a
+        restart:
+
+            >>> for event in client.watch(queries, interval=600, state=WatchState.from_json(saved)):
+            ...     alert(event)
+
+        The first poll of a new state walks up to `max_pages` pages of the current results. Iteration stops
+        after `max_polls` polls, and never otherwise. An `APIError` is raised if a page cannot be fetched.
+        """
+        if max_pages < 1:
+            raise ValueError("max_pages must be positive")
+        watcher = Watcher(
+            queries,
+            state,
+            self._decoder(l9format.L9Event, fields),
+            self.MAX_RESULTS_PER_PAGE,
         )
-        return self._parse_events(r)
+        polls = 0
+        while True:
+            watcher.start()
+            q = watcher.queries()
+            for page in range(max_pages):
+                response = self.get(scope, q, page)
+                if response.is_error():
+                    raise APIError(response)
+                events, more = watcher.page(response.json())
+                for raw in events:
+                    yield watcher.emit(raw)
+                if not more:
+                    break
+            watcher.finish()
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                return
+            time.sleep(interval)
 
     def bulk_export_stream(
-        self, queries: list[AbstractQuery] | None = None
-    ) -> Iterator[l9format.L9Aggregation]:
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        pipeline: PipelineOptions | None = None,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> BulkStream[Any]:
         """
-        Streaming version of bulk_export. Yields L9Aggregation objects one by one.
+        Streaming version of bulk_export. Yields L9Aggregation objects (or projected records) one by one.
         More memory efficient for large result sets.
+        An `APIError` is raised when the export fails, with the same response `bulk_export` would return.
+
+        Dropped connections are resumed automatically, up to `max_reconnects` times in a row. The position in the
+        export is kept in `stream.cursor`; save it (`cursor.to_json()`) to resume an interrupted export later:
+
+            >>> stream = client.bulk_export_stream(queries, cursor=BulkCursor.from_json(saved))
+
+        With `pipeline=PipelineOptions()`, the socket is read in a background thread while the lines are decoded,
+        overlapping network waits and parsing. It only pays off on slow links, see `PipelineOptions`.
+
+        With `raw=True`, nothing is parsed: the stream yields the NDJSON lines as `bytes`, or copies the body to
+        a file at network speed with `stream.write_to(f)`. Raw streams are not resumed when the connection drops.
+
+        `stream.stats` tells how the export is going while it runs (records and bytes per second, time spent on
+        the network and parsing, see `StreamStats`); pass `progress=ProgressOptions(callback)` to receive them
+        periodically, or to trace peak memory.
         """
-        url = f"{self.base_url}/bulk/search"
-        params = {"q": serialize_queries(queries)}
-        r = requests.get(url, params=params, headers=self.headers, stream=True)
-        if r.status_code != 200:
-            return
-        for line in r.iter_lines():
-            json_event = json.loads(line)
-            yield cast(
-                l9format.L9Aggregation,
-                l9format.L9Aggregation.from_dict(json_event),
+        if raw and fields is not None:
+            raise ValueError("fields cannot be combined with raw")
+        decode = self._decoder(l9format.L9Aggregation, fields)
+        return self.__bulk_stream(
+            "/bulk/search",
+            queries,
+            decode,
+            AGGREGATIONS,
+            cursor,
+            max_reconnects,
+            pipeline,
+            raw,
+            progress,
+        )
+
+    def bulk_export_last_event_stream(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        count: int = 1,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        pipeline: PipelineOptions | None = None,
+        progress: ProgressOptions | None = None,
+    ) -> BulkStream[Any]:
+        """
+        Streaming version of bulk_export_last_event. Each aggregation is reduced to its `count` newest events
+        as it arrives, before decoding, so the other events are never kept in memory.
+        The other arguments work as for `bulk_export_stream`.
+        """
+        decode = newest_events(self._decoder(l9format.L9Aggregation, fields), count)
+        return self.__bulk_stream(
+            "/bulk/search",
+            queries,
+            decode,
+            AGGREGATIONS,
+            cursor,
+            max_reconnects,
+            pipeline,
+            progress=progress,
+        )
+
+    def bulk_service_stream(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fields: Iterable[str] | None = None,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        pipeline: PipelineOptions | None = None,
+        raw: bool = False,
+        progress: ProgressOptions | None = None,
+    ) -> BulkStream[Any]:
+        """
+        Streaming version of bulk_service. Yields L9Event objects (or projected records) one by one.
+        An `APIError` is raised when the export fails, with the same response `bulk_service` would return.
+        Reconnection, `cursor`, `pipeline`, `raw` and `progress` work as for `bulk_export_stream`.
+        """
+        if raw and fields is not None:
+            raise ValueError("fields cannot be combined with raw")
+        decode = self._decoder(l9format.L9Event, fields)
+        return self.__bulk_stream(
+            "/bulk/service",
+            queries,
+            decode,
+            EVENTS,
+            cursor,
+            max_reconnects,
+            pipeline,
+            raw,
+            progress,
+        )
+
+    def parallel_bulk_export(
+        self,
+        queries: list[AbstractQuery] | None,
+        start: date,
+        end: date,
+        shards: int = DEFAULT_SHARDS,
+        fields: Iterable[str] | None = None,
+        buffer: int = DEFAULT_MERGE_BUFFER,
+    ) -> Iterator[Any]:
+        """
+        Bulk export of the results updated from `start` (included) to `end` (excluded), split by update date
+        into `shards` exports run concurrently in a thread pool.
+
+        Records are yielded as they arrive from any shard, so they are not ordered. Duplicates returned by two
+        neighbouring shards are dropped, see `ShardMerger`. At most `buffer` records are read ahead of the
+        consumer. If a shard fails, the others are stopped and its error (usually an `APIError`) is raised.
+        """
+        ranges = shard_ranges(start, end, shards)
+        merger = ShardMerger(ranges)
+        decode = self._decoder(l9format.L9Aggregation, fields)
+        streams = [
+            self.__bulk_stream(
+                "/bulk/search",
+                shard,
+                lambda raw: (AGGREGATIONS.position(raw), decode(raw)),
+                AGGREGATIONS,
+                None,
+                DEFAULT_MAX_RECONNECTS,
+                None,
             )
+            for shard in shard_queries(queries, ranges)
+        ]
+        merged: queue.Queue[Any] = queue.Queue(maxsize=buffer)
+        stop = threading.Event()
+
+        def put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    merged.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def run(shard: int) -> None:
+            try:
+                for item in streams[shard]:
+                    if not put(item):
+                        return
+            except BaseException as e:
+                put(ShardEnd(shard, e))
+            else:
+                put(ShardEnd(shard))
+
+        pool = ThreadPoolExecutor(max_workers=len(streams))
+        try:
+            for shard in range(len(streams)):
+                pool.submit(run, shard)
+            remaining = len(streams)
+            while remaining:
+                item = merged.get()
+                if isinstance(item, ShardEnd):
+                    if item.error is not None:
+                        raise item.error
+                    remaining -= 1
+                    continue
+                position, record = item
+                if merger.accept(position):
+                    yield record
+        finally:
+            stop.set()
+            for stream in streams:
+                stream.close()
+            pool.shutdown(wait=False, cancel_futures=True)
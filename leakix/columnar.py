@@ -0,0 +1,229 @@
+"""
+Columnar export of search and bulk results to Arrow tables and Parquet files (requires `pyarrow`).
+
+A `ColumnSchema` flattens a model into a fixed list of typed columns, each read from a dotted field path as
+understood by `Projection`. Passing `schema.fields` as the `fields` of a search or bulk method makes the
+client decode exactly those fields, which the writers below then transpose batch by batch:
+
+    >>> stream = client.bulk_service_stream(queries, fields=EVENT_COLUMNS.fields)
+    >>> write_parquet(stream, "services.parquet", EVENT_COLUMNS)
+"""
+
+import dataclasses
+import os
+from collections.abc import Callable, Iterable, Iterator
+from itertools import islice
+from typing import Any
+
+from l9format import l9format
+from l9format.l9format import Model
+
+from leakix.projection import Projection, projection
+
+DEFAULT_BATCH_SIZE = 65536
+
+# Column types, as accepted by `Column.type`.
+STRING = "string"
+INT = "int64"
+FLOAT = "float64"
+BOOL = "bool"
+TIMESTAMP = "timestamp"
+STRING_LIST = "list<string>"
+# Strings with few distinct values, stored once (Arrow dictionary).
+CATEGORY = "dictionary<string>"
+
+
+def _pyarrow() -> Any:
+    try:
+        import pyarrow  # type: ignore[import-not-found, import-untyped, unused-ignore]
+    except ImportError as e:
+        raise ImportError(
+            "Columnar export requires pyarrow: pip install 'leakix[arrow]'"
+        ) from e
+    return pyarrow
+
+
+def _arrow_type(pa: Any, name: str) -> Any:
+    if name == TIMESTAMP:
+        return pa.timestamp("us", tz="UTC")
+    if name == STRING_LIST:
+        return pa.list_(pa.string())
+    if name == CATEGORY:
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.type_for_alias(name)
+
+
+def _to_float(values: Iterable[Any]) -> list[Any]:
+    return [None if v is None else float(v) for v in values]
+
+
+def int_or_none(value: Any) -> int | None:
+    """Integer value of a field, which may be a numeric string (e.g. a port)."""
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclasses.dataclass(frozen=True)
+class Column:
+    """One output column: its name, the field path it is read from and its type (`STRING`, `INT`...)."""
+
+    name: str
+    field: str
+    type: str = STRING
+
+
+class ColumnSchema:
+    """A stable, flattened set of columns for the records of `model`."""
+
+    def __init__(self, model: type[Model], columns: Iterable[Column]) -> None:
+        self.model = model
+        self.columns = tuple(columns)
+        self.fields = tuple(column.field for column in self.columns)
+        self.projection: Projection = projection(model, self.fields)
+
+    @property
+    def names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+    def arrow_schema(self) -> Any:
+        pa = _pyarrow()
+        return pa.schema(
+            [pa.field(c.name, _arrow_type(pa, c.type)) for c in self.columns]
+        )
+
+    def row(self, record: Any) -> tuple[Any, ...]:
+        """
+        The values of the columns for one record: a record projected on `fields` (the fast path), a model
+        instance or its raw JSON dict.
+        """
+        if type(record) is self.projection.record:
+            return tuple(record)
+        if isinstance(record, self.model):
+            return tuple(self.projection.from_model(record))
+        if isinstance(record, Model):
+            record = record.to_dict()
+        return tuple(self.projection(record))
+
+    def record_batch(self, records: Iterable[Any]) -> Any:
+        """An Arrow record batch holding `records`."""
+        pa = _pyarrow()
+        rows = [self.row(record) for record in records]
+        columns = list(zip(*rows, strict=True)) or [()] * len(self.columns)
+        arrays = []
+        for column, values in zip(self.columns, columns, strict=True):
+            if column.type == FLOAT:
+                values = tuple(_to_float(values))
+            elif column.type == INT:
+                values = tuple(map(int_or_none, values))
+            arrays.append(pa.array(values, type=_arrow_type(pa, column.type)))
+        return pa.RecordBatch.from_arrays(arrays, schema=self.arrow_schema())
+
+
+EVENT_COLUMNS = ColumnSchema(
+    l9format.L9Event,
+    [
+        Column("ip", "ip"),
+        Column("port", "port"),
+        Column("host", "host"),
+        Column("reverse", "reverse"),
+        Column("protocol", "protocol"),
+        Column("transport", "transport", STRING_LIST),
+        Column("event_type", "event_type"),
+        Column("plugin", "event_source"),
+        Column("time", "time", TIMESTAMP),
+        Column("summary", "summary"),
+        Column("tags", "tags", STRING_LIST),
+        Column("http_status", "http.status", INT),
+        Column("http_title", "http.title"),
+        Column("software", "service.software.name"),
+        Column("software_version", "service.software.version"),
+        Column("leak_stage", "leak.stage"),
+        Column("leak_severity", "leak.severity"),
+        Column("country", "geoip.country_name"),
+        Column("country_code", "geoip.country_iso_code"),
+        Column("city", "geoip.city_name"),
+        Column("latitude", "geoip.location.lat", FLOAT),
+        Column("longitude", "geoip.location.lon", FLOAT),
+        Column("asn", "network.asn", INT),
+        Column("organization", "network.organization_name"),
+        Column("network", "network.network"),
+    ],
+)
+
+AGGREGATION_COLUMNS = ColumnSchema(
+    l9format.L9Aggregation,
+    [
+        Column("ip", "ip"),
+        Column("resource_id", "resource_id"),
+        Column("open_ports", "open_ports", STRING_LIST),
+        Column("plugins", "plugins", STRING_LIST),
+        Column("leak_count", "leak_count", INT),
+        Column("leak_event_count", "leak_event_count", INT),
+        Column("summary", "summary"),
+        Column("fresh", "fresh", BOOL),
+        Column("creation_date", "creation_date", TIMESTAMP),
+        Column("update_date", "update_date", TIMESTAMP),
+        Column("country", "geoip.country_name"),
+        Column("country_code", "geoip.country_iso_code"),
+        Column("city", "geoip.city_name"),
+        Column("asn", "network.asn", INT),
+        Column("organization", "network.organization_name"),
+        Column("network", "network.network"),
+    ],
+)
+
+
+def iter_record_batches(
+    records: Iterable[Any],
+    schema: ColumnSchema = EVENT_COLUMNS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[Any]:
+    """Arrow record batches of at most `batch_size` rows, built while `records` is consumed."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive")
+    it = iter(records)
+    while batch := list(islice(it, batch_size)):
+        yield schema.record_batch(batch)
+
+
+def to_arrow(
+    records: Iterable[Any],
+    schema: ColumnSchema = EVENT_COLUMNS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Any:
+    """An Arrow table holding `records`, see `ColumnSchema.row` for the accepted records."""
+    pa = _pyarrow()
+    batches = list(iter_record_batches(records, schema, batch_size))
+    return pa.Table.from_batches(batches, schema=schema.arrow_schema())
+
+
+def write_parquet(
+    records: Iterable[Any],
+    path: str | os.PathLike[str],
+    schema: ColumnSchema = EVENT_COLUMNS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compression: str = "zstd",
+    on_batch: Callable[[int], None] | None = None,
+) -> int:
+    """
+    Write `records` to a Parquet file one row group per batch, so at most `batch_size` records are held in
+    memory. `on_batch` is called with the number of rows written so far after each batch. Returns the number
+    of rows.
+    """
+    _pyarrow()
+    import pyarrow.parquet as pq  # type: ignore[import-not-found, import-untyped, unused-ignore]
+
+    rows = 0
+    with pq.ParquetWriter(
+        os.fspath(path), schema.arrow_schema(), compression=compression
+    ) as writer:
+        for batch in iter_record_batches(records, schema, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+            if on_batch is not None:
+                on_batch(rows)
+    return rows
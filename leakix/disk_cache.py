@@ -0,0 +1,190 @@
+"""Persistent SQLite cache of raw response bodies, with conditional revalidation."""
+
+import dataclasses
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import Callable, Mapping
+from enum import Enum
+from pathlib import Path
+
+from leakix.cache import DEFAULT_TTLS
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_STALE_TTL = 3600.0
+
+
+class Freshness(Enum):
+    FRESH = "fresh"
+    STALE = "stale"
+    EXPIRED = "expired"
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+    stored_at: float
+
+    def validators(self) -> dict[str, str]:
+        """Conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class DiskCache:
+    """
+    SQLite-backed cache of response bodies for the lookup endpoints, shared across process restarts.
+
+    Bodies are stored zlib-compressed together with the `ETag` / `Last-Modified` validators sent by the server.
+    An entry is fresh for the TTL of its endpoint, then stale for another `stale_ttl` seconds: stale entries are
+    served immediately while the client revalidates them in the background. Older entries are revalidated with a
+    conditional request before being used. When the compressed bodies exceed `max_bytes`, the least recently
+    used entries are evicted.
+
+    Only the standard library is used. Access is serialized with a lock, so one cache can be shared by threads
+    and by asyncio tasks (queries are local and short, they are run inline).
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        ttls: Mapping[str, float] | None = None,
+        stale_ttl: float = DEFAULT_STALE_TTL,
+        compression_level: int = 6,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_ttl = stale_ttl
+        self.compression_level = compression_level
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    stored_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at"
+                " ON responses (accessed_at)"
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "DiskCache":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        return int(count)
+
+    def size(self) -> int:
+        """Total size in bytes of the stored (compressed) bodies."""
+        with self._lock:
+            (total,) = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        return int(total)
+
+    def freshness(self, endpoint: str, entry: CacheEntry) -> Freshness:
+        age = self.clock() - entry.stored_at
+        ttl = self.ttls.get(endpoint, 0.0)
+        if age < ttl:
+            return Freshness.FRESH
+        if age < ttl + self.stale_ttl:
+            return Freshness.STALE
+        return Freshness.EXPIRED
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses"
+                " WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (self.clock(), key),
+            )
+        body, etag, last_modified, stored_at = row
+        return CacheEntry(zlib.decompress(body), etag, last_modified, stored_at)
+
+    def set(
+        self,
+        key: str,
+        body: bytes,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        compressed = zlib.compress(body, self.compression_level)
+        now = self.clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                " (key, body, size, etag, last_modified, stored_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, compressed, len(compressed), etag, last_modified, now, now),
+            )
+            self._evict()
+
+    def touch(self, key: str) -> None:
+        """Mark an entry as freshly validated (after a 304 Not Modified)."""
+        now = self.clock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?",
+                (now, now, key),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def _evict(self) -> None:
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed_at, stored_at"
+        )
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", evicted)
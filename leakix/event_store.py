@@ -0,0 +1,342 @@
+"""Offline SQLite index of harvested events, queried with the same query objects as the API."""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections.abc import AsyncIterable, Callable, Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from l9format import l9format
+
+from leakix.fast_decode import decode_event, encode_model
+from leakix.field import CustomField, Operator
+from leakix.matcher import (
+    FIELD_ALIASES,
+    TEXT_FIELDS,
+    compile_query,
+    parse_raw_query,
+    unquote_value,
+)
+from leakix.query import (
+    AbstractQuery,
+    MustNotQuery,
+    MustQuery,
+    RawQuery,
+    serialize_queries,
+)
+
+# Event fields stored in indexed columns, lower-cased, with the column holding them.
+INDEXED_FIELDS = {
+    "ip": "ip",
+    "port": "port",
+    "host": "host",
+    "event_source": "plugin",
+    "protocol": "protocol",
+    "geoip.country_name": "country",
+    "time": "day",
+}
+_INSERT_BATCH = 1000
+
+
+def _event_dict(record: Any) -> dict[str, Any]:
+    if isinstance(record, l9format.L9Event):
+        return encode_model(record)
+    if isinstance(record, dict):
+        return record
+    raise TypeError(f"Cannot store {type(record).__name__}, expected an L9Event")
+
+
+def _events(records: Iterable[Any]) -> Iterable[dict[str, Any]]:
+    """Event dicts of a stream of events and aggregations (whose events are stored)."""
+    for record in records:
+        if isinstance(record, l9format.L9Aggregation):
+            yield from map(_event_dict, record.events)
+        elif isinstance(record, dict) and "resource_id" in record:
+            yield from record.get("events") or []
+        else:
+            yield _event_dict(record)
+
+
+def _lower(value: Any) -> str | None:
+    return None if value is None else str(value).lower()
+
+
+def _port(value: Any) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(event: dict[str, Any]) -> tuple[Any, ...]:
+    geoip = event.get("geoip") or {}
+    when = str(event.get("time") or "")
+    key = "|".join(
+        str(event.get(name)) for name in ("event_source", "ip", "port", "host")
+    )
+    body = zlib.compress(json.dumps(event).encode())
+    return (
+        key,
+        _lower(event.get("ip")),
+        _port(event.get("port")),
+        _lower(event.get("host")),
+        _lower(event.get("event_source")),
+        _lower(event.get("protocol")),
+        _lower(geoip.get("country_name")),
+        when,
+        # The day in the event's own offset, as compared by the query matcher.
+        when[:10] or None,
+        body,
+    )
+
+
+def _like(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _condition(field: CustomField) -> tuple[str, str, list[Any]] | None:
+    """
+    Column and SQL condition selecting exactly the events the query matcher accepts for `field`, None when it
+    cannot be expressed on the indexed columns.
+    """
+    name = FIELD_ALIASES.get(field.field_name, field.field_name)
+    column = INDEXED_FIELDS.get(name)
+    value = unquote_value(field.v)
+    if column is None or "*" in value or "?" in value:
+        return None
+    ops = {
+        Operator.Equal: "=",
+        Operator.StrictlyGreater: ">",
+        Operator.StrictlySmaller: "<",
+    }
+    op = ops[field.operator]
+    if column == "port":
+        port = _port(value)
+        if port is None or str(port) != value:
+            return None
+        return column, f"port {op} ?", [port]
+    if column == "day":
+        return column, f"day {op} ?", [value[:10]]
+    if field.operator != Operator.Equal or (column == "ip" and "/" in value):
+        return None
+    if name in TEXT_FIELDS:
+        return column, f"{column} LIKE ? ESCAPE '\\'", [_like(value.lower())]
+    return column, f"{column} = ?", [value.lower()]
+
+
+class EventStore:
+    """
+    Local database of events harvested from the API, answering queries in milliseconds without spending quota.
+
+    `ingest` stores events from any client iterator (`L9Event`, `L9Aggregation` whose events are stored, or
+    their raw dicts). An event is identified by its plugin, ip, port and host; ingesting it again replaces the
+    stored copy unless the stored one is newer.
+
+    `query` answers a list of queries locally: conditions on the indexed fields (`INDEXED_FIELDS`) are run in
+    SQLite, then every candidate is checked with `leakix.matcher.compile_query`, so results are the same as
+    filtering all the stored events with the matcher. With `fetch`, queries never harvested (or harvested more
+    than `max_age` seconds ago) are first sent to the API and their results ingested:
+
+        >>> store.query(queries, fetch=client.iter_search, max_age=86400)
+
+    Access is serialized with a lock, as for `DiskCache`.
+    """
+
+    def __init__(
+        self, path: str | Path, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.path = str(path)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS events (
+                    key TEXT PRIMARY KEY,
+                    ip TEXT,
+                    port INTEGER,
+                    host TEXT,
+                    plugin TEXT,
+                    protocol TEXT,
+                    country TEXT,
+                    time TEXT NOT NULL,
+                    day TEXT,
+                    body BLOB NOT NULL
+                )
+                """
+            )
+            for column in INDEXED_FIELDS.values():
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS events_{column} ON events ({column})"
+                )
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS harvests (
+                    query TEXT PRIMARY KEY,
+                    harvested_at REAL NOT NULL
+                )
+                """
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "EventStore":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM events").fetchone()
+        return int(count)
+
+    def ingest(
+        self,
+        records: Iterable[Any],
+        queries: list[AbstractQuery] | None = None,
+    ) -> int:
+        """
+        Store the events of `records` and return how many were read. With `queries`, the records are recorded
+        as their complete results (see `harvested_at`).
+        """
+        count = 0
+        batch: list[tuple[Any, ...]] = []
+        for event in _events(records):
+            batch.append(_row(event))
+            count += 1
+            if len(batch) >= _INSERT_BATCH:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+        if queries is not None:
+            self._harvested(queries)
+        return count
+
+    async def aingest(
+        self,
+        records: AsyncIterable[Any],
+        queries: list[AbstractQuery] | None = None,
+    ) -> int:
+        """Async version of `ingest`, for the streams of `AsyncClient`."""
+        count = 0
+        batch: list[Any] = []
+        async for record in records:
+            batch.append(record)
+            if len(batch) >= _INSERT_BATCH:
+                count += self.ingest(batch)
+                batch = []
+        count += self.ingest(batch, queries)
+        return count
+
+    def _insert(self, rows: list[tuple[Any, ...]]) -> None:
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO events
+                    (key, ip, port, host, plugin, protocol, country, time, day, body)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    ip = excluded.ip, port = excluded.port, host = excluded.host,
+                    plugin = excluded.plugin, protocol = excluded.protocol,
+                    country = excluded.country, time = excluded.time,
+                    day = excluded.day, body = excluded.body
+                WHERE excluded.time >= events.time
+                """,
+                rows,
+            )
+
+    def _harvested(self, queries: list[AbstractQuery]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO harvests (query, harvested_at) VALUES (?, ?)",
+                (serialize_queries(queries), self.clock()),
+            )
+
+    def harvested_at(self, queries: list[AbstractQuery] | None) -> float | None:
+        """When the results of `queries` were last ingested with them, None if never."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT harvested_at FROM harvests WHERE query = ?",
+                (serialize_queries(queries),),
+            ).fetchone()
+        return None if row is None else float(row[0])
+
+    def _where(self, queries: list[AbstractQuery] | None) -> tuple[str, list[Any]]:
+        """SQL pre-selection of the candidates for `queries`, a superset of the matching events."""
+        clauses: list[str] = []
+        params: list[Any] = []
+        pending = list(queries or [])
+        while pending:
+            query = pending.pop(0)
+            if isinstance(query, RawQuery):
+                pending[:0] = parse_raw_query(query.raw_q)
+                continue
+            if not isinstance(query, MustQuery | MustNotQuery):
+                continue
+            condition = _condition(query.field)
+            if condition is None:
+                continue
+            column, sql, values = condition
+            if isinstance(query, MustNotQuery):
+                # Events without the field match the MustNotQuery.
+                sql = f"({column} IS NULL OR NOT ({sql}))"
+            clauses.append(sql)
+            params.extend(values)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(
+        self,
+        queries: list[AbstractQuery] | None = None,
+        fetch: Callable[[list[AbstractQuery]], Iterable[Any]] | None = None,
+        max_age: float | None = None,
+        limit: int | None = None,
+    ) -> list[l9format.L9Event]:
+        """
+        Stored events matching `queries`, newest first. See the class documentation for `fetch` and `max_age`.
+        """
+        if fetch is not None:
+            harvested = self.harvested_at(queries)
+            if harvested is None or (
+                max_age is not None and self.clock() - harvested > max_age
+            ):
+                self.ingest(fetch(list(queries or [])), list(queries or []))
+        matches = compile_query(queries)
+        where, params = self._where(queries)
+        events: list[l9format.L9Event] = []
+        if limit is not None and limit <= 0:
+            return events
+        with self._lock:
+            # Candidates are decoded while the cursor is read, up to the last one needed.
+            cursor = self._conn.execute(
+                f"SELECT body FROM events{where} ORDER BY time DESC", params
+            )
+            try:
+                for (body,) in cursor:
+                    event = decode_event(json.loads(zlib.decompress(body)))
+                    if matches(event):
+                        events.append(event)
+                        if limit is not None and len(events) >= limit:
+                            break
+            finally:
+                cursor.close()
+        return events
+
+    def delete_before(self, day: datetime) -> int:
+        """Drop the events seen before `day`, returning how many were deleted."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM events WHERE day < ?", (day.strftime("%Y-%m-%d"),)
+            )
+        return cursor.rowcount
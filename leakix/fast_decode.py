@@ -0,0 +1,273 @@
+"""
+Schema-specialised decoders for l9format models.
+
+`Model.from_dict` inspects the type hints of every field for every object it builds. For large exports this
+reflection costs more than the network. `compile_decoder` walks the type hints once and generates a plain
+Python function per model, which builds the same objects and raises the same errors as `from_dict`.
+`Model.to_dict` has the same cost in the other direction; `encode_model` resolves the hints once per class.
+"""
+
+import dataclasses
+import decimal
+import heapq
+from collections.abc import Callable
+from datetime import datetime
+from typing import Any, TypeVar, cast, get_args, get_origin
+
+from l9format import l9format
+from l9format.l9format import (
+    Model,
+    ValidationError,
+    _deserialize_value,
+    _is_optional,
+    _unwrap_optional,
+)
+
+M = TypeVar("M", bound=Model)
+
+_decoders: dict[type[Model], Callable[[Any], Any]] = {}
+# Fields of each model encoded by `encode_model`, with whether they are optional.
+_encoded_fields: dict[type[Model], list[tuple[str, bool]]] = {}
+_PLAIN_TYPES = frozenset({str, int, float, bool})
+
+
+def _parse_datetime(value: Any) -> datetime:
+    if not isinstance(value, str):
+        raise ValidationError(
+            f"expected string for datetime, got {type(value).__name__}", value
+        )
+    if not value:
+        raise ValidationError("empty datetime string", value)
+    try:
+        # Python 3.11+ parses the "Z" suffix natively.
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError as e:
+        raise ValidationError(f"invalid datetime: {value}", value) from e
+
+
+def _parse_decimal(value: Any) -> decimal.Decimal:
+    try:
+        return decimal.Decimal(str(value))
+    except decimal.DecimalException as e:
+        raise ValueError(f"invalid decimal: {value}") from e
+
+
+def _expect(value: Any, what: str) -> None:
+    raise ValidationError(f"expected {what}, got {type(value).__name__}", value)
+
+
+class _Compiler:
+    """Generates the source of one decoder function per model class."""
+
+    def __init__(self) -> None:
+        self.namespace: dict[str, Any] = {
+            "ValidationError": ValidationError,
+            "_parse_datetime": _parse_datetime,
+            "_parse_decimal": _parse_decimal,
+            "_deserialize_value": _deserialize_value,
+            "_expect": _expect,
+            "_new": object.__new__,
+        }
+        self.sources: list[str] = []
+        self.names: dict[type[Model], str] = {}
+
+    def constant(self, value: Any) -> str:
+        name = f"_c{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    def model(self, cls: type[Model]) -> str:
+        """Name of the generated decoder for `cls`, generating it on first use."""
+        if cls in _decoders:
+            return self.constant(_decoders[cls])
+        if cls in self.names:
+            return self.names[cls]
+        name = f"_decode_{cls.__name__}_{len(self.names)}"
+        self.names[cls] = name
+        hints = cls._get_type_hints()
+        fields = list(cls.__dataclass_fields__.values())
+        lines = [
+            f"def {name}(d):",
+            "    if not isinstance(d, dict):",
+            "        raise ValidationError("
+            "f'expected dict, got {type(d).__name__}', d)",
+        ]
+        for i, f in enumerate(fields):
+            lines.extend(self.field(f"v{i}", f.name, hints.get(f.name, f.type)))
+        cls_name = self.constant(cls)
+        args = ", ".join(f"{f.name}=v{i}" for i, f in enumerate(fields))
+        if hasattr(cls, "__post_init__") or "__slots__" in vars(cls):
+            lines.append(f"    return {cls_name}({args})")
+        else:
+            # Same object the dataclass __init__ would build, without the call.
+            items = ", ".join(f"{f.name!r}: v{i}" for i, f in enumerate(fields))
+            lines.append(f"    o = _new({cls_name})")
+            lines.append(f"    o.__dict__.update({{{items}}})")
+            lines.append("    return o")
+        self.sources.append("\n".join(lines))
+        return name
+
+    def field(self, var: str, name: str, tp: Any) -> list[str]:
+        key = repr(name)
+        if _is_optional(tp):
+            lines = [f"    {var} = d.get({key})"]
+        else:
+            lines = [
+                "    try:",
+                f"        {var} = d[{key}]",
+                "    except KeyError:",
+                f"        raise ValidationError('missing required field: {name}')"
+                " from None",
+            ]
+            if isinstance(tp, type) and issubclass(tp, (str, int, bool)):
+                lines += [
+                    f"    if {var} is None:",
+                    "        raise ValidationError("
+                    f"\"field '{name}' is required but got None\")",
+                ]
+        conversion = self.value(var, _unwrap_optional(tp), "        ")
+        if conversion:
+            lines.append(f"    if {var} is not None:")
+            lines.extend(conversion)
+        return lines
+
+    def value(self, var: str, tp: Any, indent: str) -> list[str]:
+        """Statements converting the non-None raw value in `var` in place, empty if it is kept as is."""
+        origin = get_origin(tp)
+        if origin is list:
+            args = get_args(tp)
+            item = self.item("x", args[0] if args else object)
+            return [
+                f"{indent}if not isinstance({var}, list):",
+                f"{indent}    _expect({var}, 'list')",
+                f"{indent}{var} = [{item} for x in {var}]",
+            ]
+        if origin is dict:
+            args = get_args(tp)
+            key = self.item("k", args[0] if args else object)
+            val = self.item("x", args[1] if len(args) > 1 else object)
+            return [
+                f"{indent}if not isinstance({var}, dict):",
+                f"{indent}    _expect({var}, 'dict')",
+                f"{indent}{var} = {{{key}: {val} for k, x in {var}.items()}}",
+            ]
+        if isinstance(tp, type) and issubclass(tp, Model):
+            return [
+                f"{indent}if not isinstance({var}, dict):",
+                f"{indent}    _expect({var}, 'dict for nested model')",
+                f"{indent}{var} = {self.model(tp)}({var})",
+            ]
+        if isinstance(tp, type) and issubclass(tp, datetime):
+            return [f"{indent}{var} = _parse_datetime({var})"]
+        if isinstance(tp, type) and issubclass(tp, decimal.Decimal):
+            return [f"{indent}{var} = _parse_decimal({var})"]
+        return []
+
+    def item(self, var: str, tp: Any) -> str:
+        """Expression converting a list item or a dict key or value."""
+        if _is_optional(tp):
+            tp = _unwrap_optional(tp)
+        if get_origin(tp) in (list, dict):
+            # Nested containers do not occur in l9format, keep the generic path.
+            return f"_deserialize_value({var}, {self.constant(tp)})"
+        if isinstance(tp, type) and issubclass(tp, Model):
+            decode = self.model(tp)
+            return (
+                f"(None if {var} is None else {decode}({var}) if isinstance({var}, dict)"
+                f" else _expect({var}, 'dict for nested model'))"
+            )
+        if isinstance(tp, type) and issubclass(tp, datetime):
+            return f"(None if {var} is None else _parse_datetime({var}))"
+        if isinstance(tp, type) and issubclass(tp, decimal.Decimal):
+            return f"(None if {var} is None else _parse_decimal({var}))"
+        return var
+
+    def build(self) -> None:
+        code = "\n\n".join(self.sources)
+        exec(compile(code, "<leakix.fast_decode>", "exec"), self.namespace)
+        for cls, name in self.names.items():
+            _decoders[cls] = self.namespace[name]
+
+
+def compile_decoder(cls: type[M]) -> Callable[[Any], M]:
+    """
+    Return a decoder equivalent to `cls.from_dict`, generated from the type hints of the model and of the
+    models it contains. Decoders are cached per class.
+    """
+    if not (dataclasses.is_dataclass(cls) and issubclass(cls, Model)):
+        raise TypeError(f"{cls!r} is not an l9format model")
+    if cls not in _decoders:
+        compiler = _Compiler()
+        compiler.model(cls)
+        compiler.build()
+    return cast(Callable[[Any], M], _decoders[cls])
+
+
+def _encode_value(value: Any) -> Any:
+    if type(value) in _PLAIN_TYPES or value is None:
+        return value
+    if isinstance(value, Model):
+        return encode_model(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return f"{value:f}"
+    if isinstance(value, list):
+        return [_encode_value(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _encode_value(v) for k, v in value.items()}
+    return value
+
+
+def encode_model(instance: Model) -> dict[str, Any]:
+    """The same dict as `instance.to_dict()`, without resolving the type hints of the model on every call."""
+    cls = type(instance)
+    fields = _encoded_fields.get(cls)
+    if fields is None:
+        hints = cls._get_type_hints()
+        fields = _encoded_fields[cls] = [
+            (f.name, _is_optional(hints.get(f.name, f.type)))
+            for f in cls.__dataclass_fields__.values()
+        ]
+    result = {}
+    for name, optional in fields:
+        value = getattr(instance, name)
+        if value is None and optional:
+            continue
+        result[name] = _encode_value(value)
+    return result
+
+
+def _event_time(event: Any) -> datetime:
+    return _parse_datetime(event.get("time") if isinstance(event, dict) else None)
+
+
+def newest_events(decode: Callable[[Any], M], count: int = 1) -> Callable[[Any], M]:
+    """
+    Wrap an aggregation decoder so that only the `count` newest events of each aggregation are kept. The
+    other events are dropped from the raw record before decoding, so they are never turned into objects.
+    The kept events are ordered newest first; events with the same time keep their order in the export.
+    """
+    if count < 1:
+        raise ValueError("count must be positive")
+
+    def reduce(raw: Any) -> M:
+        if isinstance(raw, dict):
+            events = raw.get("events")
+            if isinstance(events, list) and len(events) > 1:
+                if count == 1:
+                    raw["events"] = [max(events, key=_event_time)]
+                else:
+                    # Newest first, like sorted(..., reverse=True)[:count] in O(n log count).
+                    raw["events"] = heapq.nlargest(count, events, key=_event_time)
+        return decode(raw)
+
+    return reduce
+
+
+decode_event = compile_decoder(l9format.L9Event)
+decode_aggregation = compile_decoder(l9format.L9Aggregation)
@@ -0,0 +1,43 @@
+"""Pluggable JSON decoding, using orjson or msgspec when they are installed."""
+
+import json
+from collections.abc import Callable
+from typing import Any
+
+JSONDecoder = Callable[[bytes | str], Any]
+
+AUTO = "auto"
+BACKENDS = ("orjson", "msgspec", "json")
+
+
+def _load_backend(name: str) -> JSONDecoder:
+    if name == "orjson":
+        import orjson  # type: ignore[import-not-found, unused-ignore]
+
+        return orjson.loads  # type: ignore[no-any-return, unused-ignore]
+    if name == "msgspec":
+        import msgspec  # type: ignore[import-not-found, unused-ignore]
+
+        return msgspec.json.Decoder().decode
+    if name == "json":
+        return json.loads
+    raise ValueError(f"Unknown JSON backend {name!r}, expected one of {BACKENDS}")
+
+
+def get_decoder(backend: str | JSONDecoder = AUTO) -> JSONDecoder:
+    """
+    Return a function decoding a JSON document from bytes (or str).
+
+    `backend` is one of `"orjson"`, `"msgspec"`, `"json"` (the standard library), `"auto"` to pick the fastest
+    installed one in that order, or any callable with the same signature as `json.loads`.
+    """
+    if callable(backend):
+        return backend
+    if backend != AUTO:
+        return _load_backend(backend)
+    for name in BACKENDS:
+        try:
+            return _load_backend(name)
+        except ImportError:
+            continue
+    return json.loads
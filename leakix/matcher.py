@@ -0,0 +1,272 @@
+"""
+Local evaluation of queries against decoded results, to re-filter cached or archived events without calling
+the API.
+
+`compile_query` turns the same query objects sent to the server into a predicate. All the work that does not
+depend on the event (resolving field paths, parsing values, choosing comparisons) is done once, so the
+predicate only reads the fields and compares them.
+
+Matching approximates the search engine: keyword fields (ip, port, plugin, country...) compare whole values
+without case, text fields (`TEXT_FIELDS`) match substrings, `*` and `?` are wildcards, `ip` accepts CIDR
+ranges, dates compare by day and lists match when any of their items does. Like on the website, a record must
+match every `MustQuery`, no `MustNotQuery`, and, when there are no `MustQuery`, at least one `ShouldQuery`.
+"""
+
+import decimal
+import fnmatch
+import ipaddress
+import re
+from collections.abc import Callable, Iterable, Iterator
+from datetime import date, datetime
+from typing import Any, get_args, get_origin
+
+from l9format import l9format
+from l9format.l9format import Model, _is_optional, _unwrap_optional
+
+from leakix.field import CustomField, Operator
+from leakix.query import (
+    AbstractQuery,
+    EmptyQuery,
+    MustNotQuery,
+    MustQuery,
+    Query,
+    RawQuery,
+    ShouldQuery,
+)
+
+Predicate = Callable[[Any], bool]
+
+# Query field names that are not paths of the models.
+FIELD_ALIASES = {
+    "plugin": "event_source",
+    "country": "geoip.country_name",
+    "city": "geoip.city_name",
+    "asn": "network.asn",
+    "organization": "network.organization_name",
+}
+# Analyzed fields, matched on substrings.
+TEXT_FIELDS = frozenset(
+    {
+        "host",
+        "reverse",
+        "summary",
+        "http.title",
+        "http.url",
+        "http.root",
+        "network.organization_name",
+    }
+)
+
+_TOKEN = re.compile(r'([+-]?)([\w.]+):([<>]?)("(?:[^"\\]|\\.)*"|\S+)')
+
+
+def _unwrap(tp: Any) -> Any:
+    return _unwrap_optional(tp) if _is_optional(tp) else tp
+
+
+def _path_getter(
+    tp: Any, parts: list[str], path: str
+) -> tuple[Callable[[Any], Any], Any, bool]:
+    """
+    Getter of a dotted path on decoded objects, the type of the values it returns and whether it returns
+    lists of them.
+    """
+    tp = _unwrap(tp)
+    if get_origin(tp) is list:
+        args = get_args(tp)
+        item, leaf, _ = _path_getter(args[0] if args else object, parts, path)
+        return (
+            (lambda v: [item(x) for x in v] if isinstance(v, list) else None),
+            leaf,
+            True,
+        )
+    if not parts:
+        return (lambda v: v), tp, False
+    key = parts[0]
+    if isinstance(tp, type) and issubclass(tp, Model):
+        if key not in tp.__dataclass_fields__:
+            raise ValueError(f"Unknown field {path!r}: {tp.__name__} has no {key!r}")
+        inner, leaf, multiple = _path_getter(tp._get_type_hints()[key], parts[1:], path)
+        return (
+            (lambda v: None if v is None else inner(getattr(v, key, None))),
+            leaf,
+            multiple,
+        )
+    if get_origin(tp) is dict:
+        args = get_args(tp)
+        inner, leaf, multiple = _path_getter(
+            args[1] if len(args) > 1 else object, parts[1:], path
+        )
+        return (
+            (lambda v: inner(v.get(key)) if isinstance(v, dict) else None),
+            leaf,
+            multiple,
+        )
+    raise ValueError(f"Unknown field {path!r}: {key!r} is not a nested field")
+
+
+def _flatten(value: Any) -> Iterator[Any]:
+    if isinstance(value, list):
+        for item in value:
+            yield from _flatten(item)
+    elif value is not None:
+        yield value
+
+
+def unquote_value(value: str) -> str:
+    """The value of a field condition without its double quotes, if any: `"a \\"b\\""` is `a "b"`."""
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _order(operator: Operator, expected: Any) -> Callable[[Any], bool]:
+    if operator == Operator.StrictlyGreater:
+        return lambda v: v > expected
+    if operator == Operator.StrictlySmaller:
+        return lambda v: v < expected
+    return lambda v: v == expected
+
+
+def _number(value: str) -> decimal.Decimal | None:
+    try:
+        return decimal.Decimal(value)
+    except decimal.InvalidOperation:
+        return None
+
+
+def _value_test(path: str, leaf: Any, operator: Operator, value: str) -> Predicate:
+    """Test of one (non list) field value, specialised on the type of the field."""
+    if isinstance(leaf, type) and issubclass(leaf, datetime):
+        day = date.fromisoformat(value[:10])
+        compare = _order(operator, day)
+        return lambda v: isinstance(v, datetime) and compare(v.date())
+    if isinstance(leaf, type) and issubclass(leaf, bool):
+        flag = value.lower() == "true"
+        return lambda v: v is flag
+    number = _number(value)
+    if isinstance(leaf, type) and issubclass(leaf, int | decimal.Decimal):
+        if number is None:
+            raise ValueError(f"{path!r} is numeric, got {value!r}")
+        return _order(operator, number)
+    if operator != Operator.Equal and number is not None:
+        # Numeric strings, like ports.
+        compare = _order(operator, number)
+
+        def numeric(v: Any) -> bool:
+            n = _number(str(v))
+            return n is not None and compare(n)
+
+        return numeric
+    if path == "ip" and "/" in value and operator == Operator.Equal:
+        network = ipaddress.ip_network(value, strict=False)
+
+        def in_network(v: Any) -> bool:
+            try:
+                return ipaddress.ip_address(v) in network
+            except ValueError:
+                return False
+
+        return in_network
+    expected = value.lower()
+    if operator != Operator.Equal:
+        compare = _order(operator, expected)
+        return lambda v: compare(str(v).lower())
+    if "*" in expected or "?" in expected:
+        pattern = re.compile(fnmatch.translate(expected), re.DOTALL)
+        if path in TEXT_FIELDS:
+            pattern = re.compile(fnmatch.translate(f"*{expected}*"), re.DOTALL)
+        return lambda v: pattern.match(str(v).lower()) is not None
+    if path in TEXT_FIELDS:
+        return lambda v: expected in str(v).lower()
+    return lambda v: str(v).lower() == expected
+
+
+def compile_field(
+    field: CustomField, model: type[Model] = l9format.L9Event
+) -> Predicate:
+    """Predicate telling whether a record of `model` matches one field condition."""
+    name = FIELD_ALIASES.get(field.field_name, field.field_name)
+    get, leaf, multiple = _path_getter(model, name.split("."), name)
+    test = _value_test(name, leaf, field.operator, unquote_value(field.v))
+    if multiple:
+        return lambda record: any(test(v) for v in _flatten(get(record)))
+
+    def single(record: Any) -> bool:
+        value = get(record)
+        return value is not None and test(value)
+
+    return single
+
+
+def parse_raw_query(raw: str) -> list[AbstractQuery]:
+    """
+    Split a query string (`+field:value -field:>value field:"quoted value"`) into query objects. Free text,
+    groups and boolean operators cannot be evaluated locally and raise ValueError.
+    """
+    queries: list[AbstractQuery] = []
+    for token in _TOKEN.finditer(raw):
+        prefix, name, op, value = token.groups()
+        field = CustomField(value, name, Operator(op))
+        if prefix == "+":
+            queries.append(MustQuery(field))
+        elif prefix == "-":
+            queries.append(MustNotQuery(field))
+        else:
+            queries.append(ShouldQuery(field))
+    rest = _TOKEN.sub("", raw).split()
+    unsupported = [part for part in rest if part != "*"]
+    if unsupported:
+        raise ValueError(f"Cannot evaluate {' '.join(unsupported)!r} locally")
+    return queries
+
+
+def compile_query(
+    queries: Iterable[AbstractQuery] | None,
+    model: type[Model] = l9format.L9Event,
+) -> Predicate:
+    """
+    Compile `queries` (as passed to the client methods) into a predicate over decoded records of `model`.
+
+        >>> matches = compile_query([MustQuery(PluginField(Plugin.GitConfigHttpPlugin))])
+        >>> leaks = [event for event in archived_events if matches(event)]
+    """
+    must: list[Predicate] = []
+    must_not: list[Predicate] = []
+    should: list[Predicate] = []
+    pending = list(queries or [])
+    while pending:
+        query = pending.pop(0)
+        if isinstance(query, EmptyQuery):
+            continue
+        if isinstance(query, RawQuery):
+            pending[:0] = parse_raw_query(query.raw_q)
+            continue
+        if not isinstance(query, Query):
+            raise TypeError(f"Cannot evaluate {type(query).__name__} locally")
+        predicate = compile_field(query.field, model)
+        if isinstance(query, MustQuery):
+            must.append(predicate)
+        elif isinstance(query, MustNotQuery):
+            must_not.append(predicate)
+        else:
+            should.append(predicate)
+    if not must and should:
+        must.append(lambda record: any(p(record) for p in should))
+    if not must_not:
+        if len(must) == 1:
+            return must[0]
+        return lambda record: all(p(record) for p in must)
+    return lambda record: (
+        all(p(record) for p in must) and not any(p(record) for p in must_not)
+    )
+
+
+def filter_records(
+    queries: Iterable[AbstractQuery] | None,
+    records: Iterable[Any],
+    model: type[Model] = l9format.L9Event,
+) -> Iterator[Any]:
+    """The records of `records` matching `queries`, see `compile_query`."""
+    matches = compile_query(queries, model)
+    return (record for record in records if matches(record))
@@ -0,0 +1,379 @@
+"""
+Instrumentation of the clients: hook callbacks on every request and stream, and a metrics registry exported in
+the Prometheus text format.
+
+Pass a `Hooks` subclass as the `hooks` of a client to be called back, or a `ClientMetrics` to count requests,
+bytes and retries and time the network, the JSON decoding and the building of the models:
+
+    >>> metrics = ClientMetrics()
+    >>> client = Client(api_key, hooks=metrics)
+    >>> print(metrics.to_prometheus())
+"""
+
+import math
+import threading
+import time
+from abc import ABCMeta, abstractmethod
+from collections.abc import Callable, Iterable
+from typing import Any
+
+# Upper bounds (seconds) of the latency histograms.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Stream records timed before their durations are reported to the hooks.
+REPORT_EVERY = 1000
+
+
+def endpoint_name(path: str) -> str:
+    """Label of an API path, without its variable part: `/host/1.2.3.4` is `host`, `/bulk/search` `bulk/search`."""
+    parts = [part for part in path.split("?")[0].split("/") if part and part != "api"]
+    if not parts:
+        return "/"
+    return "/".join(parts[:2]) if parts[0] == "bulk" else parts[0]
+
+
+class Hooks:
+    """
+    Callbacks on the activity of a client, all doing nothing. Subclass and override the ones you need.
+
+    `endpoint` is the label of the API path, see `endpoint_name`. Hooks are called from the thread (or task)
+    doing the work, including the reader thread of pipelined streams, and must be thread-safe.
+    """
+
+    def request_start(self, endpoint: str) -> None:
+        """A request is about to be sent (retries included)."""
+
+    def request_end(
+        self, endpoint: str, status: int, size: int, seconds: float, retries: int
+    ) -> None:
+        """
+        The final response of a request arrived: its status, body size in bytes and the seconds spent waiting
+        for the network over all attempts. Streamed bodies are not read yet (`size` is 0), see `stream_chunk`.
+        """
+
+    def retry(self, endpoint: str, status: int, attempt: int, delay: float) -> None:
+        """Attempt `attempt` (from 0) got `status` and is retried after `delay` seconds."""
+
+    def rate_limit(self, endpoint: str, delay: float | None) -> None:
+        """A request was rate limited (429). `delay` is the wait before retrying, None when giving up."""
+
+    def stream_chunk(self, endpoint: str, size: int, seconds: float) -> None:
+        """A chunk of a streamed body arrived after waiting `seconds` for it."""
+
+    def decode(self, endpoint: str, size: int, seconds: float) -> None:
+        """`size` bytes of JSON were decoded in `seconds`."""
+
+    def parse(self, endpoint: str, records: int, seconds: float) -> None:
+        """`records` decoded JSON values were turned into models (`from_dict`, projections) in `seconds`."""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(metaclass=ABCMeta):
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, values: tuple[str, ...]) -> tuple[str, ...]:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {values}")
+        return values
+
+    def _selector(self, values: tuple[str, ...], extra: str = "") -> str:
+        pairs = [
+            f'{name}="{_escape(value)}"'
+            for name, value in zip(self.labels, values, strict=True)
+        ]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        pass
+
+    def expose(self) -> str:
+        lines = [
+            f"# HELP {self.name} {_escape(self.help)}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    """A value that only goes up, per combination of label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("counters cannot decrease")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{self._selector(k)} {_number(v)}" for k, v in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label values: count of each bucket (not cumulative, the last one is +Inf), sum.
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, *labels: str) -> float:
+        with self._lock:
+            return self._sums.get(self._key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            series = sorted(
+                (k, list(c), self._sums[k]) for k, c in self._counts.items()
+            )
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, n in zip([*self.buckets, math.inf], counts, strict=True):
+                cumulative += n
+                selector = self._selector(key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{selector} {cumulative}")
+            lines.append(f"{self.name}_sum{self._selector(key)} {_number(total)}")
+            lines.append(f"{self.name}_count{self._selector(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named counters and histograms, exported together by `to_prometheus`."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if (
+                    type(existing) is not type(metric)
+                    or existing.labels != metric.labels
+                ):
+                    raise ValueError(f"Metric {metric.name!r} is already registered")
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        """The counter `name`, created on first use."""
+        counter: Counter = self._register(Counter(name, help, labels))
+        return counter
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """The histogram `name`, created on first use."""
+        histogram: Histogram = self._register(Histogram(name, help, labels, buckets))
+        return histogram
+
+    def get(self, name: str) -> Counter | Histogram | None:
+        with self._lock:
+            metric = self._metrics.get(name)
+        return metric if isinstance(metric, Counter | Histogram) else None
+
+    def to_prometheus(self) -> str:
+        """All the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        return "".join(metric.expose() + "\n" for metric in metrics)
+
+
+class ClientMetrics(Hooks):
+    """
+    Hooks recording the activity of a client in a `MetricsRegistry` (a new one by default), under the
+    `leakix_` prefix. One instance can be shared by several clients.
+    """
+
+    def __init__(self, registry: MetricsRegistry | None = None) -> None:
+        self.registry = registry if registry is not None else MetricsRegistry()
+        r = self.registry
+        self.requests = r.counter(
+            "leakix_requests_total", "Completed requests.", ("endpoint", "status")
+        )
+        self.request_seconds = r.histogram(
+            "leakix_request_duration_seconds",
+            "Network time of a request, retries included.",
+            ("endpoint",),
+        )
+        self.bytes = r.counter(
+            "leakix_response_bytes_total", "Bytes of response bodies.", ("endpoint",)
+        )
+        self.retries = r.counter(
+            "leakix_retries_total", "Retried attempts.", ("endpoint", "status")
+        )
+        self.rate_limited = r.counter(
+            "leakix_rate_limited_total", "Rate-limited attempts.", ("endpoint",)
+        )
+        self.rate_limit_seconds = r.counter(
+            "leakix_rate_limit_wait_seconds_total",
+            "Time waited because of rate limits.",
+            ("endpoint",),
+        )
+        self.stream_seconds = r.counter(
+            "leakix_stream_network_seconds_total",
+            "Time spent waiting for streamed body chunks.",
+            ("endpoint",),
+        )
+        self.decode_seconds = r.counter(
+            "leakix_decode_seconds_total", "Time spent decoding JSON.", ("endpoint",)
+        )
+        self.parse_seconds = r.counter(
+            "leakix_parse_seconds_total",
+            "Time spent building models from decoded JSON.",
+            ("endpoint",),
+        )
+        self.records = r.counter(
+            "leakix_records_total", "Records built from responses.", ("endpoint",)
+        )
+
+    def request_end(
+        self, endpoint: str, status: int, size: int, seconds: float, retries: int
+    ) -> None:
+        self.requests.inc(endpoint, str(status))
+        self.request_seconds.observe(endpoint, value=seconds)
+        if size:
+            self.bytes.inc(endpoint, amount=size)
+
+    def retry(self, endpoint: str, status: int, attempt: int, delay: float) -> None:
+        self.retries.inc(endpoint, str(status))
+
+    def rate_limit(self, endpoint: str, delay: float | None) -> None:
+        self.rate_limited.inc(endpoint)
+        if delay is not None:
+            self.rate_limit_seconds.inc(endpoint, amount=delay)
+
+    def stream_chunk(self, endpoint: str, size: int, seconds: float) -> None:
+        self.bytes.inc(endpoint, amount=size)
+        self.stream_seconds.inc(endpoint, amount=seconds)
+
+    def decode(self, endpoint: str, size: int, seconds: float) -> None:
+        self.decode_seconds.inc(endpoint, amount=seconds)
+
+    def parse(self, endpoint: str, records: int, seconds: float) -> None:
+        self.records.inc(endpoint, amount=records)
+        self.parse_seconds.inc(endpoint, amount=seconds)
+
+    def to_prometheus(self) -> str:
+        return self.registry.to_prometheus()
+
+
+class StreamTimer:
+    """
+    Time the JSON decoding and model building of the records of a stream, reporting the totals to `hooks`
+    every `REPORT_EVERY` records and on `flush`, instead of once per record.
+    """
+
+    def __init__(
+        self,
+        hooks: Hooks,
+        endpoint: str,
+        loads: Callable[[Any], Any],
+        decode: Callable[[Any], Any],
+    ) -> None:
+        self.hooks = hooks
+        self.endpoint = endpoint
+        self._loads = loads
+        self._decode = decode
+        self._lock = threading.Lock()
+        self._size = 0
+        self._decode_time = 0.0
+        self._records = 0
+        self._parse_time = 0.0
+
+    def loads(self, line: Any) -> Any:
+        start = time.perf_counter()
+        value = self._loads(line)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._size += len(line)
+            self._decode_time += elapsed
+        return value
+
+    def decode(self, raw: Any) -> Any:
+        start = time.perf_counter()
+        record = self._decode(raw)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._records += 1
+            self._parse_time += elapsed
+            report = self._records >= REPORT_EVERY
+        if report:
+            self.flush()
+        return record
+
+    def flush(self) -> None:
+        with self._lock:
+            size, decode_time = self._size, self._decode_time
+            records, parse_time = self._records, self._parse_time
+            self._size = self._records = 0
+            self._decode_time = self._parse_time = 0.0
+        if size:
+            self.hooks.decode(self.endpoint, size, decode_time)
+        if records:
+            self.hooks.parse(self.endpoint, records, parse_time)
@@ -0,0 +1,126 @@
+"""
+Field projection: decode only selected fields of l9format models into lightweight records.
+
+A field is a dotted path following the model attributes, e.g. `"ip"`, `"geoip.country_name"` or
+`"http.header.server"` (any key is accepted below a dict field). Going through a list maps over its items:
+projecting `"events.port"` on an `L9Aggregation` gives the list of ports of its events.
+"""
+
+import decimal
+from collections import namedtuple
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from typing import Any, get_args, get_origin
+
+from l9format.l9format import Model, ValidationError, _is_optional, _unwrap_optional
+
+from leakix.fast_decode import _parse_datetime, _parse_decimal, compile_decoder
+
+Getter = Callable[[Any], Any]
+
+_projections: dict[tuple[type[Model], tuple[str, ...]], "Projection"] = {}
+
+
+def _unwrap(tp: Any) -> Any:
+    return _unwrap_optional(tp) if _is_optional(tp) else tp
+
+
+def _converter(tp: Any) -> Getter:
+    """Conversion of a selected value, the same as the full decoding of the model would apply."""
+    tp = _unwrap(tp)
+    convert: Getter | None = None
+    if get_origin(tp) is list:
+        args = get_args(tp)
+        item = _converter(args[0] if args else object)
+        return lambda v: [item(x) for x in v] if isinstance(v, list) else v
+    if isinstance(tp, type) and issubclass(tp, Model):
+        convert = compile_decoder(tp)
+    elif isinstance(tp, type) and issubclass(tp, datetime):
+        convert = _parse_datetime
+    elif isinstance(tp, type) and issubclass(tp, decimal.Decimal):
+        convert = _parse_decimal
+    if convert is None:
+        return lambda v: v
+    return lambda v: None if v is None else convert(v)
+
+
+def _getter(tp: Any, parts: list[str], path: str) -> Getter:
+    tp = _unwrap(tp)
+    if not parts:
+        return _converter(tp)
+    origin = get_origin(tp)
+    if origin is list:
+        args = get_args(tp)
+        item = _getter(args[0] if args else object, parts, path)
+        return lambda v: [item(x) for x in v] if isinstance(v, list) else None
+    if isinstance(tp, type) and issubclass(tp, Model):
+        hints = tp._get_type_hints()
+        if parts[0] not in tp.__dataclass_fields__:
+            raise ValueError(
+                f"Unknown field {path!r}: {tp.__name__} has no {parts[0]!r}"
+            )
+        child = hints[parts[0]]
+    elif origin is dict:
+        args = get_args(tp)
+        child = args[1] if len(args) > 1 else object
+    else:
+        raise ValueError(f"Unknown field {path!r}: {parts[0]!r} is not a nested field")
+    key = parts[0]
+    inner = _getter(child, parts[1:], path)
+    return lambda v: inner(v.get(key)) if isinstance(v, dict) else None
+
+
+def _attribute_getter(tp: Any, parts: list[str]) -> Getter:
+    """Getter of a field path on a decoded model, whose values are already converted."""
+    tp = _unwrap(tp)
+    if not parts:
+        return lambda v: v
+    if get_origin(tp) is list:
+        args = get_args(tp)
+        item = _attribute_getter(args[0] if args else object, parts)
+        return lambda v: [item(x) for x in v] if isinstance(v, list) else None
+    key = parts[0]
+    if isinstance(tp, type) and issubclass(tp, Model):
+        inner = _attribute_getter(tp._get_type_hints()[key], parts[1:])
+        return lambda v: None if v is None else inner(getattr(v, key, None))
+    args = get_args(tp)
+    inner = _attribute_getter(args[1] if len(args) > 1 else object, parts[1:])
+    return lambda v: inner(v.get(key)) if isinstance(v, dict) else None
+
+
+class Projection:
+    """
+    Decoder building, for each JSON object, a named tuple holding only the requested fields of `model`.
+
+    Attributes of the records are the paths with dots replaced by underscores (`geoip.country_name` becomes
+    `geoip_country_name`); `record._asdict()` gives a dict. Missing values are None. Selected values are
+    converted as in the full model (dates, decimals, nested models), everything else is never looked at.
+    `from_model` projects an instance of `model` that is already decoded.
+    """
+
+    def __init__(self, model: type[Model], fields: Iterable[str]) -> None:
+        self.model = model
+        self.fields = tuple(fields)
+        if not self.fields:
+            raise ValueError("At least one field must be selected")
+        self._getters = [_getter(model, f.split("."), f) for f in self.fields]
+        self._attributes = [_attribute_getter(model, f.split(".")) for f in self.fields]
+        names = [f.replace(".", "_") for f in self.fields]
+        self.record: Any = namedtuple(f"{model.__name__}Record", names)  # type: ignore[misc]
+
+    def __call__(self, data: Any) -> Any:
+        if not isinstance(data, dict):
+            raise ValidationError(f"expected dict, got {type(data).__name__}", data)
+        return self.record._make(getter(data) for getter in self._getters)
+
+    def from_model(self, instance: Model) -> Any:
+        """The record of an already decoded instance of `model`, read from its attributes."""
+        return self.record._make(getter(instance) for getter in self._attributes)
+
+
+def projection(model: type[Model], fields: tuple[str, ...]) -> Projection:
+    """Cached `Projection`, so repeated calls with the same fields share their records type."""
+    key = (model, fields)
+    if key not in _projections:
+        _projections[key] = Projection(model, fields)
+    return _projections[key]
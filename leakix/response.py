@@ -8,8 +8,10 @@ class AbstractResponse(metaclass=ABCMeta):
         response: Any,
         response_json: Any = None,
         status_code: int | None = None,
+        retries: int = 0,
     ) -> None:
         self.response = response
+        self.retries = retries
         self._status_code = (
             status_code if status_code is not None else self.response.status_code
         )
@@ -50,3 +52,16 @@ class ErrorResponse(AbstractResponse):
 
 class RateLimitResponse(ErrorResponse):
     pass
+
+
+class APIError(Exception):
+    """
+    Raised by the iterating and streaming APIs when the LeakIX API returns an error. The failed response is
+    available as `response`.
+    """
+
+    def __init__(self, response: AbstractResponse) -> None:
+        super().__init__(
+            f"API error (code = {response.status_code()}, message = {response.json()})"
+        )
+        self.response = response
@@ -0,0 +1,93 @@
+"""Splitting a bulk export into date-bounded shards and merging them back."""
+
+import dataclasses
+from datetime import date, datetime, time, timedelta
+from typing import Any
+
+from leakix.field import Operator, UpdateDateField
+from leakix.query import AbstractQuery, MustQuery
+
+DEFAULT_SHARDS = 4
+# Records buffered between the shard streams and the consumer of the merged stream.
+DEFAULT_MERGE_BUFFER = 1024
+
+
+def _day(d: date) -> date:
+    return d.date() if isinstance(d, datetime) else d
+
+
+def shard_ranges(start: date, end: date, shards: int) -> list[tuple[date, date]]:
+    """
+    Split the days from `start` (included) to `end` (excluded) into at most `shards` contiguous ranges of
+    whole days, as even as possible.
+    """
+    start, end = _day(start), _day(end)
+    days = (end - start).days
+    if days <= 0:
+        raise ValueError("end must be at least one day after start")
+    if shards < 1:
+        raise ValueError("shards must be positive")
+    count = min(shards, days)
+    bounds = [start + timedelta(days=i * days // count) for i in range(count + 1)]
+    return list(zip(bounds, bounds[1:], strict=False))
+
+
+def shard_queries(
+    queries: list[AbstractQuery] | None, ranges: list[tuple[date, date]]
+) -> list[list[AbstractQuery]]:
+    """`queries` restricted to each range of update dates."""
+    sharded = []
+    for first, stop in ranges:
+        after = datetime.combine(first - timedelta(days=1), time())
+        before = datetime.combine(stop, time())
+        sharded.append(
+            [
+                *(queries or []),
+                MustQuery(UpdateDateField(after, Operator.StrictlyGreater)),
+                MustQuery(UpdateDateField(before, Operator.StrictlySmaller)),
+            ]
+        )
+    return sharded
+
+
+@dataclasses.dataclass
+class ShardEnd:
+    """Marker sent by a shard once its stream is exhausted, or failed with `error`."""
+
+    shard: int
+    error: BaseException | None = None
+
+
+class ShardMerger:
+    """
+    Filter for the merged records of sharded exports.
+
+    Records updated outside of the requested days are dropped. A record updated on a day next to a shard
+    boundary can be returned by both neighbouring shards (the API compares dates with its own precision), so
+    the keys of those records are remembered and repeated ones dropped. Only boundary days are tracked, which
+    keeps memory proportional to the records of those days.
+    """
+
+    def __init__(self, ranges: list[tuple[date, date]]) -> None:
+        self.start = ranges[0][0].isoformat()
+        self.end = ranges[-1][1].isoformat()
+        self.boundary_days = set()
+        for _, stop in ranges[:-1]:
+            self.boundary_days.add((stop - timedelta(days=1)).isoformat())
+            self.boundary_days.add(stop.isoformat())
+        self.duplicates = 0
+        self._seen: set[str] = set()
+
+    def accept(self, position: tuple[str, Any]) -> bool:
+        key, update = position
+        if not update:
+            return True
+        day = str(update)[:10]
+        if not self.start <= day < self.end:
+            return False
+        if day in self.boundary_days:
+            if key in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen.add(key)
+        return True
@@ -0,0 +1,233 @@
+"""Incremental NDJSON files for bulk exports, optionally compressed and rotated by size."""
+
+import decimal
+import gzip
+import json
+import os
+from collections.abc import Callable, Iterable
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any
+
+from l9format.l9format import Model
+
+from leakix.fast_decode import encode_model
+
+AUTO = "auto"
+COMPRESSIONS = ("gzip", "zstd")
+_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Model):
+        return encode_model(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return f"{value:f}"
+    if hasattr(value, "_asdict"):
+        return value._asdict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_record(record: Any) -> bytes:
+    """
+    One NDJSON line for `record`: an l9format model, a projected record, anything `json` can serialize, or
+    an already encoded line (`bytes`/`str`) which is written as is.
+    """
+    if isinstance(record, bytes):
+        return record if record.endswith(b"\n") else record + b"\n"
+    if isinstance(record, str):
+        return (record if record.endswith("\n") else record + "\n").encode()
+    if isinstance(record, Model):
+        record = encode_model(record)
+    elif hasattr(record, "_asdict"):
+        record = record._asdict()
+    return (json.dumps(record, default=_default) + "\n").encode()
+
+
+def _compression(path: Path, compression: str | None) -> str | None:
+    if compression == AUTO:
+        return _SUFFIXES.get(path.suffix.lower())
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(
+            f"Unknown compression {compression!r}, expected one of {COMPRESSIONS}"
+        )
+    return compression
+
+
+def _zstd_writer(raw: IO[bytes], level: int | None) -> IO[bytes]:
+    try:
+        from compression import zstd  # type: ignore[import-not-found, unused-ignore]
+    except ImportError:
+        try:
+            import zstandard  # type: ignore[import-not-found, unused-ignore]
+        except ImportError as e:
+            raise ImportError(
+                "zstd compression requires Python 3.14+ or the zstandard package"
+            ) from e
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        return compressor.stream_writer(raw, closefd=False)  # type: ignore[no-any-return, unused-ignore]
+    return zstd.ZstdFile(raw, "wb", level=level)  # type: ignore[no-any-return, unused-ignore]
+
+
+def part_path(path: Path, index: int) -> Path:
+    """Path of the `index`-th file of a rotated sink: `export.ndjson.gz` becomes `export.00001.ndjson.gz`."""
+    stem, dot, suffixes = path.name.partition(".")
+    return path.with_name(f"{stem}.{index:05d}{dot}{suffixes}")
+
+
+class NDJSONSink:
+    """
+    Write records to an NDJSON file as they arrive, keeping at most `buffer_size` bytes in memory.
+
+        >>> with NDJSONSink("export.ndjson.gz") as sink:
+        ...     sink.write_all(client.bulk_export_stream(queries))
+
+    `compression` is `"gzip"`, `"zstd"`, `None`, or `"auto"` to pick it from the file suffix (`.gz`, `.zst`).
+    zstd needs Python 3.14 or the `zstandard` package.
+
+    With `fsync_every`, the file is flushed (including the compressor) and synced to disk every that many
+    records, then `on_checkpoint` is called: a good place to save the cursor of the stream being written,
+    which then never gets ahead of the data on disk. With `max_bytes`, a new file is started once a file holds
+    that many bytes of NDJSON (before compression); the files are numbered, see `part_path`, and listed in
+    `paths`.
+    """
+
+    def __init__(
+        self,
+        path: str | os.PathLike[str],
+        compression: str | None = AUTO,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        fsync_every: int | None = None,
+        max_bytes: int | None = None,
+        on_checkpoint: Callable[[], None] | None = None,
+        level: int | None = None,
+    ) -> None:
+        if fsync_every is not None and fsync_every < 1:
+            raise ValueError("fsync_every must be positive")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+        self.path = Path(path)
+        self.compression = _compression(self.path, compression)
+        self.buffer_size = buffer_size
+        self.fsync_every = fsync_every
+        self.max_bytes = max_bytes
+        self.on_checkpoint = on_checkpoint
+        self.level = level
+        self.paths: list[Path] = []
+        self.records = 0
+        self.bytes_written = 0
+        self._pending: list[bytes] = []
+        self._pending_size = 0
+        self._file_size = 0
+        self._raw: IO[bytes] | None = None
+        self._out: IO[bytes] | None = None
+        self._open()
+
+    def _open(self) -> None:
+        path = self.path
+        if self.max_bytes is not None:
+            path = part_path(self.path, len(self.paths))
+        # Unbuffered: records are already gathered into `buffer_size` writes.
+        raw: IO[bytes] = open(path, "wb", buffering=0)  # noqa: SIM115
+        try:
+            if self.compression == "gzip":
+                level = 6 if self.level is None else self.level
+                out: IO[bytes] = gzip.GzipFile(  # type: ignore[assignment]
+                    filename="", mode="wb", fileobj=raw, compresslevel=level
+                )
+            elif self.compression == "zstd":
+                out = _zstd_writer(raw, self.level)
+            else:
+                out = raw
+        except BaseException:
+            raw.close()
+            raise
+        self._raw, self._out = raw, out
+        self._file_size = 0
+        self.paths.append(path)
+
+    def _close_file(self) -> None:
+        raw, out = self._raw, self._out
+        if raw is None or out is None:
+            return
+        self._raw = self._out = None
+        try:
+            self._flush_pending(out)
+            if out is not raw:
+                out.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        finally:
+            raw.close()
+
+    def _flush_pending(self, out: IO[bytes]) -> None:
+        if self._pending:
+            out.write(b"".join(self._pending))
+            self._pending.clear()
+            self._pending_size = 0
+
+    def write(self, record: Any) -> None:
+        """Append one record, see `encode_record`."""
+        if self._out is None:
+            raise ValueError("write to a closed sink")
+        line = encode_record(record)
+        if self.max_bytes is not None and self._file_size >= self.max_bytes:
+            self._close_file()
+            self._open()
+        self._pending.append(line)
+        self._pending_size += len(line)
+        self._file_size += len(line)
+        self.bytes_written += len(line)
+        self.records += 1
+        if self._pending_size >= self.buffer_size:
+            self._flush_pending(self._out)
+        if self.fsync_every is not None and self.records % self.fsync_every == 0:
+            self.checkpoint()
+
+    def write_all(self, records: Iterable[Any]) -> int:
+        """Append every record of `records` (e.g. a bulk stream) and return how many were written."""
+        count = 0
+        for record in records:
+            self.write(record)
+            count += 1
+        return count
+
+    def flush(self) -> None:
+        """Hand the buffered records to the file (and compressor), without syncing to disk."""
+        if self._out is not None:
+            self._flush_pending(self._out)
+
+    def checkpoint(self) -> None:
+        """
+        Make everything written so far durable: a compressed file ends with a complete block and can be read
+        up to this point even if the process dies. Calls `on_checkpoint` afterwards.
+        """
+        if self._raw is not None and self._out is not None:
+            self._flush_pending(self._out)
+            self._out.flush()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        if self.on_checkpoint is not None:
+            self.on_checkpoint()
+
+    def close(self) -> None:
+        """Finish the current file and sync it to disk. Calls `on_checkpoint` a last time."""
+        if self._raw is None:
+            return
+        self._close_file()
+        if self.on_checkpoint is not None:
+            self.on_checkpoint()
+
+    @property
+    def closed(self) -> bool:
+        return self._raw is None
+
+    def __enter__(self) -> "NDJSONSink":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
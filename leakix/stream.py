@@ -0,0 +1,830 @@
+"""Streaming iteration over the NDJSON bulk endpoints, with checkpoints and automatic reconnection."""
+
+import asyncio
+import contextlib
+import dataclasses
+import inspect
+import json
+import queue
+import threading
+import time
+import tracemalloc
+import weakref
+from collections.abc import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterable,
+    Iterator,
+)
+from datetime import date, timedelta
+from typing import IO, Any, Generic, TypeVar, cast
+
+import httpx
+import requests
+
+from leakix.base import STREAM_CHUNK_SIZE, RetryPolicy
+from leakix.field import CustomField, Operator
+from leakix.json_backend import JSONDecoder
+from leakix.metrics import Hooks, StreamTimer
+from leakix.query import MustQuery
+from leakix.response import APIError, ErrorResponse, RateLimitResponse
+
+T = TypeVar("T")
+
+DEFAULT_MAX_RECONNECTS = 3
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+# Errors after which a bulk stream reconnects and resumes from its cursor.
+TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    requests.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.Timeout,
+)
+ASYNC_TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (httpx.TransportError,)
+
+
+class ResumeError(Exception):
+    """Raised when a resumed bulk export does not line up with its cursor."""
+
+
+@dataclasses.dataclass
+class BulkCursor:
+    """
+    Position in a bulk export: the number of records delivered, and the key and update date of the last one.
+    `day_count` is the number of delivered records sharing the update day of the last one.
+
+    Persist it with `to_json` and pass it back to the streaming method to resume an interrupted export.
+    """
+
+    count: int = 0
+    last_key: str | None = None
+    last_update: str | None = None
+    day_count: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps(dataclasses.asdict(self))
+
+    @classmethod
+    def from_json(cls, s: str) -> "BulkCursor":
+        return cls(**json.loads(s))
+
+
+@dataclasses.dataclass(frozen=True)
+class RecordKind:
+    """How to identify the records of a bulk endpoint and filter them by date."""
+
+    key_fields: tuple[str, ...]
+    date_field: str
+
+    def key(self, raw: Any) -> str:
+        return "|".join(str(raw.get(name)) for name in self.key_fields)
+
+    def position(self, raw: Any) -> tuple[str, Any]:
+        """Key and update date of a raw record, as tracked by `BulkCursor`."""
+        return self.key(raw), raw.get(self.date_field)
+
+
+AGGREGATIONS = RecordKind(key_fields=("resource_id", "ip"), date_field="update_date")
+EVENTS = RecordKind(key_fields=("event_source", "ip", "port"), date_field="time")
+
+
+def resume_query(query: str, kind: RecordKind, cursor: BulkCursor) -> str:
+    """
+    Narrow `query` to the part of the export not fully delivered according to `cursor`.
+
+    Bulk exports come newest first, so every record updated after the day of the last delivered one has
+    already been delivered: the query is restricted to that day and the older ones.
+    """
+    if not cursor.last_update:
+        return query
+    day = date.fromisoformat(cursor.last_update[:10]) + timedelta(days=1)
+    field = CustomField(f'"{day:%Y-%m-%d}"', kind.date_field, Operator.StrictlySmaller)
+    narrowing = MustQuery(field).serialize()
+    if query.strip() in ("", "*"):
+        return narrowing
+    return f"{query} {narrowing}"
+
+
+def iter_ndjson_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Split the chunks of a streamed NDJSON body into non-empty raw lines, without decoding it to text."""
+    pending = b""
+    for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def aiter_ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Async version of `iter_ndjson_lines`."""
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def _empty() -> AsyncIterator[bytes]:
+    return
+    yield
+
+
+def _api_error(
+    response: requests.Response | httpx.Response, retries: int, loads: JSONDecoder
+) -> APIError:
+    if response.status_code == 429:
+        return APIError(RateLimitResponse(response=response, retries=retries))
+    return APIError(
+        ErrorResponse(
+            response=response, response_json=loads(response.content), retries=retries
+        )
+    )
+
+
+@dataclasses.dataclass
+class PipelineOptions:
+    """
+    Pipelined reading of a bulk stream: a reader thread pulls lines from the socket, in batches of
+    `batch_size`, while the consuming thread decodes the previous ones. At most `max_pending` batches are read
+    ahead of the consumer, which bounds memory: the reader waits when the consumer falls behind.
+
+    Decoding stays on the consuming thread. JSON decoding holds the GIL, so parser threads would only contend
+    with it, and worker processes would spend about as long unpickling the records as decoding them. The
+    pipeline therefore only helps when the network is the bottleneck (slow or compressed transfers), where
+    reading overlaps with decoding; on a fast link, inline decoding is faster and holds less memory.
+    """
+
+    batch_size: int = 256
+    max_pending: int = 8
+
+    def __post_init__(self) -> None:
+        if self.batch_size < 1 or self.max_pending < 1:
+            raise ValueError("batch_size and max_pending must be positive")
+
+
+@dataclasses.dataclass
+class StreamStats:
+    """
+    Live statistics of a bulk stream (`stream.stats`), updated while it is read.
+
+    `bytes` counts the body once decompressed and `wire_bytes` as received. `network_time` is the time spent
+    waiting for body chunks and `parse_time` the time spent decoding lines. `peak_queue_depth` is the largest
+    number of batches a pipelined stream held read ahead of the consumer. `peak_memory` is the peak of the
+    memory traced by `tracemalloc`, when enabled (see `ProgressOptions`).
+    """
+
+    records: int = 0
+    bytes: int = 0
+    wire_bytes: int = 0
+    network_time: float = 0.0
+    parse_time: float = 0.0
+    peak_queue_depth: int = 0
+    peak_memory: int | None = None
+    started: float = dataclasses.field(default_factory=time.monotonic)
+    last_chunk: float | None = None
+    finished: float | None = None
+
+    def _now(self) -> float:
+        return self.finished if self.finished is not None else time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        return self._now() - self.started
+
+    @property
+    def idle(self) -> float:
+        """Seconds since the last chunk arrived (or the stream started): a stalled stream keeps growing it."""
+        since = self.last_chunk if self.last_chunk is not None else self.started
+        return self._now() - since
+
+    @property
+    def records_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        """The counters and the derived rates, e.g. for logging."""
+        return {
+            **dataclasses.asdict(self),
+            "elapsed": self.elapsed,
+            "records_per_second": self.records_per_second,
+            "bytes_per_second": self.bytes_per_second,
+        }
+
+
+@dataclasses.dataclass
+class ProgressOptions:
+    """
+    Progress reports of a bulk stream: `callback` receives `stream.stats` at most every `interval` seconds
+    while body chunks arrive, and once more when the stream ends. With a pipeline, it is called from the
+    reader thread.
+
+    With `trace_memory`, `tracemalloc` traces memory from the first read of the stream until it ends, to fill
+    `StreamStats.peak_memory`. It is started only if it is not already running, and stopped only when the last
+    stream tracing memory finishes. Tracing slows allocations down noticeably; use it to investigate memory
+    use, not in production.
+    """
+
+    callback: Callable[[StreamStats], None] | None = None
+    interval: float = DEFAULT_PROGRESS_INTERVAL
+    trace_memory: bool = False
+
+
+class _MemoryTracing:
+    """
+    `tracemalloc`, shared by the streams tracing memory: started by the first one (unless it is already
+    running) and stopped once the last one is done.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._users = 0
+        self._owned = False
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owned = True
+            self._users += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._users -= 1
+            if self._users == 0 and self._owned:
+                self._owned = False
+                tracemalloc.stop()
+
+
+_memory_tracing = _MemoryTracing()
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+_END = object()
+
+
+class _PipelineRun:
+    """One pipelined read of a response: the reader thread and the bounded queue of line batches it fills."""
+
+    def __init__(
+        self,
+        lines: Iterator[bytes],
+        options: PipelineOptions,
+        stats: StreamStats | None = None,
+    ) -> None:
+        self._lines = lines
+        self._options = options
+        self._stats = stats
+        self._out: queue.Queue[Any] = queue.Queue(options.max_pending)
+        self._closed = threading.Event()
+        self._reader = threading.Thread(
+            target=self._read, name="leakix-bulk-reader", daemon=True
+        )
+        self._reader.start()
+
+    def _put(self, item: Any) -> bool:
+        while True:
+            try:
+                self._out.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                if self._closed.is_set():
+                    return False
+        stats = self._stats
+        if stats is not None:
+            stats.peak_queue_depth = max(stats.peak_queue_depth, self._out.qsize())
+        return True
+
+    def _read(self) -> None:
+        end: Any = _END
+        batch: list[bytes] = []
+        try:
+            for line in self._lines:
+                if not line:
+                    continue
+                batch.append(line)
+                if len(batch) >= self._options.batch_size:
+                    if not self._put(batch):
+                        return
+                    batch = []
+        except BaseException as e:
+            end = _Failure(e)
+        # The lines read before a dropped connection are delivered, as they would be inline.
+        if batch and not self._put(batch):
+            return
+        self._put(end)
+
+    def get(self) -> list[bytes] | None:
+        """Next batch of lines, None at the end of the response. Errors of the reader are raised."""
+        item = self._out.get()
+        if item is _END:
+            return None
+        if isinstance(item, _Failure):
+            raise item.error
+        return cast(list[bytes], item)
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class _Checkpoints:
+    """Cursor bookkeeping shared by the sync and async streams."""
+
+    def __init__(
+        self,
+        query: str,
+        kind: RecordKind,
+        cursor: BulkCursor | None,
+        max_reconnects: int,
+        backoff: Callable[[int], float] | None,
+        raw: bool = False,
+        hooks: Hooks | None = None,
+        endpoint: str = "",
+        progress: ProgressOptions | None = None,
+    ) -> None:
+        if raw and cursor is not None:
+            raise ValueError("raw streams cannot be resumed from a cursor")
+        self.query = query
+        self.kind = kind
+        self.cursor = dataclasses.replace(cursor) if cursor else BulkCursor()
+        # Raw lines are not parsed, so there is no position to resume from.
+        self.max_reconnects = 0 if raw else max_reconnects
+        self.raw = raw
+        self.reconnects = 0
+        self._backoff = backoff or RetryPolicy().backoff
+        self._attempt = 0
+        self._skip = 0
+        self._hooks = hooks
+        self._endpoint = endpoint
+        self._timer: StreamTimer | None = None
+        self.stats = StreamStats()
+        self._progress = progress
+        self._last_progress = self.stats.started
+        self._started = False
+        # Releases the memory tracing of the stream, once: when it ends, or when it is garbage collected.
+        self._tracing: weakref.finalize[Any, Any] | None = None
+
+    def _start(self) -> None:
+        """Called on the first read of the stream: start tracing memory if asked to."""
+        if self._started:
+            return
+        self._started = True
+        progress = self._progress
+        if progress is not None and progress.trace_memory:
+            _memory_tracing.acquire()
+            self._tracing = weakref.finalize(self, _memory_tracing.release)
+            self.stats.peak_memory = tracemalloc.get_traced_memory()[1]
+
+    def _instrument(
+        self, loads: JSONDecoder, decode: Callable[[Any], T]
+    ) -> tuple[JSONDecoder, Callable[[Any], T]]:
+        """`loads` and `decode`, timed for the hooks when there are some."""
+        if self._hooks is None:
+            return loads, decode
+        self._timer = StreamTimer(self._hooks, self._endpoint, loads, decode)
+        return self._timer.loads, self._timer.decode
+
+    def _report(self) -> None:
+        """Report the parsing time not reported yet to the hooks."""
+        if self._timer is not None:
+            self._timer.flush()
+
+    def _on_chunk(self, size: int, seconds: float, wire_bytes: int | None) -> None:
+        """Account for a body chunk of `size` bytes waited for `seconds`; `wire_bytes` so far when known."""
+        stats = self.stats
+        stats.bytes += size
+        if wire_bytes is None:
+            stats.wire_bytes += size
+        else:
+            stats.wire_bytes = wire_bytes
+        stats.network_time += seconds
+        now = stats.last_chunk = time.monotonic()
+        if self._hooks is not None:
+            self._hooks.stream_chunk(self._endpoint, size, seconds)
+        progress = self._progress
+        if progress is None:
+            return
+        if progress.trace_memory and tracemalloc.is_tracing():
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+        if progress.callback is not None and now - self._last_progress >= (
+            progress.interval
+        ):
+            self._last_progress = now
+            progress.callback(stats)
+
+    def _finish(self) -> None:
+        """Stop the clock of the stats, and report them a last time."""
+        stats = self.stats
+        if stats.finished is not None:
+            return
+        stats.finished = time.monotonic()
+        progress = self._progress
+        if progress is None:
+            return
+        if progress.trace_memory and tracemalloc.is_tracing():
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+        if self._tracing is not None:
+            self._tracing()
+            self._tracing = None
+        if progress.callback is not None:
+            progress.callback(stats)
+
+    def _request_query(self) -> str:
+        """Query (re)starting the export at the cursor. Records to skip are counted from there."""
+        if self.cursor.last_update:
+            self._skip = self.cursor.day_count
+        else:
+            self._skip = self.cursor.count
+        return resume_query(self.query, self.kind, self.cursor)
+
+    def _accept(self, position: tuple[str, Any]) -> bool:
+        """Move the cursor past a record read from the stream, False if it was already delivered."""
+        key, update = position
+        if self._skip > 0:
+            self._skip -= 1
+            if self._skip == 0 and key != self.cursor.last_key:
+                raise ResumeError(
+                    f"Resumed export does not match the cursor: expected "
+                    f"{self.cursor.last_key!r}, got {key!r}"
+                )
+            return False
+        cursor = self.cursor
+        if update and cursor.last_update and update[:10] == cursor.last_update[:10]:
+            cursor.day_count += 1
+        else:
+            cursor.day_count = 1
+        cursor.count += 1
+        cursor.last_key = key
+        cursor.last_update = update
+        self._attempt = 0
+        return True
+
+    def _reconnect_delay(self, error: BaseException) -> float:
+        """Delay before reconnecting after a transient error, re-raising it once out of attempts."""
+        if self._attempt >= self.max_reconnects:
+            raise error
+        delay = self._backoff(self._attempt)
+        self._attempt += 1
+        self.reconnects += 1
+        return delay
+
+
+class BulkStream(_Checkpoints, Generic[T]):
+    """
+    Iterator over the records of a bulk export, decoding one line at a time so memory use does not grow with
+    the size of the export.
+
+    The request is sent on the first iteration (or by `open`). An error status raises `APIError` holding the
+    `ErrorResponse` or `RateLimitResponse`; an empty export (204) is an empty stream. The HTTP response is
+    closed once the stream is exhausted, on error, or by `close` / leaving a `with` block.
+
+    `cursor` is the position in the export. When the connection drops, the stream reconnects (up to
+    `max_reconnects` times in a row) with the query narrowed by `resume_query`, and skips the records already
+    delivered. Passing a saved cursor resumes an export the same way.
+
+    With `pipeline`, a reader thread pulls lines from the socket while they are decoded, see
+    `PipelineOptions`.
+
+    With `raw`, the undecoded lines (`bytes`, without the newline) are yielded instead and nothing is parsed;
+    such a stream does not reconnect and only counts records in its cursor. `write_to` copies the whole body
+    to a file without splitting it into lines.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], tuple[requests.Response, int]],
+        query: str,
+        decode: Callable[[Any], T],
+        loads: JSONDecoder,
+        kind: RecordKind,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        backoff: Callable[[int], float] | None = None,
+        pipeline: PipelineOptions | None = None,
+        raw: bool = False,
+        hooks: Hooks | None = None,
+        endpoint: str = "",
+        progress: ProgressOptions | None = None,
+    ) -> None:
+        if raw and pipeline is not None:
+            raise ValueError("raw streams are not decoded, pipeline does not apply")
+        super().__init__(
+            query,
+            kind,
+            cursor,
+            max_reconnects,
+            backoff,
+            raw,
+            hooks,
+            endpoint,
+            progress,
+        )
+        self._send = send
+        self._loads, self._decode = self._instrument(loads, decode)
+        self._lines: Iterator[bytes] | None = None
+        self._records = self._generate()
+        self.pipeline = pipeline
+        self.response: requests.Response | None = None
+        self.retries = 0
+
+    def open(self) -> None:
+        """Send the request and check its status, if not done yet."""
+        self._open()
+
+    def _open(self) -> Iterator[bytes]:
+        if self._lines is not None:
+            return self._lines
+        while True:
+            try:
+                self.response, self.retries = self._send(self._request_query())
+                break
+            except TRANSIENT_ERRORS as e:
+                time.sleep(self._reconnect_delay(e))
+        if self.response.status_code == 200:
+            lines = iter_ndjson_lines(self._chunks())
+        elif self.response.status_code == 204:
+            lines = iter(())
+        else:
+            error = _api_error(self.response, self.retries, self._loads)
+            self._close_response()
+            raise error
+        self._lines = lines
+        return lines
+
+    def _chunks(self) -> Iterator[bytes]:
+        """The body chunks of the response, accounted for in the stats as they arrive."""
+        assert self.response is not None
+        # Bytes read from the socket, before decompression, if the transport tells.
+        tell = getattr(self.response.raw, "tell", None)
+        base = self.stats.wire_bytes
+        it = self.response.iter_content(STREAM_CHUNK_SIZE)
+        while True:
+            start = time.perf_counter()
+            chunk = next(it, None)
+            if chunk is None:
+                return
+            wire = base + tell() if callable(tell) else None
+            self._on_chunk(len(chunk), time.perf_counter() - start, wire)
+            yield chunk
+
+    def write_to(self, out: IO[bytes]) -> int:
+        """
+        Copy the undecoded NDJSON body to `out` (any object with a binary `write`) in large chunks, and close
+        the stream. Nothing is parsed and a dropped connection is not resumed. Returns the number of bytes
+        written. The stream must not have been iterated.
+        """
+        if inspect.getgeneratorstate(self._records) != inspect.GEN_CREATED:
+            raise ValueError("write_to on a stream that is already being iterated")
+        written = 0
+        try:
+            self._start()
+            self._open()
+            if self.response is not None and self.response.status_code == 200:
+                for chunk in self._chunks():
+                    out.write(chunk)
+                    written += len(chunk)
+        finally:
+            self.close()
+        return written
+
+    def close(self) -> None:
+        # ValueError: being iterated by another thread, closing the response interrupts it.
+        with contextlib.suppress(ValueError):
+            self._records.close()
+        self._close_response()
+        self._finish()
+
+    def _close_response(self) -> None:
+        self._report()
+        if self.response is not None:
+            self.response.close()
+
+    def __iter__(self) -> "BulkStream[T]":
+        return self
+
+    def __next__(self) -> T:
+        return next(self._records)
+
+    def _generate(self) -> Generator[T, None, None]:
+        try:
+            self._start()
+            while True:
+                lines = self._open()
+                try:
+                    if self.pipeline is None:
+                        yield from self._read_inline(lines)
+                    else:
+                        yield from self._read_pipelined(lines, self.pipeline)
+                    return
+                except TRANSIENT_ERRORS as e:
+                    self._close_response()
+                    self._lines = None
+                    time.sleep(self._reconnect_delay(e))
+        finally:
+            self._close_response()
+            self._finish()
+
+    def _read_inline(self, lines: Iterable[bytes]) -> Iterator[T]:
+        stats = self.stats
+        if self.raw:
+            for line in lines:
+                if line:
+                    self.cursor.count += 1
+                    stats.records += 1
+                    yield cast(T, line)
+            return
+        clock = time.perf_counter
+        for line in lines:
+            if line:
+                start = clock()
+                raw = self._loads(line)
+                if self._accept(self.kind.position(raw)):
+                    record = self._decode(raw)
+                    stats.parse_time += clock() - start
+                    stats.records += 1
+                    yield record
+                else:
+                    stats.parse_time += clock() - start
+
+    def _read_pipelined(
+        self, lines: Iterator[bytes], options: PipelineOptions
+    ) -> Iterator[T]:
+        run = _PipelineRun(lines, options, self.stats)
+        try:
+            while (batch := run.get()) is not None:
+                yield from self._read_inline(batch)
+        finally:
+            run.close()
+
+    def __enter__(self) -> "BulkStream[T]":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class AsyncBulkStream(_Checkpoints, Generic[T]):
+    """Async version of `BulkStream`, to be consumed with `async for`. `raw` works the same way."""
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[tuple[httpx.Response, int]]],
+        query: str,
+        decode: Callable[[Any], T],
+        loads: JSONDecoder,
+        kind: RecordKind,
+        cursor: BulkCursor | None = None,
+        max_reconnects: int = DEFAULT_MAX_RECONNECTS,
+        backoff: Callable[[int], float] | None = None,
+        raw: bool = False,
+        hooks: Hooks | None = None,
+        endpoint: str = "",
+        progress: ProgressOptions | None = None,
+    ) -> None:
+        super().__init__(
+            query,
+            kind,
+            cursor,
+            max_reconnects,
+            backoff,
+            raw,
+            hooks,
+            endpoint,
+            progress,
+        )
+        self._send = send
+        self._loads, self._decode = self._instrument(loads, decode)
+        self._lines: AsyncIterator[bytes] | None = None
+        self.response: httpx.Response | None = None
+        self.retries = 0
+
+    async def open(self) -> None:
+        """Send the request and check its status, if not done yet."""
+        await self._open()
+
+    async def _open(self) -> AsyncIterator[bytes]:
+        if self._lines is not None:
+            return self._lines
+        while True:
+            try:
+                self.response, self.retries = await self._send(self._request_query())
+                break
+            except ASYNC_TRANSIENT_ERRORS as e:
+                await asyncio.sleep(self._reconnect_delay(e))
+        if self.response.status_code == 200:
+            lines = aiter_ndjson_lines(self._chunks())
+        elif self.response.status_code == 204:
+            lines = _empty()
+        else:
+            try:
+                await self.response.aread()
+            finally:
+                await self.aclose()
+            raise _api_error(self.response, self.retries, self._loads)
+        self._lines = lines
+        return lines
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        """The body chunks of the response, accounted for in the stats as they arrive."""
+        response = self.response
+        assert response is not None
+        base = self.stats.wire_bytes
+        it = aiter(response.aiter_bytes(STREAM_CHUNK_SIZE))
+        while True:
+            start = time.perf_counter()
+            chunk = await anext(it, None)
+            if chunk is None:
+                return
+            # Zero when the transport did not stream the body (e.g. mocked): unknown.
+            downloaded = response.num_bytes_downloaded
+            wire = base + downloaded if downloaded else None
+            self._on_chunk(len(chunk), time.perf_counter() - start, wire)
+            yield chunk
+
+    async def write_to(self, out: IO[bytes]) -> int:
+        """Copy the undecoded body to `out` in large chunks, see `BulkStream.write_to`."""
+        if self._started:
+            raise ValueError("write_to on a stream that is already being iterated")
+        written = 0
+        try:
+            self._start()
+            await self._open()
+            if self.response is not None and self.response.status_code == 200:
+                async for chunk in self._chunks():
+                    out.write(chunk)
+                    written += len(chunk)
+        finally:
+            await self.aclose()
+        return written
+
+    async def aclose(self) -> None:
+        await self._close_response()
+        self._finish()
+
+    async def _close_response(self) -> None:
+        self._report()
+        if self.response is not None:
+            await self.response.aclose()
+
+    def __aiter__(self) -> "AsyncBulkStream[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        self._start()
+        try:
+            return await self._next()
+        except StopAsyncIteration:
+            raise
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def _next(self) -> T:
+        while True:
+            try:
+                lines = await self._open()
+                async for line in lines:
+                    if self.raw:
+                        self.cursor.count += 1
+                        self.stats.records += 1
+                        return cast(T, line)
+                    start = time.perf_counter()
+                    raw = self._loads(line)
+                    if self._accept(self.kind.position(raw)):
+                        record = self._decode(raw)
+                        self.stats.parse_time += time.perf_counter() - start
+                        self.stats.records += 1
+                        return record
+                    self.stats.parse_time += time.perf_counter() - start
+            except ASYNC_TRANSIENT_ERRORS as e:
+                await self._close_response()
+                self._lines = None
+                await asyncio.sleep(self._reconnect_delay(e))
+                continue
+            await self.aclose()
+            raise StopAsyncIteration
+
+    async def __aenter__(self) -> "AsyncBulkStream[T]":
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.aclose()
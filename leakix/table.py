@@ -0,0 +1,273 @@
+"""
+In-memory columnar table of events for vectorized analysis (requires `numpy`).
+
+An `EventTable` keeps the common fields of `L9Event` in NumPy arrays instead of one Python object per event.
+Low-cardinality text fields (country, plugin, protocol...) are categorical: each distinct value is stored
+once and rows hold an integer code, so filtering and counting on them compares integers.
+
+    >>> table = EventTable.from_records(client.bulk_service_stream(queries, fields=EVENT_TABLE_COLUMNS.fields))
+    >>> table.where(country="France").count_by("plugin")
+"""
+
+from collections.abc import Iterable
+from datetime import UTC, datetime
+from itertools import islice
+from typing import Any
+
+from l9format import l9format
+
+from leakix.columnar import (
+    CATEGORY,
+    INT,
+    STRING,
+    TIMESTAMP,
+    Column,
+    ColumnSchema,
+    int_or_none,
+)
+
+DEFAULT_CHUNK_SIZE = 65536
+# Value of integer columns for missing or non numeric values.
+MISSING_INT = -1
+
+EVENT_TABLE_COLUMNS = ColumnSchema(
+    l9format.L9Event,
+    [
+        Column("ip", "ip"),
+        Column("port", "port", INT),
+        Column("host", "host"),
+        Column("plugin", "event_source", CATEGORY),
+        Column("event_type", "event_type", CATEGORY),
+        Column("protocol", "protocol", CATEGORY),
+        Column("time", "time", TIMESTAMP),
+        Column("http_status", "http.status", INT),
+        Column("software", "service.software.name", CATEGORY),
+        Column("leak_severity", "leak.severity", CATEGORY),
+        Column("country", "geoip.country_name", CATEGORY),
+        Column("country_code", "geoip.country_iso_code", CATEGORY),
+        Column("asn", "network.asn", INT),
+        Column("organization", "network.organization_name", CATEGORY),
+    ],
+)
+
+
+def _numpy() -> Any:
+    try:
+        import numpy  # type: ignore[import-not-found, import-untyped, unused-ignore]
+    except ImportError as e:
+        raise ImportError(
+            "EventTable requires numpy: pip install 'leakix[numpy]'"
+        ) from e
+    return numpy
+
+
+def _to_int(value: Any) -> int:
+    number = int_or_none(value)
+    return MISSING_INT if number is None else number
+
+
+def _to_datetime64(value: Any) -> Any:
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value
+
+
+class EventTable:
+    """
+    Columns of events: `INT` columns are int64 arrays (`MISSING_INT` when absent), `TIMESTAMP` columns
+    datetime64[us] in UTC (NaT when absent), `STRING` columns object arrays and `CATEGORY` columns int32 codes
+    into `categories(name)` (-1 when absent).
+
+    Build it with `from_records` or `extend`, from any iterator of the clients: decoded events, their raw
+    dicts, or, fastest, records projected on `schema.fields`. Records are converted `chunk_size` at a time.
+    Filtering and sorting return new tables with the same categories.
+    """
+
+    def __init__(self, schema: ColumnSchema = EVENT_TABLE_COLUMNS) -> None:
+        self.schema = schema
+        self._np = _numpy()
+        self._types = {column.name: column.type for column in schema.columns}
+        self._codes: dict[str, dict[str, int]] = {
+            name: {} for name, kind in self._types.items() if kind == CATEGORY
+        }
+        self._categories: dict[str, list[str]] = {name: [] for name in self._codes}
+        self._chunks: list[dict[str, Any]] = []
+        self._columns: dict[str, Any] = {
+            name: self._empty(kind) for name, kind in self._types.items()
+        }
+        self._length = 0
+
+    @classmethod
+    def from_records(
+        cls,
+        records: Iterable[Any],
+        schema: ColumnSchema = EVENT_TABLE_COLUMNS,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> "EventTable":
+        table = cls(schema)
+        table.extend(records, chunk_size)
+        return table
+
+    def _empty(self, kind: str) -> Any:
+        np = self._np
+        if kind == INT:
+            return np.empty(0, dtype=np.int64)
+        if kind == CATEGORY:
+            return np.empty(0, dtype=np.int32)
+        if kind == TIMESTAMP:
+            return np.empty(0, dtype="datetime64[us]")
+        return np.empty(0, dtype=object)
+
+    def _encode(self, name: str, values: Iterable[Any]) -> Any:
+        codes = self._codes[name]
+        categories = self._categories[name]
+        out = []
+        for value in values:
+            if value is None:
+                out.append(-1)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(categories)
+                categories.append(value)
+            out.append(code)
+        return self._np.array(out, dtype=self._np.int32)
+
+    def _convert(self, name: str, values: tuple[Any, ...]) -> Any:
+        np = self._np
+        kind = self._types[name]
+        if kind == INT:
+            return np.fromiter(map(_to_int, values), dtype=np.int64, count=len(values))
+        if kind == CATEGORY:
+            return self._encode(name, values)
+        if kind == TIMESTAMP:
+            return np.array([_to_datetime64(v) for v in values], dtype="datetime64[us]")
+        array = np.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    def extend(
+        self, records: Iterable[Any], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> "EventTable":
+        """Append `records`, consuming them `chunk_size` at a time. Returns the table."""
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be positive")
+        it = iter(records)
+        names = list(self._types)
+        while chunk := list(islice(it, chunk_size)):
+            columns = zip(*(self.schema.row(record) for record in chunk), strict=True)
+            self._chunks.append(
+                {
+                    name: self._convert(name, values)
+                    for name, values in zip(names, columns, strict=True)
+                }
+            )
+            self._length += len(chunk)
+        return self
+
+    def _consolidate(self) -> dict[str, Any]:
+        if self._chunks:
+            np = self._np
+            self._columns = {
+                name: np.concatenate(
+                    [self._columns[name]] + [c[name] for c in self._chunks]
+                )
+                for name in self._types
+            }
+            self._chunks = []
+        return self._columns
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._types)
+
+    def __getitem__(self, name: str) -> Any:
+        """The array of a column; codes for a categorical column, see `column` for its values."""
+        if name not in self._types:
+            raise KeyError(f"Unknown column {name!r}, expected one of {self.names}")
+        return self._consolidate()[name]
+
+    def categories(self, name: str) -> list[str]:
+        """Values of a categorical column, indexed by code."""
+        return self._categories[name]
+
+    def column(self, name: str) -> Any:
+        """The values of a column; categorical columns are decoded to an object array (None when absent)."""
+        values = self[name]
+        if self._types[name] != CATEGORY:
+            return values
+        # Absent values have code -1, which picks the trailing None.
+        lookup = self._np.array([*self._categories[name], None], dtype=object)
+        return lookup[values]
+
+    def equals(self, name: str, value: Any) -> Any:
+        """Boolean mask of the rows where column `name` is `value`."""
+        values = self[name]
+        if self._types[name] == CATEGORY:
+            code = -1 if value is None else self._codes[name].get(value)
+            if code is None:
+                return self._np.zeros(len(values), dtype=bool)
+            return values == code
+        if self._types[name] == INT:
+            value = _to_int(value)
+        elif self._types[name] == TIMESTAMP:
+            value = self._np.datetime64(_to_datetime64(value), "us")
+        return values == value
+
+    def isin(self, name: str, values: Iterable[Any]) -> Any:
+        """Boolean mask of the rows where column `name` is one of `values`."""
+        mask = self._np.zeros(len(self), dtype=bool)
+        for value in values:
+            mask |= self.equals(name, value)
+        return mask
+
+    def filter(self, mask: Any) -> "EventTable":
+        """The rows selected by a boolean mask (or an array of indices), as a new table."""
+        columns = self._consolidate()
+        table = EventTable.__new__(EventTable)
+        table.schema = self.schema
+        table._np = self._np
+        table._types = self._types
+        table._codes = {name: dict(codes) for name, codes in self._codes.items()}
+        table._categories = {name: list(c) for name, c in self._categories.items()}
+        table._chunks = []
+        table._columns = {name: values[mask] for name, values in columns.items()}
+        table._length = len(next(iter(table._columns.values()), ()))
+        return table
+
+    def where(self, **conditions: Any) -> "EventTable":
+        """Rows where every given column equals the given value, e.g. `where(country="France", port=443)`."""
+        mask = self._np.ones(len(self), dtype=bool)
+        for name, value in conditions.items():
+            mask &= self.equals(name, value)
+        return self.filter(mask)
+
+    def sort(self, name: str, descending: bool = False) -> "EventTable":
+        """Rows sorted by column `name` (categorical columns by value), keeping the order of equal rows."""
+        np = self._np
+        values = self.column(name)
+        if self._types[name] in (STRING, CATEGORY):
+            values = np.array(["" if v is None else v for v in values])
+        # Ranks rather than values: negating them sorts descending while staying stable.
+        _, ranks = np.unique(values, return_inverse=True)
+        return self.filter(np.argsort(-ranks if descending else ranks, kind="stable"))
+
+    def count_by(self, name: str) -> dict[Any, int]:
+        """Number of rows per value of column `name`, most frequent first (None counts absent categories)."""
+        np = self._np
+        values = self[name]
+        if self._types[name] == CATEGORY:
+            counts = np.bincount(values + 1, minlength=len(self._categories[name]) + 1)
+            labels: list[Any] = [None, *self._categories[name]]
+        else:
+            if self._types[name] == STRING:
+                values = np.array(["" if v is None else v for v in values])
+            uniques, counts = np.unique(values, return_counts=True)
+            labels = uniques.tolist()
+        order = np.argsort(-counts, kind="stable")
+        return {labels[i]: int(counts[i]) for i in order if counts[i]}
@@ -0,0 +1,153 @@
+"""
+Incremental polling of a search, emitting only the events that previous polls have not seen.
+
+Every poll asks for the events from the day of the newest event seen so far (the high-water mark), stops
+walking the pages once it meets events already seen, and decodes only the new ones. The high-water mark and
+the hashes of the events seen in its window make up a `WatchState`, which can be saved between runs.
+"""
+
+import dataclasses
+import hashlib
+import json
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from typing import Any
+
+from leakix.fast_decode import decode_event
+from leakix.field import Operator, TimeField
+from leakix.query import AbstractQuery, MustQuery, RawQuery
+
+DEFAULT_WATCH_INTERVAL = 300.0
+# Number of event hashes kept to recognise already seen events.
+DEFAULT_SEEN_CAPACITY = 65536
+# Pages requested by one poll at most, when nothing already seen is met.
+DEFAULT_MAX_PAGES = 50
+
+_KEY_FIELDS = ("event_source", "ip", "port", "host", "time")
+
+
+def event_hash(raw: dict[str, Any]) -> int:
+    """64-bit hash identifying a raw event by its plugin, ip, port, host and time."""
+    key = "|".join(str(raw.get(name)) for name in _KEY_FIELDS)
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest())
+
+
+def _time(raw: dict[str, Any]) -> datetime | None:
+    value = raw.get("time")
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@dataclasses.dataclass
+class WatchState:
+    """
+    Progress of a watch: the time of the newest event emitted and, for the events of its day and after, their
+    hashes (see `event_hash`) with their day. Persist it with `to_json` and pass it back to `watch` to resume
+    without emitting the same events again.
+    """
+
+    high_water: str | None = None
+    seen: dict[int, str] = dataclasses.field(default_factory=dict)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"high_water": self.high_water, "seen": list(self.seen.items())}
+        )
+
+    @classmethod
+    def from_json(cls, s: str) -> "WatchState":
+        data = json.loads(s)
+        return cls(
+            high_water=data.get("high_water"),
+            seen={int(h): day for h, day in data.get("seen", [])},
+        )
+
+
+class Watcher:
+    """
+    The polls of one watch, shared by `Client.watch` and `AsyncClient.watch`, which only fetch the pages.
+
+    For each poll: `start`, then `queries` to request, `page` for each page received while it says more are
+    needed, `emit` for each new event yielded, and `finish` once the poll is complete, which moves the
+    high-water mark. A poll interrupted before `finish` leaves the mark where it was, so the next one covers
+    the same range again; the events it did emit are recognised by their hash.
+    """
+
+    def __init__(
+        self,
+        queries: str | list[AbstractQuery] | None,
+        state: WatchState | None = None,
+        decode: Callable[[Any], Any] = decode_event,
+        page_size: int = 20,
+        capacity: int = DEFAULT_SEEN_CAPACITY,
+    ) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        if isinstance(queries, str):
+            queries = [RawQuery(queries)]
+        self.base_queries = list(queries or [])
+        self.state = state if state is not None else WatchState()
+        self.decode = decode
+        self.page_size = page_size
+        self.capacity = capacity
+        self._floor: datetime | None = None
+        self._newest: tuple[datetime, str] | None = None
+
+    def start(self) -> None:
+        hw = self.state.high_water
+        self._floor = datetime.fromisoformat(hw) if hw is not None else None
+        self._newest = None
+
+    def queries(self) -> list[AbstractQuery]:
+        """The queries of the current poll: the watched ones, restricted to the day of the high-water mark on."""
+        if self._floor is None:
+            return list(self.base_queries)
+        since = TimeField(self._floor - timedelta(days=1), Operator.StrictlyGreater)
+        return [*self.base_queries, MustQuery(since)]
+
+    def page(self, raws: list[Any]) -> tuple[list[Any], bool]:
+        """
+        The raw events of a page of results (newest first) not seen yet, and whether the next page may hold
+        more. Pagination stops after a short page, or once an event already seen at or before the previous
+        high-water mark is met: the following ones are older still.
+        """
+        seen = self.state.seen
+        new = []
+        hashes = set()
+        more = len(raws) >= self.page_size
+        for raw in raws:
+            h = event_hash(raw)
+            if h in seen:
+                when = _time(raw)
+                if self._floor is not None and when is not None and when <= self._floor:
+                    more = False
+            elif h not in hashes:
+                hashes.add(h)
+                new.append(raw)
+        return new, more
+
+    def emit(self, raw: dict[str, Any]) -> Any:
+        """Record a new raw event as seen and decode it. Called as each event is yielded, not before."""
+        seen = self.state.seen
+        when = _time(raw)
+        seen[event_hash(raw)] = raw["time"][:10] if when is not None else ""
+        if len(seen) > self.capacity:
+            # Dicts keep insertion order: forget the oldest hash.
+            del seen[next(iter(seen))]
+        if when is not None and (self._newest is None or when > self._newest[0]):
+            self._newest = (when, raw["time"])
+        return self.decode(raw)
+
+    def finish(self) -> None:
+        """Record a complete poll: move the high-water mark and forget the hashes of days no longer requested."""
+        if self._newest is not None and (
+            self._floor is None or self._newest[0] > self._floor
+        ):
+            self.state.high_water = self._newest[1]
+            day = self.state.high_water[:10]
+            self.state.seen = {h: d for h, d in self.state.seen.items() if d >= day}
+        self._floor = self._newest = None
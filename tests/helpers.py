@@ -0,0 +1,45 @@
+"""Payloads shared by the tests, derived from the recorded host fixture."""
+
+import json
+from pathlib import Path
+
+HOST_FIXTURE = (
+    Path(__file__).parent / "results" / "host" / "success" / "78.47.222.185.json"
+)
+EMPTY_NETWORK = {"organization_name": "", "asn": 0, "network": ""}
+
+
+def load_event() -> dict:
+    """The first service of the host fixture, a valid L9Event payload."""
+    with open(HOST_FIXTURE) as f:
+        return json.load(f)["Services"][0]
+
+
+def make_event(i: int) -> dict:
+    """`load_event` with an ip of its own: events built for distinct `i` are distinct."""
+    return {**load_event(), "ip": f"10.0.{i // 256}.{i % 256}"}
+
+
+def make_events(count: int) -> list[dict]:
+    """`count` distinct events, see `make_event`."""
+    return [make_event(i) for i in range(count)]
+
+
+def make_aggregation(events: list[dict], i: int = 0, **changes) -> dict:
+    """A valid L9Aggregation payload grouping `events`, with `changes` applied."""
+    return {
+        "summary": None,
+        "ip": f"10.0.0.{i}",
+        "resource_id": f"resource-{i}",
+        "open_ports": [],
+        "leak_count": 0,
+        "leak_event_count": 0,
+        "events": events,
+        "plugins": [],
+        "geoip": events[0]["geoip"] if events else {},
+        "network": events[0]["network"] if events else EMPTY_NETWORK,
+        "creation_date": "2021-11-21T21:46:52Z",
+        "update_date": "2021-11-22T21:46:52Z",
+        "fresh": False,
+        **changes,
+    }
@@ -0,0 +1,116 @@
+import asyncio
+
+import httpx
+import pytest
+
+from leakix import APIError, AsyncClient, Scope
+from tests.helpers import make_event
+
+
+def mock_transport(client: AsyncClient, handler) -> list[httpx.Request]:
+    """Route the client's requests to `handler` and record them."""
+    calls: list[httpx.Request] = []
+
+    def record(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return handler(request)
+
+    client._client = httpx.AsyncClient(
+        base_url=client.base_url, transport=httpx.MockTransport(record)
+    )
+    return calls
+
+
+def search_pages(total: int):
+    events = [make_event(i) for i in range(total)]
+    size = AsyncClient.MAX_RESULTS_PER_PAGE
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        page = int(request.url.params["page"])
+        return httpx.Response(200, json=events[page * size : (page + 1) * size])
+
+    return handler
+
+
+EMPTY_HOST = {"Services": [], "Leaks": []}
+
+
+async def collect(aiterator):
+    return [item async for item in aiterator]
+
+
+class TestAiterSearch:
+    @pytest.mark.parametrize("prefetch", [0, 1, 3])
+    def test_walks_all_pages(self, prefetch):
+        client = AsyncClient()
+        mock_transport(client, search_pages(45))
+        events = asyncio.run(collect(client.aiter_search("*", prefetch=prefetch)))
+        assert [e.ip for e in events] == [make_event(i)["ip"] for i in range(45)]
+
+    @pytest.mark.parametrize("prefetch", [1, 2, 5])
+    @pytest.mark.parametrize(("total", "requests"), [(25, 2), (45, 3), (40, 3)])
+    def test_no_requests_past_the_results(self, prefetch, total, requests):
+        client = AsyncClient()
+        calls = mock_transport(client, search_pages(total))
+        events = asyncio.run(collect(client.aiter_search(prefetch=prefetch)))
+        assert len(events) == total
+        assert len(calls) == requests
+
+    def test_serial_request_count(self):
+        client = AsyncClient()
+        calls = mock_transport(client, search_pages(40))
+        events = asyncio.run(collect(client.aiter_search(prefetch=0)))
+        assert len(events) == 40
+        assert len(calls) == 3
+
+    def test_max_results(self):
+        client = AsyncClient()
+        calls = mock_transport(client, search_pages(100))
+        events = asyncio.run(
+            collect(client.aiter_search(scope=Scope.SERVICE, max_results=21))
+        )
+        assert len(events) == 21
+        assert len(calls) == 2
+        assert calls[0].url.params["scope"] == "service"
+
+    def test_error_raises(self):
+        client = AsyncClient()
+        mock_transport(client, lambda request: httpx.Response(401, json={}))
+        with pytest.raises(APIError):
+            asyncio.run(collect(client.aiter_search()))
+
+
+class TestBatchLookups:
+    def test_get_hosts(self):
+        client = AsyncClient()
+        calls = mock_transport(client, lambda r: httpx.Response(200, json=EMPTY_HOST))
+        ips = [f"10.0.0.{i}" for i in range(20)] + ["10.0.0.1"]
+        results = asyncio.run(collect(client.get_hosts(ips, concurrency=3)))
+        assert sorted(ip for ip, _ in results) == sorted(set(ips))
+        assert len(calls) == 20
+
+    def test_get_hosts_slows_down_on_rate_limit(self, monkeypatch):
+        delays = []
+
+        async def fake_sleep(delay):
+            delays.append(delay)
+
+        monkeypatch.setattr("leakix.async_client.asyncio.sleep", fake_sleep)
+        client = AsyncClient()
+        responses = iter(
+            [
+                httpx.Response(429, json={}, headers={"X-Limited-For": "2s"}),
+                httpx.Response(200, json=EMPTY_HOST),
+            ]
+        )
+        mock_transport(client, lambda r: next(responses))
+        [(ip, response)] = asyncio.run(collect(client.get_hosts(["1.1.1.1"])))
+        assert response.is_success()
+        assert response.retries == 1
+        assert 1.9 <= delays[0] <= 2.2
+
+    def test_get_many_subdomains(self):
+        client = AsyncClient()
+        mock_transport(client, lambda r: httpx.Response(200, json=[]))
+        results = asyncio.run(collect(client.get_many_subdomains(["A.com", "a.com"])))
+        assert [domain for domain, _ in results] == ["a.com"]
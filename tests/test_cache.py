@@ -0,0 +1,141 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import httpx
+import requests_mock
+
+from leakix import AsyncClient, Client, ErrorResponse, ResponseCache, SuccessResponse
+
+EMPTY_HOST = {"Services": [], "Leaks": []}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_response(status_code: int = 200):
+    mock = Mock()
+    mock.status_code = status_code
+    if status_code == 200:
+        return SuccessResponse(mock, response_json=[])
+    return ErrorResponse(mock, response_json={})
+
+
+class TestResponseCache:
+    def test_hit_and_miss_counters(self):
+        cache = ResponseCache()
+        assert cache.get("k") is None
+        response = make_response()
+        cache.set("host", "k", response)
+        assert cache.get("k") is response
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_ttl_per_endpoint(self):
+        clock = FakeClock()
+        cache = ResponseCache(ttls={"host": 10, "plugins": 100}, clock=clock)
+        cache.set("host", "host", make_response())
+        cache.set("plugins", "plugins", make_response())
+        clock.now = 50
+        assert cache.get("host") is None
+        assert cache.get("plugins") is not None
+
+    def test_negative_caching(self):
+        clock = FakeClock()
+        cache = ResponseCache(negative_ttl=5, clock=clock)
+        cache.set("host", "404", make_response(404))
+        cache.set("host", "500", make_response(500))
+        assert cache.get("404") is not None
+        assert cache.get("500") is None
+        clock.now = 6
+        assert cache.get("404") is None
+
+    def test_unknown_endpoint_is_not_cached(self):
+        cache = ResponseCache()
+        cache.set("search", "k", make_response())
+        assert len(cache) == 0
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.set("host", "a", make_response())
+        cache.set("host", "b", make_response())
+        cache.get("a")
+        cache.set("host", "c", make_response())
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+        assert cache.evictions == 1
+
+    def test_thread_safety(self):
+        cache = ResponseCache(max_entries=50)
+
+        def work(i):
+            cache.set("host", i % 100, make_response())
+            cache.get((i + 1) % 100)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(work, range(5000)))
+        assert len(cache) <= 50
+        assert cache.hits + cache.misses == 5000
+
+
+class TestClientCache:
+    def test_get_host_is_cached(self):
+        client = Client(cache=ResponseCache())
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/host/1.1.1.1", json=EMPTY_HOST)
+            first = client.get_host("1.1.1.1")
+            second = client.get_host("1.1.1.1")
+            assert m.call_count == 1
+            assert second is first
+        assert client.cache.hits == 1
+
+    def test_404_is_cached(self):
+        client = Client(cache=ResponseCache())
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/api/plugins/Nope", json={}, status_code=404)
+            assert client.get_plugin("Nope").is_error()
+            assert client.get_plugin("Nope").status_code() == 404
+            assert m.call_count == 1
+
+    def test_rate_limited_is_not_cached(self):
+        client = Client(cache=ResponseCache())
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/api/subdomains/a.com", json={}, status_code=429)
+            client.get_subdomains("a.com")
+            client.get_subdomains("a.com")
+            assert m.call_count == 2
+
+    def test_cache_is_keyed_on_api_key(self):
+        cache = ResponseCache()
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=[])
+            Client(api_key="a", cache=cache).get_plugins()
+            Client(api_key="b", cache=cache).get_plugins()
+            Client(api_key="a", cache=cache).get_plugins()
+            assert m.call_count == 2
+
+
+class TestAsyncClientCache:
+    def test_get_domain_is_cached(self):
+        client = AsyncClient(cache=ResponseCache())
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json=EMPTY_HOST)
+
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            await client.get_domain("example.com")
+            await client.get_domain("example.com")
+
+        asyncio.run(run())
+        assert len(calls) == 1
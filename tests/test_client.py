@@ -1,10 +1,15 @@
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
+import requests
 import requests_mock
 
 from leakix import (
+    APIError,
     Client,
     CountryField,
     MustQuery,
@@ -12,13 +17,28 @@ from leakix import (
     PluginField,
     PortField,
     RawQuery,
+    ResponseCache,
     Scope,
 )
+from leakix.base import DEFAULT_TIMEOUT
+from tests.helpers import make_event
 
 RESULTS_DIR = Path(__file__).parent / "results"
 HOSTS_RESULTS_DIR = RESULTS_DIR / "host"
 HOSTS_SUCCESS_RESULTS_DIR = HOSTS_RESULTS_DIR / "success"
 HOSTS_404_RESULTS_DIR = HOSTS_RESULTS_DIR / "404"
+EMPTY_HOST = {"Services": [], "Leaks": []}
+
+
+def search_pages(total: int, page_size: int = Client.MAX_RESULTS_PER_PAGE):
+    """requests_mock callback serving `total` events split in pages."""
+    events = [make_event(i) for i in range(total)]
+
+    def callback(request, context):
+        page = int(request.qs["page"][0])
+        return events[page * page_size : (page + 1) * page_size]
+
+    return callback
 
 
 @pytest.fixture
@@ -62,6 +82,54 @@ class TestClientInit:
         assert client.headers["Accept"] == "application/json"
 
 
+class TestClientSession:
+    def test_session_is_reused(self, client, fake_ipv4):
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/{fake_ipv4}", json=EMPTY_HOST, status_code=200
+            )
+            client.get_host(fake_ipv4)
+            session = client._session
+            client.get_host(fake_ipv4)
+            assert session is not None
+            assert client._session is session
+
+    def test_pool_configuration(self):
+        client = Client(pool_connections=4, pool_maxsize=32, pool_block=True)
+        adapter = client._get_session().get_adapter("https://leakix.net")
+        assert adapter._pool_connections == 4
+        assert adapter._pool_maxsize == 32
+        assert adapter._pool_block is True
+
+    def test_context_manager_closes_session(self, fake_ipv4):
+        with Client() as client, requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/{fake_ipv4}", json=EMPTY_HOST, status_code=200
+            )
+            client.get_host(fake_ipv4)
+            assert client._session is not None
+        assert client._session is None
+
+    def test_keep_alive_disabled(self):
+        client = Client(keep_alive=False)
+        assert client.headers["Connection"] == "close"
+
+    def test_timeout(self, fake_ipv4):
+        client = Client(timeout=5)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/host/{fake_ipv4}", json=EMPTY_HOST)
+            m.get(f"{client.base_url}/bulk/service", text="")
+            client.get_host(fake_ipv4)
+            list(client.bulk_service_stream())
+            assert [r.timeout for r in m.request_history] == [5, 5]
+        assert Client().timeout == DEFAULT_TIMEOUT
+
+    def test_session_shared_between_threads(self, client):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            sessions = set(pool.map(lambda _: client._get_session(), range(32)))
+        assert len(sessions) == 1
+
+
 class TestGetHost:
     @pytest.mark.parametrize(
         "fixture_file",
@@ -380,3 +448,177 @@ class TestBulkService:
             response = client_with_api_key.bulk_service()
             assert response.is_error()
             assert response.status_code() == 429
+
+
+class TestIterSearch:
+    @pytest.mark.parametrize("prefetch", [0, 1, 3])
+    def test_walks_all_pages(self, client, prefetch):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(45))
+            events = list(client.iter_search("+country:FR", prefetch=prefetch))
+            assert [e.ip for e in events] == [make_event(i)["ip"] for i in range(45)]
+            pages = sorted(int(r.qs["page"][0]) for r in m.request_history)
+            assert pages[:3] == [0, 1, 2]
+
+    @pytest.mark.parametrize("prefetch", [1, 2, 5])
+    @pytest.mark.parametrize(("total", "requests"), [(25, 2), (45, 3), (40, 3)])
+    def test_no_requests_past_the_results(self, client, prefetch, total, requests):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(total))
+            assert len(list(client.iter_search(prefetch=prefetch))) == total
+            assert m.call_count == requests
+
+    def test_prefetches_pages_ahead(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(200))
+            events = client.iter_search(prefetch=2)
+            for _ in range(3):
+                next(events)
+                time.sleep(0.1)
+            # The page being consumed and the two after it, but no more.
+            assert m.call_count == 3
+            events.close()
+
+    def test_serial_stops_on_short_page(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(25))
+            assert len(list(client.iter_search(prefetch=0))) == 25
+            assert m.call_count == 2
+
+    def test_exact_multiple_of_page_size(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(40))
+            assert len(list(client.iter_search(prefetch=0))) == 40
+            assert m.call_count == 3
+
+    def test_max_results(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=search_pages(200))
+            events = list(client.iter_search(max_results=30, prefetch=4))
+            assert len(events) == 30
+            # Only the pages needed for 30 results are requested.
+            assert m.call_count == 2
+
+    def test_accepts_query_objects(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=[])
+            queries = [MustQuery(CountryField("France"))]
+            assert list(client.iter_search(queries, scope=Scope.SERVICE)) == []
+            assert m.last_request.qs["q"] == ["+country:france"]
+            assert m.last_request.qs["scope"] == ["service"]
+
+    def test_error_raises(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json={"error": "x"}, status_code=500)
+            with pytest.raises(APIError) as exc_info:
+                list(client.iter_search(prefetch=0))
+            assert exc_info.value.response.status_code() == 500
+
+    def test_negative_start_page(self, client):
+        with pytest.raises(ValueError):
+            next(client.iter_search(start_page=-1))
+
+
+class TestBatchLookups:
+    def test_get_hosts_normalises_and_dedupes(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=EMPTY_HOST)
+            results = dict(
+                client.get_hosts([" 1.1.1.1", "1.1.1.1", "2001:DB8::1", "8.8.8.8 "])
+            )
+            assert sorted(results) == ["1.1.1.1", "2001:db8::1", "8.8.8.8"]
+            assert all(r.is_success() for r in results.values())
+            assert m.call_count == 3
+
+    def test_get_hosts_invalid_ip(self, client):
+        with pytest.raises(ValueError, match="Invalid IP address"):
+            client.get_hosts(["1.1.1.1", "not-an-ip"])
+
+    def test_get_hosts_bounded_concurrency(self, client):
+        ips = [f"10.0.0.{i}" for i in range(50)]
+        lock = threading.Lock()
+        overlapping = threading.Event()
+        in_flight = peak = 0
+
+        class Adapter(requests.adapters.BaseAdapter):
+            """Answers every lookup, counting the calls in flight (requests_mock runs them one at a time)."""
+
+            def send(self, request, **kwargs):
+                nonlocal in_flight, peak
+                with lock:
+                    in_flight += 1
+                    peak = max(peak, in_flight)
+                    if in_flight > 1:
+                        overlapping.set()
+                # Hold the first call until a second one runs, and keep every call long enough to overlap.
+                overlapping.wait(timeout=1)
+                time.sleep(0.005)
+                with lock:
+                    in_flight -= 1
+                response = requests.Response()
+                response.status_code = 200
+                response.request = request
+                response.url = request.url
+                response._content = json.dumps(EMPTY_HOST).encode()
+                return response
+
+            def close(self):
+                pass
+
+        client._get_session().mount("https://", Adapter())
+        results = list(client.get_hosts(ips, concurrency=4))
+        assert sorted(ip for ip, _ in results) == sorted(ips)
+        assert 1 < peak <= 4
+
+    def test_get_hosts_slows_down_on_rate_limit(self, client, monkeypatch):
+        delays = []
+        monkeypatch.setattr("leakix.client.time.sleep", delays.append)
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/1.1.1.1",
+                [
+                    {"status_code": 429, "json": {}, "headers": {"Retry-After": "1"}},
+                    {"status_code": 200, "json": EMPTY_HOST},
+                ],
+            )
+            [(ip, response)] = list(client.get_hosts(["1.1.1.1"]))
+            assert ip == "1.1.1.1"
+            assert response.is_success()
+            assert response.retries == 1
+        assert len(delays) == 1
+
+    def test_get_hosts_does_not_change_shared_responses(self, monkeypatch):
+        monkeypatch.setattr("leakix.client.time.sleep", lambda delay: None)
+        client = Client(cache=ResponseCache())
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/1.1.1.1",
+                [
+                    {"status_code": 429, "json": {}, "headers": {"Retry-After": "1"}},
+                    {"status_code": 200, "json": EMPTY_HOST},
+                ],
+            )
+            [(_, response)] = list(client.get_hosts(["1.1.1.1"]))
+            cached = client.get_host("1.1.1.1")
+            assert m.call_count == 2
+        assert response.retries == 1
+        assert cached.retries == 0
+        assert cached.json() == response.json()
+
+    def test_get_domains(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=EMPTY_HOST)
+            results = dict(client.get_domains(["Example.com.", "example.com"]))
+            assert list(results) == ["example.com"]
+            assert m.last_request.path == "/domain/example.com"
+
+    def test_get_many_subdomains(self, client):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=[])
+            results = dict(client.get_many_subdomains(["a.com", "b.com"]))
+            assert sorted(results) == ["a.com", "b.com"]
+            assert all(r.json() == [] for r in results.values())
+
+    def test_empty_domain(self, client):
+        with pytest.raises(ValueError, match="Invalid domain"):
+            client.get_domains([" "])
@@ -0,0 +1,92 @@
+import json
+from datetime import UTC, datetime
+
+import pytest
+import requests_mock
+from l9format import l9format
+
+from leakix import Client
+from leakix.columnar import (
+    AGGREGATION_COLUMNS,
+    EVENT_COLUMNS,
+    Column,
+    ColumnSchema,
+    iter_record_batches,
+    to_arrow,
+    write_parquet,
+)
+from tests.helpers import make_events
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def tagged_events(count: int) -> list[dict]:
+    return [{**event, "tags": ["t"]} for event in make_events(count)]
+
+
+class TestColumnSchema:
+    def test_accepts_projected_models_and_dicts(self):
+        raw = tagged_events(1)[0]
+        projected = EVENT_COLUMNS.projection(raw)
+        model = l9format.L9Event.from_dict(raw)
+        assert EVENT_COLUMNS.row(projected) == EVENT_COLUMNS.row(raw)
+        assert EVENT_COLUMNS.row(model) == EVENT_COLUMNS.row(raw)
+
+    def test_arrow_schema(self):
+        schema = EVENT_COLUMNS.arrow_schema()
+        assert schema.names == EVENT_COLUMNS.names
+        assert schema.field("time").type == pa.timestamp("us", tz="UTC")
+        assert schema.field("tags").type == pa.list_(pa.string())
+        assert schema.field("latitude").type == pa.float64()
+
+    def test_custom_schema(self):
+        schema = ColumnSchema(
+            l9format.L9Event,
+            [Column("ip", "ip"), Column("status", "http.status", "int64")],
+        )
+        table = to_arrow(tagged_events(2), schema)
+        assert table.to_pydict() == {
+            "ip": ["10.0.0.0", "10.0.0.1"],
+            "status": [302, 302],
+        }
+
+
+class TestWriters:
+    def test_to_arrow(self):
+        events = tagged_events(3)
+        table = to_arrow(events, batch_size=2)
+        assert table.num_rows == 3
+        assert table.column("ip").to_pylist() == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+        row = table.slice(0, 1).to_pylist()[0]
+        assert row["plugin"] == events[0]["event_source"]
+        assert row["country"] == "Germany"
+        assert row["tags"] == ["t"]
+        assert row["time"] == datetime.fromisoformat(events[0]["time"]).astimezone(UTC)
+        assert isinstance(row["latitude"], float)
+
+    def test_batches(self):
+        batches = list(iter_record_batches(tagged_events(5), batch_size=2))
+        assert [b.num_rows for b in batches] == [2, 2, 1]
+
+    def test_empty(self):
+        table = to_arrow([], AGGREGATION_COLUMNS)
+        assert table.num_rows == 0
+        assert table.schema == AGGREGATION_COLUMNS.arrow_schema()
+
+    def test_write_parquet_from_stream(self, tmp_path):
+        client = Client(api_key="k")
+        body = "\n".join(json.dumps(e) for e in tagged_events(5))
+        path = tmp_path / "services.parquet"
+        progress = []
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=body)
+            stream = client.bulk_service_stream(fields=EVENT_COLUMNS.fields)
+            rows = write_parquet(stream, path, batch_size=2, on_batch=progress.append)
+        assert rows == 5
+        assert progress == [2, 4, 5]
+        parquet = pq.ParquetFile(path)
+        assert parquet.num_row_groups == 3
+        assert parquet.read().column("ip").to_pylist() == [
+            f"10.0.0.{i}" for i in range(5)
+        ]
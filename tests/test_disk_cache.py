@@ -0,0 +1,156 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import AsyncClient, Client, DiskCache
+from leakix.disk_cache import Freshness
+
+PLUGINS = [{"name": "GrafanaOpenPlugin", "description": "Grafana open instances"}]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def disk_cache(tmp_path, clock):
+    cache = DiskCache(
+        tmp_path / "cache.sqlite", ttls={"plugins": 60}, stale_ttl=60, clock=clock
+    )
+    yield cache
+    cache.close()
+
+
+class TestDiskCache:
+    def test_round_trip(self, disk_cache):
+        disk_cache.set("k", b'{"a": 1}' * 100, etag='"v1"', last_modified=None)
+        entry = disk_cache.get("k")
+        assert entry.body == b'{"a": 1}' * 100
+        assert entry.validators() == {"If-None-Match": '"v1"'}
+        # Bodies are stored compressed.
+        assert disk_cache.size() < 800
+
+    def test_persists_across_instances(self, tmp_path):
+        with DiskCache(tmp_path / "c.sqlite") as cache:
+            cache.set("k", b"[]")
+        with DiskCache(tmp_path / "c.sqlite") as cache:
+            assert cache.get("k").body == b"[]"
+
+    def test_freshness(self, disk_cache, clock):
+        disk_cache.set("k", b"[]")
+        entry = disk_cache.get("k")
+        assert disk_cache.freshness("plugins", entry) is Freshness.FRESH
+        clock.now += 90
+        assert disk_cache.freshness("plugins", entry) is Freshness.STALE
+        clock.now += 60
+        assert disk_cache.freshness("plugins", entry) is Freshness.EXPIRED
+
+    def test_touch_refreshes(self, disk_cache, clock):
+        disk_cache.set("k", b"[]")
+        clock.now += 1000
+        disk_cache.touch("k")
+        entry = disk_cache.get("k")
+        assert disk_cache.freshness("plugins", entry) is Freshness.FRESH
+
+    def test_size_bounded_eviction(self, tmp_path, clock):
+        with DiskCache(tmp_path / "c.sqlite", max_bytes=2000, clock=clock) as cache:
+            for i in range(10):
+                clock.now += 1
+                cache.set(f"k{i}", bytes(range(256)) * 2)
+            assert cache.size() <= 2000
+            assert cache.get("k9") is not None
+            assert cache.get("k0") is None
+
+
+class TestClientDiskCache:
+    def test_fresh_entry_skips_network(self, disk_cache):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=PLUGINS)
+            Client(disk_cache=disk_cache).get_plugins()
+            # A new client, e.g. after a restart, is served from disk.
+            response = Client(disk_cache=disk_cache).get_plugins()
+            assert m.call_count == 1
+        assert response.is_success()
+        assert response.json()[0].name == "GrafanaOpenPlugin"
+
+    def test_expired_entry_is_revalidated(self, disk_cache, clock):
+        client = Client(disk_cache=disk_cache)
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=PLUGINS, headers={"ETag": '"v1"'})
+            client.get_plugins()
+            clock.now += 1000
+            m.get(requests_mock.ANY, status_code=304)
+            response = client.get_plugins()
+            assert m.last_request.headers["If-None-Match"] == '"v1"'
+        assert response.is_success()
+        assert response.json()[0].name == "GrafanaOpenPlugin"
+        entry = disk_cache.get(
+            client._disk_cache_key(f"{client.base_url}/api/plugins", None)
+        )
+        assert disk_cache.freshness("plugins", entry) is Freshness.FRESH
+
+    def test_stale_entry_is_served_and_revalidated(self, disk_cache, clock):
+        client = Client(disk_cache=disk_cache)
+        updated = [{"name": "MongoOpenPlugin", "description": ""}]
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=PLUGINS)
+            client.get_plugins()
+            clock.now += 90
+            m.get(requests_mock.ANY, json=updated)
+            response = client.get_plugins()
+            assert response.json()[0].name == "GrafanaOpenPlugin"
+            deadline = time.monotonic() + 5
+            while client._revalidating and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert m.call_count == 2
+        assert client.get_plugins().json()[0].name == "MongoOpenPlugin"
+
+    def test_search_is_not_cached(self, disk_cache):
+        client = Client(disk_cache=disk_cache)
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=[])
+            client.search("*")
+            client.search("*")
+            assert m.call_count == 2
+        assert len(disk_cache) == 0
+
+    def test_api_key_is_not_stored(self, disk_cache, tmp_path):
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=PLUGINS)
+            Client(api_key="secret-key", disk_cache=disk_cache).get_plugins()
+        for path in tmp_path.iterdir():
+            assert b"secret-key" not in path.read_bytes()
+
+
+class TestAsyncClientDiskCache:
+    def test_fresh_entry_skips_network(self, disk_cache):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, content=json.dumps(PLUGINS).encode())
+
+        async def run():
+            for _ in range(2):
+                client = AsyncClient(disk_cache=disk_cache)
+                client._client = httpx.AsyncClient(
+                    base_url=client.base_url, transport=httpx.MockTransport(handler)
+                )
+                response = await client.get_plugins()
+                assert response.json()[0].name == "GrafanaOpenPlugin"
+
+        asyncio.run(run())
+        assert len(calls) == 1
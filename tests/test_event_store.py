@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from leakix import (
+    CountryField,
+    CustomField,
+    EventStore,
+    IPField,
+    MustNotQuery,
+    MustQuery,
+    Operator,
+    PortField,
+    RawQuery,
+    ShouldQuery,
+)
+from leakix.fast_decode import decode_aggregation, decode_event
+from leakix.matcher import compile_query
+from tests.helpers import load_event
+
+
+def make_event(**changes) -> dict:
+    return {**load_event(), **changes}
+
+
+EVENTS = [
+    make_event(
+        ip="10.0.0.1", port="443", host="a.example.be", time="2024-01-01T10:00:00Z"
+    ),
+    make_event(
+        ip="10.0.0.2", port="22", host="b.example.com", time="2024-01-02T10:00:00Z"
+    ),
+    make_event(
+        ip="10.0.0.3", port="8443", host="c.test.be", time="2024-01-03T10:00:00Z"
+    ),
+    make_event(
+        ip="10.0.0.4",
+        port="80",
+        host="d_example.be",
+        time="2024-01-04T10:00:00Z",
+        geoip={"country_name": "France"},
+    ),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with EventStore(tmp_path / "events.db") as store:
+        store.ingest(EVENTS)
+        yield store
+
+
+def ips(events) -> list[str]:
+    return sorted(e.ip for e in events)
+
+
+class TestEventStore:
+    @pytest.mark.parametrize(
+        "queries",
+        [
+            [MustQuery(PortField(443))],
+            [MustQuery(PortField(100, Operator.StrictlyGreater))],
+            [MustNotQuery(PortField(22)), MustQuery(CustomField(".be", "host"))],
+            [MustQuery(CustomField("_example", "host"))],
+            [MustQuery(CountryField("germany"))],
+            [MustNotQuery(CountryField("Germany"))],
+            [MustQuery(IPField("10.0.0.0/30"))],
+            [MustQuery(CustomField('"2024-01-02"', "time", Operator.StrictlyGreater))],
+            [ShouldQuery(PortField(22)), ShouldQuery(PortField(80))],
+            [RawQuery('+host:"example" -ip:10.0.0.2')],
+            [MustQuery(CustomField("*.be", "host"))],
+            None,
+        ],
+    )
+    def test_same_results_as_matcher(self, store, queries):
+        matches = compile_query(queries)
+        expected = [e["ip"] for e in EVENTS if matches(decode_event(e))]
+        assert ips(store.query(queries)) == sorted(expected)
+
+    def test_newest_first_and_limit(self, store, monkeypatch):
+        decoded = []
+
+        def decode(raw):
+            decoded.append(raw["ip"])
+            return decode_event(raw)
+
+        monkeypatch.setattr("leakix.event_store.decode_event", decode)
+        assert [e.ip for e in store.query(limit=2)] == ["10.0.0.4", "10.0.0.3"]
+        # Rows after the last match needed are not decoded.
+        assert decoded == ["10.0.0.4", "10.0.0.3"]
+
+    def test_ingest_decoded_events(self, tmp_path):
+        with EventStore(tmp_path / "events.db") as store:
+            store.ingest(decode_event(e) for e in EVENTS)
+            assert ips(store.query()) == ips(decode_event(e) for e in EVENTS)
+            assert store.query(limit=1)[0] == decode_event(EVENTS[3])
+
+    def test_upsert_keeps_newest(self, store):
+        assert len(store) == 4
+        store.ingest([{**EVENTS[0], "summary": "new", "time": "2024-02-01T00:00:00Z"}])
+        store.ingest([{**EVENTS[0], "summary": "old", "time": "2023-01-01T00:00:00Z"}])
+        assert len(store) == 4
+        (event,) = store.query([MustQuery(IPField("10.0.0.1"))])
+        assert event.summary == "new"
+
+    def test_aggregations_and_models(self, tmp_path):
+        aggregation = decode_aggregation(
+            {
+                "summary": None,
+                "ip": "10.0.0.9",
+                "resource_id": "r",
+                "open_ports": [],
+                "leak_count": 0,
+                "leak_event_count": 0,
+                "events": [
+                    make_event(ip="10.0.0.9"),
+                    make_event(ip="10.0.0.9", port="22"),
+                ],
+                "plugins": [],
+                "geoip": {},
+                "network": {"organization_name": "", "asn": 0, "network": ""},
+                "creation_date": "2024-01-01T00:00:00Z",
+                "update_date": "2024-01-05T00:00:00Z",
+                "fresh": False,
+            }
+        )
+        with EventStore(tmp_path / "events.db") as store:
+            assert store.ingest([aggregation, decode_event(EVENTS[0])]) == 3
+            assert ips(store.query([MustQuery(PortField(22))])) == ["10.0.0.9"]
+            assert len(store.query([MustQuery(IPField("10.0.0.1"))])) == 1
+
+    def test_fetches_misses_only(self, tmp_path):
+        clock = [1000.0]
+        fetched = []
+
+        def fetch(queries):
+            fetched.append(queries)
+            return [decode_event(e) for e in EVENTS]
+
+        queries = [MustQuery(PortField(443))]
+        with EventStore(tmp_path / "events.db", clock=lambda: clock[0]) as store:
+            assert ips(store.query(queries, fetch=fetch, max_age=60)) == ["10.0.0.1"]
+            assert ips(store.query(queries, fetch=fetch, max_age=60)) == ["10.0.0.1"]
+            assert len(fetched) == 1
+            assert store.harvested_at(queries) == 1000.0
+            clock[0] += 61
+            store.query(queries, fetch=fetch, max_age=60)
+            assert len(fetched) == 2
+
+    def test_persistent(self, tmp_path):
+        with EventStore(tmp_path / "events.db") as store:
+            store.ingest(EVENTS)
+        with EventStore(tmp_path / "events.db") as store:
+            assert len(store) == 4
+            assert store.delete_before(datetime(2024, 1, 3)) == 2
+            assert ips(store.query()) == ["10.0.0.3", "10.0.0.4"]
+
+    def test_aingest(self, tmp_path):
+        async def records():
+            for event in EVENTS:
+                yield decode_event(event)
+
+        with EventStore(tmp_path / "events.db") as store:
+            assert asyncio.run(store.aingest(records(), [])) == 4
+            assert store.harvested_at([]) is not None
+            assert len(store) == 4
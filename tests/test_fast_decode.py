@@ -0,0 +1,163 @@
+import copy
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+import pytest
+from l9format import l9format
+from l9format.l9format import Model, ValidationError
+
+from leakix.fast_decode import (
+    compile_decoder,
+    decode_aggregation,
+    decode_event,
+    encode_model,
+)
+from tests.helpers import HOST_FIXTURE, make_aggregation
+
+
+def load_events() -> list[dict]:
+    with open(HOST_FIXTURE) as f:
+        data = json.load(f)
+    return data["Services"] + (data["Leaks"] or [])
+
+
+def load_aggregation() -> dict:
+    """An aggregation of every fixture event, with nanosecond and offset timestamps."""
+    return make_aggregation(
+        load_events(),
+        summary="summary",
+        ip="78.47.222.185",
+        open_ports=["22", "443"],
+        leak_count=1,
+        leak_event_count=2,
+        plugins=["GitConfigHttpPlugin"],
+        creation_date="2021-11-21T21:46:52.123456789Z",
+        update_date="2021-11-22T21:46:52+02:00",
+        fresh=True,
+    )
+
+
+def assert_same_outcome(decode, cls, data):
+    try:
+        expected = cls.from_dict(data)
+    except Exception as e:
+        with pytest.raises(type(e)) as info:
+            decode(data)
+        assert str(info.value) == str(e)
+    else:
+        decoded = decode(data)
+        assert type(decoded) is cls
+        assert decoded == expected
+        assert decoded.to_dict() == expected.to_dict()
+        assert encode_model(decoded) == expected.to_dict()
+
+
+class TestEquivalence:
+    @pytest.mark.parametrize("index", range(len(load_events())))
+    def test_fixture_events(self, index):
+        assert_same_outcome(decode_event, l9format.L9Event, load_events()[index])
+
+    def test_aggregation(self):
+        assert_same_outcome(
+            decode_aggregation,
+            l9format.L9Aggregation,
+            load_aggregation(),
+        )
+
+    def test_field_types(self):
+        event = decode_event(load_events()[0])
+        assert isinstance(event.geoip.location.lat, Decimal)
+        assert event.time.tzinfo is not None
+        assert isinstance(event.network, l9format.Network)
+
+    def test_input_is_not_mutated(self):
+        data = load_aggregation()
+        original = copy.deepcopy(data)
+        decode_aggregation(data)
+        assert data == original
+
+    def test_unknown_keys_are_ignored(self):
+        data = {**load_events()[0], "unknown": 1}
+        assert_same_outcome(decode_event, l9format.L9Event, data)
+
+
+class TestErrors:
+    @pytest.fixture
+    def event(self):
+        return load_events()[0]
+
+    def test_not_a_dict(self):
+        assert_same_outcome(decode_event, l9format.L9Event, ["not", "a", "dict"])
+
+    @pytest.mark.parametrize("field", ["ip", "time", "geoip", "network", "tags"])
+    def test_missing_required_field(self, event, field):
+        del event[field]
+        assert_same_outcome(decode_event, l9format.L9Event, event)
+
+    @pytest.mark.parametrize(
+        ("field", "value"),
+        [
+            ("ip", None),
+            ("port", None),
+            ("time", None),
+            ("time", ""),
+            ("time", 12),
+            ("time", "yesterday"),
+            ("tags", "not-a-list"),
+            ("geoip", "not-a-dict"),
+            ("network", None),
+            ("summary", 42),
+        ],
+    )
+    def test_invalid_values(self, event, field, value):
+        event[field] = value
+        assert_same_outcome(decode_event, l9format.L9Event, event)
+
+    def test_invalid_nested_value(self, event):
+        event["geoip"]["location"]["lat"] = "north"
+        assert_same_outcome(decode_event, l9format.L9Event, event)
+
+    def test_invalid_list_item(self):
+        data = load_aggregation()
+        data["events"].append("not-an-event")
+        assert_same_outcome(decode_aggregation, l9format.L9Aggregation, data)
+
+    def test_nested_error_type(self, event):
+        del event["network"]["asn"]
+        with pytest.raises(ValidationError, match="missing required field: asn"):
+            decode_event(event)
+
+
+@dataclass
+class Inner(Model):
+    when: Optional[datetime]  # noqa: UP045 - l9format only treats Optional as optional
+
+
+@dataclass
+class Outer(Model):
+    name: str
+    inners: Optional[list[Inner]]  # noqa: UP045
+    by_name: dict[str, Inner]
+    matrix: list[list[int]]
+
+
+class TestCompileDecoder:
+    def test_is_cached(self):
+        assert compile_decoder(l9format.L9Event) is decode_event
+
+    def test_custom_model(self):
+        decode = compile_decoder(Outer)
+        data = {
+            "name": "outer",
+            "inners": [{"when": "2021-11-21T21:46:52Z"}, None, {}],
+            "by_name": {"a": {"when": None}},
+            "matrix": [[1, 2], [3]],
+        }
+        assert_same_outcome(decode, Outer, data)
+
+    def test_rejects_non_models(self):
+        with pytest.raises(TypeError):
+            compile_decoder(dict)  # type: ignore[type-var]
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import AsyncClient, Client
+from leakix.json_backend import BACKENDS, get_decoder
+from tests import helpers
+from tests.helpers import load_event
+
+DOCUMENT = (
+    b'{"ip": "1.2.3.4", "port": "443", "lat": 49.4631, "tags": ["a", null], "n": 1}'
+)
+
+
+def make_aggregation(i: int) -> dict:
+    return helpers.make_aggregation([load_event()], i, open_ports=["443"])
+
+
+class TestGetDecoder:
+    @pytest.mark.parametrize("backend", BACKENDS)
+    def test_backends_agree_with_stdlib(self, backend):
+        if backend != "json":
+            pytest.importorskip(backend)
+        decoder = get_decoder(backend)
+        assert decoder(DOCUMENT) == json.loads(DOCUMENT)
+        assert decoder(DOCUMENT.decode()) == json.loads(DOCUMENT)
+
+    def test_auto_prefers_fast_backends(self):
+        decoder = get_decoder()
+        try:
+            import orjson
+        except ImportError:
+            assert decoder(DOCUMENT) == json.loads(DOCUMENT)
+        else:
+            assert decoder is orjson.loads
+
+    def test_custom_callable(self):
+        def decoder(data):
+            return "custom"
+
+        assert get_decoder(decoder) is decoder
+
+    def test_unknown_backend(self):
+        with pytest.raises(ValueError, match="Unknown JSON backend"):
+            get_decoder("yaml")
+
+
+class TestClientDecoder:
+    def test_custom_decoder_is_used(self):
+        decoded = []
+
+        def decoder(data):
+            decoded.append(data)
+            return json.loads(data)
+
+        client = Client(json_decoder=decoder)
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, json=[{"name": "A", "description": ""}])
+            assert client.get_plugins().json()[0].name == "A"
+        assert len(decoded) == 1
+        assert isinstance(decoded[0], bytes)
+
+    def test_bulk_export_decodes_bytes_lines(self):
+        lines = [json.dumps(make_aggregation(i)) for i in range(3)]
+        client = Client(json_decoder="json")
+        with requests_mock.Mocker() as m:
+            m.get(requests_mock.ANY, text="\n".join(lines) + "\n\n")
+            response = client.bulk_export()
+        assert [a.ip for a in response.json()] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+
+
+class TestAsyncClientDecoder:
+    def test_bulk_export_stream_across_chunk_boundaries(self):
+        body = "\n".join(json.dumps(make_aggregation(i)) for i in range(5)).encode()
+        # Serve the body in small chunks that split lines at arbitrary places.
+        chunks = [body[i : i + 97] for i in range(0, len(body), 97)]
+
+        async def stream():
+            for chunk in chunks:
+                yield chunk
+
+        def handler(request):
+            return httpx.Response(200, content=stream())
+
+        async def run():
+            client = AsyncClient()
+            client._client = httpx.AsyncClient(
+                base_url=client.base_url, transport=httpx.MockTransport(handler)
+            )
+            return [a.ip async for a in client.bulk_export_stream()]
+
+        assert asyncio.run(run()) == [f"10.0.0.{i}" for i in range(5)]
@@ -0,0 +1,156 @@
+from datetime import datetime
+
+import pytest
+from l9format import l9format
+
+from leakix import (
+    AgeField,
+    CountryField,
+    CustomField,
+    EmptyQuery,
+    IPField,
+    MustNotQuery,
+    MustQuery,
+    Operator,
+    Plugin,
+    PluginField,
+    PortField,
+    RawQuery,
+    ShouldQuery,
+    TimeField,
+)
+from leakix.fast_decode import decode_aggregation, decode_event
+from leakix.matcher import (
+    compile_query,
+    filter_records,
+    parse_raw_query,
+    unquote_value,
+)
+from tests.helpers import load_event, make_aggregation
+
+
+def make_event(**changes) -> l9format.L9Event:
+    return decode_event({**load_event(), **changes})
+
+
+EVENT = make_event(
+    ip="10.1.2.3",
+    port="443",
+    host="www.example.be",
+    event_source="GitConfigHttpPlugin",
+    time="2024-01-05T10:00:00Z",
+    tags=["git", "leak"],
+)
+
+
+def matches(queries, event=EVENT) -> bool:
+    return compile_query(queries)(event)
+
+
+class TestCompileQuery:
+    @pytest.mark.parametrize(
+        ("field", "expected"),
+        [
+            (PluginField(Plugin.GitConfigHttpPlugin), True),
+            (PluginField(Plugin.DotEnvConfigPlugin), False),
+            (CountryField("germany"), True),
+            (CountryField("France"), False),
+            (PortField(443), True),
+            (PortField(1024, Operator.StrictlySmaller), True),
+            (PortField(443, Operator.StrictlyGreater), False),
+            (IPField("10.1.2.3"), True),
+            (IPField("10.0.0.0/8"), True),
+            (IPField("192.168.0.0/16"), False),
+            (CustomField(".be", "host"), True),
+            (CustomField("www.*.be", "host"), True),
+            (CustomField("leak", "tags"), True),
+            (CustomField("nope", "tags"), False),
+            (TimeField(datetime(2024, 1, 5)), True),
+            (TimeField(datetime(2024, 1, 4), Operator.StrictlyGreater), True),
+            (TimeField(datetime(2024, 1, 5), Operator.StrictlyGreater), False),
+            (CustomField('"Hetzner Online GmbH"', "organization"), True),
+        ],
+    )
+    def test_fields(self, field, expected):
+        assert matches([MustQuery(field)]) is expected
+        assert matches([MustNotQuery(field)]) is not expected
+
+    def test_must_and_must_not(self):
+        queries = [
+            MustQuery(PortField(443)),
+            MustNotQuery(CountryField("France")),
+        ]
+        assert matches(queries)
+        assert not matches(queries, make_event(port="80"))
+
+    def test_should(self):
+        queries = [ShouldQuery(PortField(80)), ShouldQuery(PortField(443))]
+        assert matches(queries)
+        assert not matches(queries, make_event(port="22"))
+        # With a must clause, should clauses are optional.
+        assert matches([MustQuery(IPField("10.1.2.3")), ShouldQuery(PortField(22))])
+
+    def test_empty(self):
+        assert matches(None)
+        assert matches([EmptyQuery()])
+
+    def test_raw_query(self):
+        assert matches([RawQuery('+plugin:GitConfigHttpPlugin -port:22 +host:".be"')])
+        assert not matches([RawQuery("+port:>1024")])
+        assert matches([RawQuery("*")])
+
+    def test_aggregation(self):
+        aggregation = decode_aggregation(
+            make_aggregation(
+                [load_event()],
+                1,
+                open_ports=["443", "22"],
+                leak_count=3,
+                leak_event_count=1,
+                creation_date="2024-01-01T00:00:00Z",
+                update_date="2024-01-05T00:00:00Z",
+            )
+        )
+        queries = [
+            MustQuery(CustomField("22", "open_ports")),
+            MustQuery(CustomField("2", "leak_count", Operator.StrictlyGreater)),
+            MustQuery(CustomField("443", "events.port")),
+            MustQuery(CustomField('"2024-01-05"', "update_date")),
+        ]
+        assert compile_query(queries, l9format.L9Aggregation)(aggregation)
+
+    def test_filter_records(self):
+        events = [make_event(port=str(port)) for port in (22, 80, 443)]
+        queries = [MustQuery(PortField(80, Operator.StrictlyGreater))]
+        assert [e.port for e in filter_records(queries, events)] == ["443"]
+
+    @pytest.mark.parametrize(
+        "query",
+        [
+            MustQuery(AgeField(3)),
+            MustQuery(CustomField("x", "nope")),
+            MustQuery(CustomField("x", "http.status")),
+            RawQuery("free text"),
+        ],
+    )
+    def test_unsupported(self, query):
+        with pytest.raises(ValueError):
+            compile_query([query])
+
+
+class TestParseRawQuery:
+    def test_tokens(self):
+        queries = parse_raw_query('+plugin:X -port:>22 host:"a b"')
+        assert [q.serialize() for q in queries] == [
+            "+plugin:X",
+            "-port:>22",
+            'host:"a b"',
+        ]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [('"a b"', "a b"), ('"a \\"b\\""', 'a "b"'), ("plain", "plain"), ('"', '"')],
+)
+def test_unquote_value(value, expected):
+    assert unquote_value(value) == expected
@@ -0,0 +1,193 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import AsyncClient, Client, ClientMetrics, Hooks, MetricsRegistry
+from leakix.base import RetryPolicy
+from leakix.metrics import endpoint_name
+from tests.helpers import make_events
+
+NO_BACKOFF = RetryPolicy(backoff_base=0)
+
+
+class Recorder(Hooks):
+    def __init__(self) -> None:
+        self.calls: list[tuple] = []
+
+    def request_start(self, endpoint):
+        self.calls.append(("start", endpoint))
+
+    def request_end(self, endpoint, status, size, seconds, retries):
+        self.calls.append(("end", endpoint, status, size, retries))
+
+    def retry(self, endpoint, status, attempt, delay):
+        self.calls.append(("retry", endpoint, status, attempt))
+
+    def rate_limit(self, endpoint, delay):
+        self.calls.append(("rate_limit", endpoint, delay is not None))
+
+    def stream_chunk(self, endpoint, size, seconds):
+        self.calls.append(("chunk", endpoint, size))
+
+    def decode(self, endpoint, size, seconds):
+        self.calls.append(("decode", endpoint, size))
+
+    def parse(self, endpoint, records, seconds):
+        self.calls.append(("parse", endpoint, records))
+
+    def kinds(self) -> list[str]:
+        return [call[0] for call in self.calls]
+
+
+class TestRegistry:
+    def test_counter(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("jobs_total", "Jobs.", ("kind",))
+        counter.inc("a")
+        counter.inc("a", amount=2)
+        counter.inc('b"\n')
+        assert counter.value("a") == 3
+        assert registry.to_prometheus() == (
+            "# HELP jobs_total Jobs.\n"
+            "# TYPE jobs_total counter\n"
+            'jobs_total{kind="a"} 3\n'
+            'jobs_total{kind="b\\"\\n"} 1\n'
+        )
+
+    def test_histogram(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value=value)
+        assert histogram.count() == 3
+        assert registry.to_prometheus().splitlines()[2:] == [
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            "latency_seconds_sum 5.55",
+            "latency_seconds_count 3",
+        ]
+
+    def test_registered_once(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("x_total", "X.")
+        assert registry.counter("x_total", "X.") is counter
+        with pytest.raises(ValueError):
+            registry.histogram("x_total", "X.")
+
+    def test_labels_checked(self):
+        counter = MetricsRegistry().counter("x_total", "X.", ("endpoint",))
+        with pytest.raises(ValueError):
+            counter.inc()
+        with pytest.raises(ValueError):
+            counter.inc("search", amount=-1)
+
+
+@pytest.mark.parametrize(
+    "path, name",
+    [
+        ("/search", "search"),
+        ("/host/1.2.3.4", "host"),
+        ("/api/subdomains/example.com", "subdomains"),
+        ("/bulk/service", "bulk/service"),
+        ("/", "/"),
+    ],
+)
+def test_endpoint_name(path, name):
+    assert endpoint_name(path) == name
+
+
+class TestClientHooks:
+    def test_search(self):
+        hooks = Recorder()
+        client = Client(api_key="k", hooks=hooks)
+        body = json.dumps(make_events(2))
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", text=body)
+            assert client.search("*").is_success()
+        assert hooks.calls == [
+            ("start", "search"),
+            ("end", "search", 200, len(body), 0),
+            ("decode", "search", len(body)),
+            ("parse", "search", 2),
+        ]
+
+    def test_rate_limited_retry(self):
+        hooks = Recorder()
+        client = Client(api_key="k", retry_policy=NO_BACKOFF, hooks=hooks)
+        body = json.dumps({"Services": [], "Leaks": []})
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/1.1.1.1",
+                [
+                    {"status_code": 429, "headers": {"Retry-After": "0"}},
+                    {"text": body},
+                ],
+            )
+            client.get_host("1.1.1.1")
+        assert hooks.kinds() == [
+            "start",
+            "rate_limit",
+            "retry",
+            "end",
+            "decode",
+            "parse",
+        ]
+        assert hooks.calls[-3] == ("end", "host", 200, len(body), 1)
+
+    def test_bulk_stream(self):
+        hooks = Recorder()
+        client = Client(api_key="k", hooks=hooks)
+        events = make_events(3)
+        body = "".join(json.dumps(e) + "\n" for e in events)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=body)
+            assert len(list(client.bulk_service_stream())) == 3
+        assert hooks.calls[:2] == [
+            ("start", "bulk/service"),
+            ("end", "bulk/service", 200, 0, 0),
+        ]
+        chunks = [call for call in hooks.calls if call[0] == "chunk"]
+        assert sum(call[2] for call in chunks) == len(body)
+        assert ("parse", "bulk/service", 3) in hooks.calls
+
+    def test_metrics(self):
+        metrics = ClientMetrics()
+        client = Client(api_key="k", retry_policy=NO_BACKOFF, hooks=metrics)
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/search",
+                [{"status_code": 429}, {"json": make_events(1)}],
+            )
+            client.search("*")
+        assert metrics.requests.value("search", "200") == 1
+        assert metrics.retries.value("search", "429") == 1
+        assert metrics.rate_limited.value("search") == 1
+        assert metrics.records.value("search") == 1
+        assert metrics.request_seconds.count("search") == 1
+        text = metrics.to_prometheus()
+        assert 'leakix_requests_total{endpoint="search",status="200"} 1' in text
+        assert "# TYPE leakix_request_duration_seconds histogram" in text
+
+    def test_async(self):
+        hooks = Recorder()
+        events = make_events(2)
+        body = "".join(json.dumps(e) + "\n" for e in events)
+        client = AsyncClient(api_key="k", hooks=hooks)
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text=body)
+            ),
+        )
+
+        async def run():
+            return [e async for e in client.bulk_service_stream()]
+
+        assert len(asyncio.run(run())) == 2
+        assert hooks.calls[0] == ("start", "bulk/service")
+        assert ("parse", "bulk/service", 2) in hooks.calls
+        assert ("decode", "bulk/service", len(body) - 2) in hooks.calls
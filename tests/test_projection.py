@@ -0,0 +1,167 @@
+import asyncio
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import httpx
+import pytest
+import requests_mock
+from l9format import l9format
+
+from leakix import AsyncClient, Client, Projection, Scope
+from leakix.fast_decode import decode_event
+from leakix.projection import projection
+from tests import helpers
+from tests.helpers import load_event
+
+FIELDS = ["ip", "port", "host", "event_source", "time", "geoip.country_name"]
+
+
+def make_aggregation(i: int) -> dict:
+    event = load_event()
+    return helpers.make_aggregation(
+        [event, {**event, "port": "22"}], i, open_ports=["443"]
+    )
+
+
+class TestProjection:
+    def test_matches_full_decoding(self):
+        data = load_event()
+        record = Projection(l9format.L9Event, FIELDS)(data)
+        event = decode_event(data)
+        assert record == (
+            event.ip,
+            event.port,
+            event.host,
+            event.event_source,
+            event.time,
+            event.geoip.country_name,
+        )
+        assert record.geoip_country_name == event.geoip.country_name
+        assert isinstance(record.time, datetime)
+        assert list(record._asdict()) == [f.replace(".", "_") for f in FIELDS]
+
+    def test_nested_values_are_converted(self):
+        record = Projection(l9format.L9Event, ["geoip.location", "network"])(
+            load_event()
+        )
+        assert isinstance(record.geoip_location.lat, Decimal)
+        assert isinstance(record.network, l9format.Network)
+
+    def test_missing_values_are_none(self):
+        data = load_event()
+        del data["geoip"]
+        data["ssl"] = None
+        record = Projection(l9format.L9Event, ["geoip.country_name", "ssl.jarm"])(data)
+        assert record == (None, None)
+
+    def test_dict_and_list_fields(self):
+        data = make_aggregation(1)
+        data["events"][0]["http"]["header"] = {"server": "nginx"}
+        record = Projection(
+            l9format.L9Aggregation, ["ip", "events.port", "events.http.header.server"]
+        )(data)
+        assert record.events_port == ["443", "22"]
+        assert record.events_http_header_server[0] == "nginx"
+
+    def test_from_model(self):
+        data = make_aggregation(1)
+        data["events"][0]["http"]["header"] = {"server": "nginx"}
+        fields = [
+            "ip",
+            "geoip.location.lat",
+            "events.time",
+            "events.http.header.server",
+        ]
+        project = Projection(l9format.L9Aggregation, fields)
+        model = l9format.L9Aggregation.from_dict(data)
+        assert project.from_model(model) == project(data)
+        event = decode_event(load_event())
+        event.geoip = None
+        assert Projection(l9format.L9Event, FIELDS).from_model(event)[-1] is None
+
+    @pytest.mark.parametrize("field", ["nope", "ip.nope", "geoip.nope", ""])
+    def test_unknown_field(self, field):
+        with pytest.raises(ValueError, match="Unknown field"):
+            Projection(l9format.L9Event, [field])
+
+    def test_no_fields(self):
+        with pytest.raises(ValueError):
+            Projection(l9format.L9Event, [])
+
+    def test_is_cached(self):
+        fields = ("ip", "port")
+        assert projection(l9format.L9Event, fields) is projection(
+            l9format.L9Event, fields
+        )
+
+
+class TestClientProjection:
+    def test_search_with_fields(self):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=[load_event()])
+            response = client.search("+port:443", scope=Scope.SERVICE, fields=FIELDS)
+        (record,) = response.json()
+        assert record.ip == "78.47.222.185"
+        assert record.geoip_country_name == "Germany"
+
+    def test_search_with_and_without_fields_are_not_coalesced(self):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=[load_event()])
+            full = client.get_service(page=0)
+            projected = client.get_service(page=0, fields=["ip"])
+        assert isinstance(full.json()[0], l9format.L9Event)
+        assert projected.json()[0] == ("78.47.222.185",)
+
+    def test_single_field_string(self):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=[load_event()])
+            response = client.get_leak(fields="ip")
+        assert response.json()[0].ip == "78.47.222.185"
+
+    def test_bulk_export_with_fields(self):
+        client = Client()
+        body = "\n".join(json.dumps(make_aggregation(i)) for i in range(3))
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=body)
+            response = client.bulk_export(fields=["ip", "events.port"])
+            streamed = list(client.bulk_export_stream(fields=["ip"]))
+        assert [r.ip for r in response.json()] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+        assert response.json()[0].events_port == ["443", "22"]
+        assert [r.ip for r in streamed] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+
+    def test_bulk_service_with_fields(self):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=json.dumps(load_event()))
+            response = client.bulk_service(fields=["ip", "port"])
+        assert response.json() == [("78.47.222.185", "443")]
+
+
+class TestAsyncClientProjection:
+    def test_search_and_bulk_export_with_fields(self):
+        client = AsyncClient()
+        body = "\n".join(json.dumps(make_aggregation(i)) for i in range(2))
+
+        def handler(request):
+            if request.url.path == "/search":
+                return httpx.Response(200, json=[load_event()])
+            return httpx.Response(200, text=body)
+
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            search = await client.search("+port:443", fields=["ip", "port"])
+            bulk = await client.bulk_export(fields=["ip"])
+            streamed = [r async for r in client.bulk_export_stream(fields=["ip"])]
+            return search, bulk, streamed
+
+        search, bulk, streamed = asyncio.run(run())
+        assert search.json() == [("78.47.222.185", "443")]
+        assert [r.ip for r in bulk.json()] == ["10.0.0.0", "10.0.0.1"]
+        assert [r.ip for r in streamed] == ["10.0.0.0", "10.0.0.1"]
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import AsyncClient, Client, RateLimitResponse, RetryPolicy
+from leakix.base import parse_retry_after
+
+EMPTY_HOST = {"Services": [], "Leaks": []}
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr("leakix.client.time.sleep", delays.append)
+
+    async def fake_async_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("leakix.async_client.asyncio.sleep", fake_async_sleep)
+    return delays
+
+
+class TestParseRetryAfter:
+    @pytest.mark.parametrize(
+        "headers,expected",
+        [
+            ({"Retry-After": "3"}, 3.0),
+            ({"Retry-After": "0.5"}, 0.5),
+            ({"X-Limited-For": "1.5s"}, 1.5),
+            ({"X-Limited-For": "1m30s"}, 90.0),
+            ({"X-Limited-For": "250ms"}, 0.25),
+            ({"X-Limited-For": "2"}, 2.0),
+            ({}, None),
+            ({"Retry-After": "garbage"}, None),
+        ],
+        ids=["seconds", "float", "go-s", "go-m-s", "go-ms", "plain", "none", "bad"],
+    )
+    def test_values(self, headers, expected):
+        assert parse_retry_after(headers) == expected
+
+    def test_http_date(self):
+        date = datetime.now(UTC) + timedelta(seconds=30)
+        delay = parse_retry_after({"Retry-After": format_datetime(date, usegmt=True)})
+        assert delay is not None
+        assert 25 <= delay <= 31
+
+    def test_http_date_in_the_past(self):
+        date = datetime.now(UTC) - timedelta(seconds=30)
+        delay = parse_retry_after({"Retry-After": format_datetime(date, usegmt=True)})
+        assert delay == 0.0
+
+
+class TestRetryPolicy:
+    def test_only_retries_configured_statuses(self):
+        policy = RetryPolicy()
+        assert policy.get_delay(0, 500, {}, 0.0) is None
+        assert policy.get_delay(0, 429, {}, 0.0) is not None
+
+    def test_stops_after_max_retries(self):
+        policy = RetryPolicy(max_retries=2)
+        assert policy.get_delay(1, 429, {}, 0.0) is not None
+        assert policy.get_delay(2, 429, {}, 0.0) is None
+
+    def test_backoff_is_capped(self):
+        policy = RetryPolicy(backoff_base=1.0, backoff_max=4.0)
+        assert all(0 <= policy.backoff(attempt) <= 4.0 for attempt in range(20))
+
+    def test_honours_retry_after_with_jitter(self):
+        policy = RetryPolicy(jitter=0.1)
+        delay = policy.get_delay(0, 429, {"Retry-After": "10"}, 0.0)
+        assert delay is not None
+        assert 10.0 <= delay <= 11.0
+
+    def test_caps_total_time(self):
+        policy = RetryPolicy(max_total_time=5.0)
+        assert policy.get_delay(0, 429, {"Retry-After": "10"}, 0.0) is None
+        assert policy.get_delay(0, 429, {"Retry-After": "1"}, 4.5) is None
+
+
+class TestClientRetry:
+    def test_no_retry_without_policy(self, no_sleep):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/host/1.1.1.1", status_code=429, json={})
+            response = client.get_host("1.1.1.1")
+            assert isinstance(response, RateLimitResponse)
+            assert response.retries == 0
+            assert m.call_count == 1
+        assert no_sleep == []
+
+    def test_retries_until_success(self, no_sleep):
+        client = Client(retry_policy=RetryPolicy())
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/host/1.1.1.1",
+                [
+                    {"status_code": 429, "json": {}, "headers": {"Retry-After": "2"}},
+                    {"status_code": 429, "json": {}},
+                    {"status_code": 200, "json": EMPTY_HOST},
+                ],
+            )
+            response = client.get_host("1.1.1.1")
+            assert response.is_success()
+            assert response.retries == 2
+            assert m.call_count == 3
+        assert len(no_sleep) == 2
+        assert 2.0 <= no_sleep[0] <= 2.2
+
+    def test_gives_up_after_max_retries(self, no_sleep):
+        client = Client(retry_policy=RetryPolicy(max_retries=3))
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/api/plugins", status_code=429, json={})
+            response = client.get_plugins()
+            assert isinstance(response, RateLimitResponse)
+            assert response.retries == 3
+            assert m.call_count == 4
+
+    def test_bulk_export_retries_before_stream(self, no_sleep):
+        client = Client(retry_policy=RetryPolicy())
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                [
+                    {"status_code": 429, "json": {}},
+                    {"status_code": 200, "text": ""},
+                ],
+            )
+            response = client.bulk_export()
+            assert response.is_success()
+            assert response.retries == 1
+
+
+def mock_async_client(client, responses):
+    """Route the AsyncClient through a transport replaying `responses` in order."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return responses[min(len(calls), len(responses)) - 1]
+
+    client._client = httpx.AsyncClient(
+        base_url=client.base_url, transport=httpx.MockTransport(handler)
+    )
+    return calls
+
+
+class TestAsyncClientRetry:
+    def test_retries_until_success(self, no_sleep):
+        client = AsyncClient(retry_policy=RetryPolicy())
+        calls = mock_async_client(
+            client,
+            [
+                httpx.Response(429, json={}, headers={"X-Limited-For": "1s"}),
+                httpx.Response(200, json=EMPTY_HOST),
+            ],
+        )
+        response = asyncio.run(client.get_host("1.1.1.1"))
+        assert response.is_success()
+        assert response.retries == 1
+        assert len(calls) == 2
+        assert 1.0 <= no_sleep[0] <= 1.1
+
+    def test_bulk_export_gives_up(self, no_sleep):
+        client = AsyncClient(retry_policy=RetryPolicy(max_retries=1))
+        calls = mock_async_client(client, [httpx.Response(429, json={})])
+        response = asyncio.run(client.bulk_export())
+        assert isinstance(response, RateLimitResponse)
+        assert response.retries == 1
+        assert len(calls) == 2
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import re
+from datetime import date, datetime
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import APIError, AsyncClient, Client, MustQuery, PluginField
+from leakix.plugin import Plugin
+from leakix.query import serialize_queries
+from leakix.shard import ShardMerger, shard_queries, shard_ranges
+from tests import helpers
+
+START = date(2024, 1, 1)
+END = date(2024, 1, 9)
+LOWER_BOUND = re.compile(r'update_date:>"(\d{4}-\d{2}-\d{2})"')
+
+
+def make_aggregation(ip: str, day: str) -> dict:
+    return helpers.make_aggregation(
+        [],
+        ip=ip,
+        resource_id=ip,
+        creation_date=f"{day}T10:00:00Z",
+        update_date=f"{day}T10:00:00Z",
+    )
+
+
+# Records returned by each shard, keyed on the day after which it starts. The record updated on the
+# 2024-01-05 boundary is returned by both the first and the second shard.
+SHARDS = {
+    "2023-12-31": [
+        make_aggregation("10.0.0.1", "2024-01-01"),
+        make_aggregation("10.0.0.2", "2024-01-04"),
+        make_aggregation("10.0.0.3", "2024-01-05"),
+        make_aggregation("10.0.0.9", "2023-12-31"),
+    ],
+    "2024-01-04": [
+        make_aggregation("10.0.0.3", "2024-01-05"),
+        make_aggregation("10.0.0.4", "2024-01-06"),
+        make_aggregation("10.0.0.5", "2024-01-08"),
+    ],
+}
+EXPECTED = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4", "10.0.0.5"]
+
+
+def shard_body(query: str) -> str:
+    match = LOWER_BOUND.search(query)
+    assert match is not None
+    return "\n".join(json.dumps(r) for r in SHARDS[match.group(1)])
+
+
+class TestShardRanges:
+    def test_even_split(self):
+        assert shard_ranges(START, END, 2) == [
+            (date(2024, 1, 1), date(2024, 1, 5)),
+            (date(2024, 1, 5), date(2024, 1, 9)),
+        ]
+
+    def test_uneven_split_covers_range(self):
+        ranges = shard_ranges(START, date(2024, 1, 11), 3)
+        assert ranges[0][0] == START
+        assert ranges[-1][1] == date(2024, 1, 11)
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:], strict=False))
+
+    def test_no_more_shards_than_days(self):
+        assert len(shard_ranges(START, date(2024, 1, 3), 8)) == 2
+
+    def test_accepts_datetimes(self):
+        assert shard_ranges(datetime(2024, 1, 1, 12), datetime(2024, 1, 2), 1) == [
+            (START, date(2024, 1, 2))
+        ]
+
+    @pytest.mark.parametrize(("end", "shards"), [(START, 2), (END, 0)])
+    def test_invalid(self, end, shards):
+        with pytest.raises(ValueError):
+            shard_ranges(START, end, shards)
+
+
+class TestShardQueries:
+    def test_bounds_are_appended(self):
+        queries = [MustQuery(PluginField(Plugin.GitConfigHttpPlugin))]
+        sharded = shard_queries(queries, shard_ranges(START, END, 2))
+        assert [serialize_queries(q) for q in sharded] == [
+            '+plugin:GitConfigHttpPlugin +update_date:>"2023-12-31" '
+            '+update_date:<"2024-01-05"',
+            '+plugin:GitConfigHttpPlugin +update_date:>"2024-01-04" '
+            '+update_date:<"2024-01-09"',
+        ]
+        assert len(queries) == 1
+
+
+class TestShardMerger:
+    def test_drops_boundary_duplicates_and_out_of_range(self):
+        merger = ShardMerger(shard_ranges(START, END, 2))
+        assert merger.accept(("a", "2024-01-05T10:00:00Z"))
+        assert not merger.accept(("a", "2024-01-05T10:00:00Z"))
+        assert not merger.accept(("b", "2023-12-31T23:00:00Z"))
+        assert not merger.accept(("c", "2024-01-09T00:00:00Z"))
+        assert merger.accept(("d", "2024-01-02T00:00:00Z"))
+        assert merger.accept(("d", "2024-01-02T00:00:00Z"))
+        assert merger.duplicates == 1
+
+
+class TestParallelBulkExport:
+    def test_merges_shards(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                text=lambda request, context: shard_body(request.qs["q"][0]),
+            )
+            records = list(client.parallel_bulk_export(None, START, END, shards=2))
+            assert m.call_count == 2
+        assert sorted(r.ip for r in records) == EXPECTED
+
+    def test_fields(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                text=lambda request, context: shard_body(request.qs["q"][0]),
+            )
+            records = list(
+                client.parallel_bulk_export(None, START, END, shards=2, fields=["ip"])
+            )
+        assert sorted(records) == [(ip,) for ip in EXPECTED]
+
+    def test_failing_shard_raises(self):
+        client = Client(api_key="k")
+
+        def respond(request, context):
+            if '>"2024-01-04"' in request.qs["q"][0]:
+                context.status_code = 500
+                return json.dumps({"Error": "boom"})
+            return shard_body(request.qs["q"][0])
+
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=respond)
+            with pytest.raises(APIError):
+                list(client.parallel_bulk_export(None, START, END, shards=2))
+
+    def test_async(self):
+        client = AsyncClient(api_key="k")
+
+        def handler(request):
+            return httpx.Response(200, text=shard_body(request.url.params["q"]))
+
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            return [
+                r.ip async for r in client.parallel_bulk_export(None, START, END, 2)
+            ]
+
+        assert sorted(asyncio.run(run())) == EXPECTED
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import AsyncClient, Client
+from leakix.singleflight import AsyncSingleFlight, SingleFlight
+
+EMPTY_HOST = {"Services": [], "Leaks": []}
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return object()
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            futures = [pool.submit(flight.do, "k", fn) for _ in range(5)]
+            while flight.coalesced < 4:
+                pass
+            release.set()
+            results = {id(f.result()) for f in futures}
+        assert len(calls) == 1
+        assert len(results) == 1
+        assert flight.coalesced == 4
+
+    def test_exception_is_shared(self):
+        flight = SingleFlight()
+        with pytest.raises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+        # The key is released after a failure.
+        assert flight.do("k", lambda: 1) == 1
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+        assert flight.do("k", lambda: 1) == 1
+        assert flight.do("k", lambda: 2) == 2
+        assert flight.coalesced == 0
+
+
+class TestAsyncSingleFlight:
+    def test_concurrent_calls_share_result(self):
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return object()
+
+        async def run():
+            return await asyncio.gather(*(flight.do("k", fn) for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        assert flight.coalesced == 9
+
+    def test_leader_cancellation_does_not_cancel_followers(self):
+        flight = AsyncSingleFlight()
+
+        async def fn():
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def run():
+            leader = asyncio.ensure_future(flight.do("k", fn))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("k", fn))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == 42
+
+
+class TestClientCoalescing:
+    def test_concurrent_get_host(self):
+        client = Client()
+        release = threading.Event()
+
+        def slow(request, context):
+            release.wait(5)
+            return EMPTY_HOST
+
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/host/1.1.1.1", json=slow)
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                futures = [pool.submit(client.get_host, "1.1.1.1") for _ in range(4)]
+                while client.coalesced_requests < 3:
+                    pass
+                release.set()
+                responses = [f.result() for f in futures]
+            assert m.call_count == 1
+        assert all(r is responses[0] for r in responses)
+
+
+class TestAsyncClientCoalescing:
+    def test_concurrent_get_host(self):
+        client = AsyncClient()
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            if request.url.path == "/search":
+                return httpx.Response(200, json=[])
+            return httpx.Response(200, json=EMPTY_HOST)
+
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            return await asyncio.gather(
+                *(client.get_host("1.1.1.1") for _ in range(50)),
+                client.search("*"),
+                client.search("*"),
+            )
+
+        responses = asyncio.run(run())
+        assert len(calls) == 2
+        assert client.coalesced_requests == 50
+        assert all(r is responses[0] for r in responses[:50])
@@ -0,0 +1,124 @@
+import gzip
+import json
+import zlib
+from pathlib import Path
+
+import pytest
+import requests_mock
+from l9format import l9format
+
+from leakix import Client, NDJSONSink
+from leakix.fast_decode import decode_aggregation
+from leakix.sink import encode_record, part_path
+from tests.helpers import load_event, make_aggregation, make_events
+
+
+def read_lines(path: Path) -> list[dict]:
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestEncodeRecord:
+    def test_model_matches_to_dict(self):
+        event = l9format.L9Event.from_dict(make_events(1)[0])
+        assert json.loads(encode_record(event)) == json.loads(
+            json.dumps(event.to_dict())
+        )
+
+    def test_aggregation_matches_to_dict(self):
+        event = load_event()
+        aggregation = decode_aggregation(
+            make_aggregation([event, {**event, "port": "22"}])
+        )
+        assert (
+            encode_record(aggregation)
+            == (json.dumps(aggregation.to_dict()) + "\n").encode()
+        )
+
+    def test_projected_record(self):
+        client = Client()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=make_events(1))
+            (record,) = client.search("", fields=["ip", "time", "network"]).json()
+        line = json.loads(encode_record(record))
+        assert line["ip"] == "10.0.0.0"
+        assert line["time"] == record.time.isoformat()
+        assert line["network"] == record.network.to_dict()
+
+    def test_raw_lines(self):
+        assert encode_record(b'{"a": 1}') == b'{"a": 1}\n'
+        assert encode_record('{"a": 1}\n') == b'{"a": 1}\n'
+
+
+class TestNDJSONSink:
+    @pytest.mark.parametrize("name", ["export.ndjson", "export.ndjson.gz"])
+    def test_writes_stream(self, tmp_path, name):
+        client = Client(api_key="k")
+        events = make_events(5)
+        body = "\n".join(json.dumps(e) for e in events)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=body)
+            with NDJSONSink(tmp_path / name) as sink:
+                assert sink.write_all(client.bulk_service_stream()) == 5
+        assert sink.closed
+        assert sink.compression == ("gzip" if name.endswith(".gz") else None)
+        assert [line["ip"] for line in read_lines(tmp_path / name)] == [
+            e["ip"] for e in events
+        ]
+
+    def test_buffers_writes(self, tmp_path):
+        path = tmp_path / "out.ndjson"
+        with NDJSONSink(path, buffer_size=100) as sink:
+            sink.write({"a": 1})
+            assert path.read_bytes() == b""
+            sink.write({"b": "x" * 100})
+            assert path.read_bytes().count(b"\n") == 2
+
+    def test_checkpoints(self, tmp_path):
+        path = tmp_path / "out.ndjson.gz"
+        readable = []
+        sink = NDJSONSink(
+            path, fsync_every=2, on_checkpoint=lambda: readable.append(partial(path))
+        )
+        for i in range(5):
+            sink.write({"i": i})
+        assert readable == [[0, 1], [0, 1, 2, 3]]
+        sink.close()
+        assert readable[-1] == [0, 1, 2, 3, 4]
+
+    def test_rotation(self, tmp_path):
+        path = tmp_path / "out.ndjson.gz"
+        with NDJSONSink(path, max_bytes=20) as sink:
+            sink.write_all({"i": i} for i in range(5))
+        assert sink.paths == [part_path(path, i) for i in range(2)]
+        assert [p.name for p in sink.paths][0] == "out.00000.ndjson.gz"
+        lines = [line["i"] for p in sink.paths for line in read_lines(p)]
+        assert lines == [0, 1, 2, 3, 4]
+        assert not path.exists()
+
+    def test_zstd(self, tmp_path):
+        zstandard = pytest.importorskip("zstandard")
+        path = tmp_path / "out.ndjson.zst"
+        with NDJSONSink(path) as sink:
+            sink.write({"a": 1})
+        assert sink.compression == "zstd"
+        with open(path, "rb") as f:
+            data = zstandard.ZstdDecompressor().stream_reader(f).read()
+        assert data == b'{"a": 1}\n'
+
+    def test_write_after_close(self, tmp_path):
+        sink = NDJSONSink(tmp_path / "out.ndjson")
+        sink.close()
+        with pytest.raises(ValueError):
+            sink.write({})
+
+    def test_unknown_compression(self, tmp_path):
+        with pytest.raises(ValueError):
+            NDJSONSink(tmp_path / "out.ndjson", compression="lz4")
+
+
+def partial(path: Path) -> list[int]:
+    """Records readable from a gzip file that is still being written."""
+    data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(path.read_bytes())
+    return [json.loads(line)["i"] for line in data.splitlines()]
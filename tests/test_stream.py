@@ -0,0 +1,665 @@
+import asyncio
+import gc
+import io
+import json
+import time
+import tracemalloc
+
+import httpx
+import pytest
+import requests
+import requests_mock
+from l9format import l9format
+from l9format.l9format import ValidationError
+
+from leakix import (
+    APIError,
+    AsyncClient,
+    BulkCursor,
+    Client,
+    PipelineOptions,
+    ProgressOptions,
+    RawQuery,
+    ResumeError,
+    RetryPolicy,
+)
+from leakix.base import STREAM_CHUNK_SIZE
+from leakix.response import ErrorResponse, RateLimitResponse
+from leakix.stream import AGGREGATIONS, EVENTS, _PipelineRun, resume_query
+from tests.helpers import make_aggregation, make_events
+
+
+def ndjson(records: list[dict]) -> str:
+    return "\n".join(json.dumps(record) for record in records) + "\n"
+
+
+class TestBulkServiceStream:
+    def test_yields_events(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(3)))
+            events = list(client.bulk_service_stream())
+        assert [e.ip for e in events] == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+        assert all(isinstance(e, l9format.L9Event) for e in events)
+
+    def test_request_is_sent_on_first_iteration(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(2)))
+            stream = client.bulk_service_stream()
+            assert m.call_count == 0
+            assert next(stream).ip == "10.0.0.0"
+            assert m.call_count == 1
+
+    def test_response_is_closed_when_exhausted(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(1)))
+            stream = client.bulk_service_stream()
+            list(stream)
+        assert stream.response.raw.closed
+
+    @pytest.mark.parametrize(
+        ("status_code", "response_type"),
+        [(429, RateLimitResponse), (500, ErrorResponse)],
+    )
+    def test_errors_are_raised(self, status_code, response_type):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/service",
+                json={"Error": "nope"},
+                status_code=status_code,
+            )
+            with pytest.raises(APIError) as info:
+                list(client.bulk_service_stream())
+        assert isinstance(info.value.response, response_type)
+        assert info.value.response.status_code() == status_code
+
+    def test_bulk_export_stream_errors_are_raised(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", json={}, status_code=401)
+            with pytest.raises(APIError):
+                list(client.bulk_export_stream())
+
+    def test_no_content(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", status_code=204)
+            assert list(client.bulk_service_stream()) == []
+
+    def test_list_version_returns_error_response(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/service", json={"Error": "x"}, status_code=500
+            )
+            response = client.bulk_service()
+        assert response.is_error()
+        assert response.json() == {"Error": "x"}
+
+
+class TestAsyncBulkServiceStream:
+    @staticmethod
+    def make_client(handler) -> AsyncClient:
+        client = AsyncClient(api_key="k")
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+        return client
+
+    def test_yields_events(self):
+        client = self.make_client(
+            lambda request: httpx.Response(200, text=ndjson(make_events(3)))
+        )
+
+        async def run():
+            return [e.ip async for e in client.bulk_service_stream()]
+
+        assert asyncio.run(run()) == ["10.0.0.0", "10.0.0.1", "10.0.0.2"]
+
+    def test_list_version(self):
+        client = self.make_client(
+            lambda request: httpx.Response(200, text=ndjson(make_events(2)))
+        )
+        response = asyncio.run(client.bulk_service())
+        assert response.is_success()
+        assert [e.ip for e in response.json()] == ["10.0.0.0", "10.0.0.1"]
+
+    def test_errors_are_raised(self):
+        client = self.make_client(
+            lambda request: httpx.Response(503, json={"Error": "down"})
+        )
+
+        async def run():
+            return [e async for e in client.bulk_service_stream()]
+
+        with pytest.raises(APIError) as info:
+            asyncio.run(run())
+        assert info.value.response.json() == {"Error": "down"}
+        response = asyncio.run(client.bulk_service())
+        assert response.is_error()
+        assert response.status_code() == 503
+
+    def test_no_content(self):
+        client = self.make_client(lambda request: httpx.Response(204))
+
+        async def run():
+            return [e async for e in client.bulk_export_stream()]
+
+        assert asyncio.run(run()) == []
+        response = asyncio.run(client.bulk_export())
+        assert response.is_success()
+        assert response.json() == []
+
+
+def make_aggregations(days: list[int]) -> list[dict]:
+    return [
+        make_aggregation(
+            [],
+            ip=f"10.0.1.{i}",
+            resource_id=f"resource-{i}",
+            creation_date=f"2021-11-{day:02d}T10:00:00Z",
+            update_date=f"2021-11-{day:02d}T10:00:00Z",
+        )
+        for i, day in enumerate(days)
+    ]
+
+
+def padded(text: str) -> bytes:
+    """Pad NDJSON with blank lines to a full stream chunk, so it is delivered before the connection drops."""
+    return text.encode().ljust(STREAM_CHUNK_SIZE, b"\n")
+
+
+class BrokenBody(io.RawIOBase):
+    """Response body failing with a dropped connection once `data` has been read."""
+
+    def __init__(self, data: str) -> None:
+        self.data = padded(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size=-1):
+        if not self.data:
+            raise requests.ConnectionError("connection reset")
+        data, self.data = self.data[:size], self.data[size:]
+        return data
+
+
+NO_BACKOFF = RetryPolicy(backoff_base=0)
+
+
+class TestCheckpoints:
+    def test_cursor_tracks_position(self):
+        client = Client(api_key="k")
+        records = make_aggregations([22, 21, 21])
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(records))
+            stream = client.bulk_export_stream()
+            list(stream)
+        assert stream.cursor == BulkCursor(
+            count=3,
+            last_key="resource-2|10.0.1.2",
+            last_update="2021-11-21T10:00:00Z",
+            day_count=2,
+        )
+        assert BulkCursor.from_json(stream.cursor.to_json()) == stream.cursor
+
+    def test_resume_query(self):
+        cursor = BulkCursor(count=4, last_update="2021-11-21T10:00:00Z")
+        assert resume_query("*", AGGREGATIONS, cursor) == '+update_date:<"2021-11-22"'
+        assert (
+            resume_query("+port:22", EVENTS, cursor) == '+port:22 +time:<"2021-11-22"'
+        )
+        assert resume_query("+port:22", EVENTS, BulkCursor()) == "+port:22"
+
+    def test_reconnects_after_dropped_connection(self):
+        client = Client(api_key="k", retry_policy=NO_BACKOFF)
+        records = make_aggregations([22, 21, 21, 20])
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                [
+                    {"body": BrokenBody(ndjson(records[:2]))},
+                    {"text": ndjson(records[1:])},
+                ],
+            )
+            stream = client.bulk_export_stream()
+            ips = [a.ip for a in stream]
+            assert m.request_history[1].qs["q"] == ['+update_date:<"2021-11-22"']
+        assert ips == [r["ip"] for r in records]
+        assert stream.reconnects == 1
+        assert stream.cursor.count == 4
+
+    def test_gives_up_after_max_reconnects(self):
+        client = Client(api_key="k", retry_policy=NO_BACKOFF)
+        records = make_aggregations([22, 21])
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                [{"body": BrokenBody(ndjson(records[:1]))} for _ in range(3)],
+            )
+            with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                list(client.bulk_export_stream(max_reconnects=1))
+
+    def test_resume_from_saved_cursor(self):
+        client = Client(api_key="k")
+        records = make_aggregations([22, 21, 21, 20])
+        saved = BulkCursor(
+            count=3,
+            last_key="resource-2|10.0.1.2",
+            last_update=records[2]["update_date"],
+            day_count=2,
+        ).to_json()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(records[1:]))
+            stream = client.bulk_export_stream(
+                [RawQuery("+plugin:GitConfigHttpPlugin")],
+                cursor=BulkCursor.from_json(saved),
+            )
+            ips = [a.ip for a in stream]
+            assert m.last_request.qs["q"] == [
+                '+plugin:gitconfighttpplugin +update_date:<"2021-11-22"'
+            ]
+        assert ips == ["10.0.1.3"]
+        assert stream.cursor.count == 4
+
+    def test_mismatching_resume_is_detected(self):
+        client = Client(api_key="k")
+        records = make_aggregations([21, 21])
+        cursor = BulkCursor(
+            count=1,
+            last_key="other",
+            last_update=records[0]["update_date"],
+            day_count=1,
+        )
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(records))
+            with pytest.raises(ResumeError):
+                list(client.bulk_export_stream(cursor=cursor))
+
+    def test_async_reconnects_after_dropped_connection(self):
+        records = make_aggregations([22, 21, 21, 20])
+        queries = []
+
+        async def broken():
+            yield padded(ndjson(records[:2]))
+            raise httpx.ReadError("connection reset")
+
+        def handler(request):
+            queries.append(request.url.params["q"])
+            if len(queries) == 1:
+                return httpx.Response(200, content=broken())
+            return httpx.Response(200, text=ndjson(records[1:]))
+
+        client = AsyncClient(api_key="k", retry_policy=NO_BACKOFF)
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            stream = client.bulk_export_stream()
+            return [a.ip async for a in stream], stream
+
+        ips, stream = asyncio.run(run())
+        assert ips == [r["ip"] for r in records]
+        assert queries == ["*", '+update_date:<"2021-11-22"']
+        assert stream.reconnects == 1
+
+
+class TestPipeline:
+    @staticmethod
+    def export(records: list[dict], **kwargs) -> list:
+        client = Client(api_key="k", retry_policy=NO_BACKOFF)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(records))
+            return list(client.bulk_export_stream(**kwargs))
+
+    def test_same_records_as_inline(self):
+        records = make_aggregations([20] * 500)
+        pipeline = PipelineOptions(batch_size=7, max_pending=2)
+        assert self.export(records, pipeline=pipeline) == self.export(records)
+
+    def test_decode_errors_are_raised(self):
+        records = make_aggregations([20] * 20)
+        del records[13]["ip"]
+        with pytest.raises(ValidationError):
+            self.export(records, pipeline=PipelineOptions(batch_size=4))
+
+    def test_same_cursor_as_inline(self):
+        client = Client(api_key="k")
+        records = make_aggregations([22, 21, 21, 20] * 10)
+        cursors = []
+        for pipeline in (None, PipelineOptions(batch_size=3)):
+            with requests_mock.Mocker() as m:
+                m.get(f"{client.base_url}/bulk/search", text=ndjson(records))
+                stream = client.bulk_export_stream(pipeline=pipeline)
+                list(stream)
+            cursors.append(stream.cursor)
+        assert cursors[0] == cursors[1]
+
+    @pytest.mark.parametrize("batch_size", [1, 3])
+    def test_reconnects(self, batch_size):
+        client = Client(api_key="k", retry_policy=NO_BACKOFF)
+        records = make_aggregations([22, 21, 21, 20])
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/search",
+                [
+                    {"body": BrokenBody(ndjson(records[:2]))},
+                    {"text": ndjson(records[1:])},
+                ],
+            )
+            pipeline = PipelineOptions(batch_size=batch_size)
+            stream = client.bulk_export_stream(pipeline=pipeline)
+            ips = [a.ip for a in stream]
+        assert ips == [r["ip"] for r in records]
+        assert stream.reconnects == 1
+
+    def test_backpressure(self):
+        read = []
+
+        def lines():
+            for i in range(10_000):
+                read.append(i)
+                yield b"{}"
+
+        options = PipelineOptions(batch_size=10, max_pending=3)
+        run = _PipelineRun(lines(), options)
+        try:
+            assert len(run.get()) == 10
+            time.sleep(0.2)
+            assert len(read) <= (options.max_pending + 2) * options.batch_size
+        finally:
+            run.close()
+        run._reader.join(timeout=2)
+        assert not run._reader.is_alive()
+
+    def test_invalid_options(self):
+        with pytest.raises(ValueError):
+            PipelineOptions(batch_size=0)
+
+
+def make_hosts(times: list[list[str]]) -> list[dict]:
+    """Aggregations with one event per time, in the given order."""
+    event = make_events(1)[0]
+    hosts = make_aggregations([1] * len(times))
+    for host, host_times in zip(hosts, times, strict=True):
+        host["events"] = [
+            {**event, "port": str(port), "time": t} for port, t in enumerate(host_times)
+        ]
+    return hosts
+
+
+class TestLastEvent:
+    TIMES = [
+        ["2021-11-02T10:00:00Z", "2021-11-05T10:00:00.5Z", "2021-11-03T10:00:00Z"],
+        ["2021-11-01T10:00:00Z"],
+        [],
+    ]
+
+    def test_keeps_newest_event(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(make_hosts(self.TIMES)))
+            response = client.bulk_export_last_event()
+        assert [[e.port for e in a.events] for a in response.json()] == [
+            ["1"],
+            ["0"],
+            [],
+        ]
+
+    def test_matches_sorting_decoded_events(self):
+        client = Client(api_key="k")
+        times = [["2021-11-02T10:00:00Z", "2021-11-04T10:00:00Z"] * 2 + self.TIMES[0]]
+        body = ndjson(make_hosts(times))
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=body)
+            (full,) = client.bulk_export().json()
+            (reduced,) = list(client.bulk_export_last_event_stream(count=3))
+        expected = sorted(full.events, key=lambda e: e.time, reverse=True)[:3]
+        assert reduced.events == expected
+
+    def test_top_k_with_fields(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(make_hosts(self.TIMES)))
+            response = client.bulk_export_last_event(count=2, fields=["events.port"])
+        assert response.json() == [(["1", "2"],), (["0"],), ([],)]
+
+    def test_invalid_time(self):
+        client = Client(api_key="k")
+        hosts = make_hosts([["2021-11-02T10:00:00Z", "yesterday"]])
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(hosts))
+            with pytest.raises(ValidationError):
+                list(client.bulk_export_last_event_stream())
+
+    def test_invalid_count(self):
+        with pytest.raises(ValueError):
+            Client().bulk_export_last_event_stream(count=0)
+
+    def test_async(self):
+        client = AsyncClient(api_key="k")
+        body = ndjson(make_hosts(self.TIMES))
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text=body)
+            ),
+        )
+
+        async def run():
+            streamed = [a async for a in client.bulk_export_last_event_stream(count=2)]
+            return streamed, await client.bulk_export_last_event()
+
+        streamed, response = asyncio.run(run())
+        assert [[e.port for e in a.events] for a in streamed] == [["1", "2"], ["0"], []]
+        assert [len(a.events) for a in response.json()] == [1, 1, 0]
+
+
+class TestRaw:
+    def test_yields_undecoded_lines(self):
+        client = Client(api_key="k")
+        body = ndjson(make_events(3))
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=body)
+            stream = client.bulk_service_stream(raw=True)
+            lines = list(stream)
+            response = client.bulk_service(raw=True)
+        assert lines == body.encode().splitlines()
+        assert response.json() == lines
+        assert stream.cursor.count == 3
+
+    def test_lines_are_not_parsed(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text="not json\n\n{}\n")
+            assert list(client.bulk_export_stream(raw=True)) == [b"not json", b"{}"]
+
+    def test_write_to(self, tmp_path):
+        client = Client(api_key="k")
+        body = ndjson(make_events(2)).encode() * 1000
+        path = tmp_path / "export.ndjson"
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", content=body)
+            stream = client.bulk_export_stream(raw=True)
+            with open(path, "wb") as f:
+                assert stream.write_to(f) == len(body)
+        assert path.read_bytes() == body
+        assert stream.response.raw.closed
+
+    def test_write_to_after_iteration(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/search", text=ndjson(make_events(2)))
+            stream = client.bulk_export_stream(raw=True)
+            next(stream)
+            with pytest.raises(ValueError):
+                stream.write_to(io.BytesIO())
+
+    def test_does_not_reconnect(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/bulk/service",
+                [{"body": BrokenBody(ndjson(make_events(2)))}],
+            )
+            stream = client.bulk_service_stream(raw=True)
+            with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                list(stream)
+        assert stream.reconnects == 0
+
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"fields": ["ip"]},
+            {"cursor": BulkCursor()},
+            {"pipeline": PipelineOptions()},
+        ],
+    )
+    def test_invalid_combinations(self, options):
+        with pytest.raises(ValueError):
+            Client().bulk_export_stream(raw=True, **options)
+
+    def test_async(self):
+        client = AsyncClient(api_key="k")
+        body = ndjson(make_events(3))
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text=body)
+            ),
+        )
+        out = io.BytesIO()
+
+        async def run():
+            lines = [line async for line in client.bulk_service_stream(raw=True)]
+            response = await client.bulk_export(raw=True)
+            written = await client.bulk_export_stream(raw=True).write_to(out)
+            return lines, response, written
+
+        lines, response, written = asyncio.run(run())
+        assert lines == body.encode().splitlines()
+        assert response.json() == lines
+        assert written == len(body)
+        assert out.getvalue() == body.encode()
+
+
+class TestStats:
+    @staticmethod
+    def stream(records: list[dict], **kwargs):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(records))
+            stream = client.bulk_service_stream(**kwargs)
+            items = list(stream)
+        return stream, items
+
+    def test_counts(self):
+        records = make_events(3)
+        stream, items = self.stream(records)
+        stats = stream.stats
+        assert stats.records == len(items) == 3
+        assert stats.bytes == stats.wire_bytes == len(ndjson(records))
+        assert stats.parse_time > 0
+        assert stats.finished is not None
+        assert stats.records_per_second > 0
+        assert stats.to_dict()["records"] == 3
+
+    def test_progress(self):
+        reports = []
+        progress = ProgressOptions(
+            lambda stats: reports.append(stats.records), interval=0
+        )
+        stream, _ = self.stream(make_events(3), progress=progress)
+        # One report per chunk, read before its records are parsed, and a last one at the end.
+        assert reports == [0, 3]
+
+    def test_interval(self):
+        reports = []
+        progress = ProgressOptions(lambda stats: reports.append(stats), interval=3600)
+        self.stream(make_events(3), progress=progress)
+        assert len(reports) == 1
+
+    def test_pipeline(self):
+        options = PipelineOptions(batch_size=1, max_pending=2)
+        stream, items = self.stream(make_events(5), pipeline=options)
+        assert stream.stats.records == len(items) == 5
+        assert 1 <= stream.stats.peak_queue_depth <= 2
+
+    def test_trace_memory(self):
+        assert not tracemalloc.is_tracing()
+        stream, _ = self.stream(
+            make_events(3), progress=ProgressOptions(trace_memory=True)
+        )
+        assert stream.stats.peak_memory > 0
+        assert not tracemalloc.is_tracing()
+
+    def test_trace_memory_from_first_read_to_end(self):
+        client = Client(api_key="k")
+        progress = ProgressOptions(trace_memory=True)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(3)))
+            stream = client.bulk_service_stream(progress=progress)
+            assert not tracemalloc.is_tracing()
+            next(stream)
+            assert tracemalloc.is_tracing()
+            stream.close()
+        assert not tracemalloc.is_tracing()
+
+    def test_trace_memory_shared_by_streams(self):
+        client = Client(api_key="k")
+        progress = ProgressOptions(trace_memory=True)
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(3)))
+            first = client.bulk_service_stream(progress=progress)
+            second = client.bulk_service_stream(progress=progress)
+            next(first)
+            next(second)
+            first.close()
+            assert tracemalloc.is_tracing()
+            list(second)
+        assert not tracemalloc.is_tracing()
+
+    def test_trace_memory_of_abandoned_stream(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=ndjson(make_events(3)))
+            stream = client.bulk_service_stream(
+                progress=ProgressOptions(trace_memory=True)
+            )
+            next(stream)
+            del stream
+            gc.collect()
+        assert not tracemalloc.is_tracing()
+
+    def test_raw(self):
+        stream, items = self.stream(make_events(2), raw=True)
+        assert stream.stats.records == 2
+        assert stream.stats.parse_time == 0
+
+    def test_async(self):
+        body = ndjson(make_events(3))
+        client = AsyncClient(api_key="k")
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url,
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, text=body)
+            ),
+        )
+        reports = []
+
+        async def run():
+            stream = client.bulk_service_stream(
+                progress=ProgressOptions(reports.append, interval=3600)
+            )
+            return [e async for e in stream], stream
+
+        items, stream = asyncio.run(run())
+        assert stream.stats.records == len(items) == 3
+        assert stream.stats.bytes == stream.stats.wire_bytes == len(body)
+        assert reports == [stream.stats]
+        assert stream.stats.finished is not None
@@ -0,0 +1,128 @@
+import json
+
+import pytest
+import requests_mock
+from l9format import l9format
+
+from leakix import Client
+from leakix.table import EVENT_TABLE_COLUMNS, MISSING_INT, EventTable
+from tests.helpers import load_event
+
+np = pytest.importorskip("numpy")
+
+ROWS = [
+    ("10.0.0.1", "443", "France", "HttpPlugin", "2021-11-03T10:00:00Z"),
+    ("10.0.0.2", "22", "Germany", "SSHOpenPlugin", "2021-11-01T10:00:00Z"),
+    ("10.0.0.3", "443", "France", "SSHOpenPlugin", "2021-11-02T10:00:00Z"),
+    ("10.0.0.4", "80", None, "HttpPlugin", "2021-11-04T10:00:00Z"),
+]
+
+
+def make_events() -> list[dict]:
+    event = load_event()
+    events = []
+    for ip, port, country, plugin, time in ROWS:
+        geoip = {**event["geoip"], "country_name": country}
+        events.append(
+            {
+                **event,
+                "ip": ip,
+                "port": port,
+                "geoip": geoip,
+                "event_source": plugin,
+                "time": time,
+            }
+        )
+    return events
+
+
+class TestEventTable:
+    def test_columns(self):
+        table = EventTable.from_records(make_events(), chunk_size=3)
+        assert len(table) == 4
+        assert table["port"].dtype == np.int64
+        assert table["port"].tolist() == [443, 22, 443, 80]
+        assert table["country"].tolist() == [0, 1, 0, -1]
+        assert table.categories("country") == ["France", "Germany"]
+        assert table.column("country").tolist() == ["France", "Germany", "France", None]
+        assert table["time"][0] == np.datetime64("2021-11-03T10:00:00", "us")
+
+    def test_accepts_models_and_projected_records(self):
+        events = make_events()
+        projection = EVENT_TABLE_COLUMNS.projection
+        from_raw = EventTable.from_records(events)
+        from_models = EventTable.from_records(
+            l9format.L9Event.from_dict(e) for e in events
+        )
+        from_projected = EventTable.from_records(projection(e) for e in events)
+        for name in from_raw.names:
+            assert from_models.column(name).tolist() == from_raw.column(name).tolist()
+            assert (
+                from_projected.column(name).tolist() == from_raw.column(name).tolist()
+            )
+
+    def test_extend(self):
+        events = make_events()
+        table = EventTable().extend(events[:1]).extend(events[1:], chunk_size=1)
+        assert table["ip"].tolist() == [row[0] for row in ROWS]
+        assert table.categories("plugin") == ["HttpPlugin", "SSHOpenPlugin"]
+
+    def test_where_and_filter(self):
+        table = EventTable.from_records(make_events())
+        france = table.where(country="France", port="443")
+        assert france["ip"].tolist() == ["10.0.0.1", "10.0.0.3"]
+        assert table.where(country="Spain")["ip"].tolist() == []
+        assert table.filter(table["port"] > 80)["ip"].tolist() == [
+            "10.0.0.1",
+            "10.0.0.3",
+        ]
+        assert table.filter(table.isin("plugin", ["SSHOpenPlugin"])).column(
+            "plugin"
+        ).tolist() == ["SSHOpenPlugin", "SSHOpenPlugin"]
+        assert table.where(country=None)["ip"].tolist() == ["10.0.0.4"]
+
+    def test_count_by(self):
+        table = EventTable.from_records(make_events())
+        assert table.count_by("country") == {"France": 2, "Germany": 1, None: 1}
+        assert table.count_by("port") == {443: 2, 22: 1, 80: 1}
+
+    def test_sort(self):
+        table = EventTable.from_records(make_events())
+        assert table.sort("time")["ip"].tolist() == [
+            "10.0.0.2",
+            "10.0.0.3",
+            "10.0.0.1",
+            "10.0.0.4",
+        ]
+        assert table.sort("port", descending=True)["ip"].tolist() == [
+            "10.0.0.1",
+            "10.0.0.3",
+            "10.0.0.4",
+            "10.0.0.2",
+        ]
+        assert table.sort("plugin")["ip"].tolist() == [
+            "10.0.0.1",
+            "10.0.0.4",
+            "10.0.0.2",
+            "10.0.0.3",
+        ]
+
+    def test_missing_int(self):
+        events = make_events()
+        events[0]["port"] = "nope"
+        table = EventTable.from_records(events)
+        assert table["port"][0] == MISSING_INT
+
+    def test_from_client_stream(self):
+        client = Client(api_key="k")
+        body = "\n".join(json.dumps(e) for e in make_events())
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/bulk/service", text=body)
+            table = EventTable.from_records(
+                client.bulk_service_stream(fields=EVENT_TABLE_COLUMNS.fields)
+            )
+        assert table.count_by("plugin") == {"HttpPlugin": 2, "SSHOpenPlugin": 2}
+
+    def test_unknown_column(self):
+        with pytest.raises(KeyError):
+            EventTable()["nope"]
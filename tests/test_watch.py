@@ -0,0 +1,189 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+import requests_mock
+
+from leakix import APIError, AsyncClient, Client, WatchState
+from leakix.watch import Watcher, event_hash
+from tests.helpers import load_event
+
+
+def make_event(i: int, day: int = 10, hour: int = 0) -> dict:
+    return {
+        **load_event(),
+        "ip": f"10.0.0.{i}",
+        "time": f"2024-01-{day:02d}T{hour:02d}:00:{i % 60:02d}Z",
+    }
+
+
+class Polls:
+    """Serve one list of pages per poll, recording the queries and pages requested."""
+
+    def __init__(self, *polls: list[list[dict]]) -> None:
+        self.polls = list(polls)
+        self.requests: list[tuple[str, int]] = []
+
+    def handle(self, q: str, page: int) -> list[dict]:
+        if page == 0 and self.requests:
+            self.polls.pop(0)
+        self.requests.append((q, page))
+        pages = self.polls[0]
+        return pages[page] if page < len(pages) else []
+
+
+def params(url: str) -> tuple[str, int]:
+    qs = parse_qs(urlsplit(url).query)
+    return qs["q"][0], int(qs["page"][0])
+
+
+def watch(client: Client, polls: Polls, **kwargs) -> list[str]:
+    with requests_mock.Mocker() as m:
+        m.get(
+            f"{client.base_url}/search",
+            json=lambda request, context: polls.handle(*params(request.url)),
+        )
+        return [e.ip for e in client.watch(interval=0, **kwargs)]
+
+
+class TestWatch:
+    def test_only_new_events(self):
+        client = Client(api_key="k")
+        first = [make_event(2, hour=2), make_event(1, hour=1)]
+        second = [make_event(4, hour=4), make_event(3, hour=3), *first]
+        polls = Polls([first], [second], [second])
+        state = WatchState()
+        ips = watch(client, polls, state=state, max_polls=3)
+        assert ips == ["10.0.0.2", "10.0.0.1", "10.0.0.4", "10.0.0.3"]
+        assert state.high_water == "2024-01-10T04:00:04Z"
+        assert [q for q, _ in polls.requests] == [
+            "*",
+            '+time:>"2024-01-09"',
+            '+time:>"2024-01-09"',
+        ]
+
+    def test_keeps_queries(self):
+        client = Client(api_key="k")
+        polls = Polls([[make_event(1)]], [[make_event(1)]])
+        watch(client, polls, queries="+plugin:GitConfigHttpPlugin", max_polls=2)
+        assert [q for q, _ in polls.requests] == [
+            "+plugin:GitConfigHttpPlugin",
+            '+plugin:GitConfigHttpPlugin +time:>"2024-01-09"',
+        ]
+
+    def test_stops_at_seen_events(self):
+        client = Client(api_key="k")
+        old = [make_event(i, hour=1) for i in range(20)]
+        new = [make_event(i, hour=5) for i in range(20, 30)]
+        polls = Polls([old], [new + old[:10], old[10:]])
+        ips = watch(client, polls, max_polls=2)
+        assert len(ips) == 30
+        assert polls.requests[-1][1] == 0
+
+    def test_walks_pages_of_new_events(self):
+        client = Client(api_key="k")
+        page0 = [make_event(i, hour=5) for i in range(20)]
+        page1 = [make_event(i, hour=4) for i in range(20, 25)]
+        polls = Polls([page0, page1])
+        assert len(watch(client, polls, max_polls=1)) == 25
+        assert [p for _, p in polls.requests] == [0, 1]
+
+    def test_max_pages(self):
+        client = Client(api_key="k")
+        pages = [[make_event(20 * p + i) for i in range(20)] for p in range(3)]
+        polls = Polls(pages)
+        assert len(watch(client, polls, max_polls=1, max_pages=2)) == 40
+
+    def test_resume_from_saved_state(self):
+        client = Client(api_key="k")
+        events = [make_event(2, hour=2), make_event(1, hour=1)]
+        state = WatchState()
+        watch(client, Polls([events]), state=state, max_polls=1)
+        saved = WatchState.from_json(state.to_json())
+        assert saved == state
+        later = [make_event(3, hour=3), *events]
+        assert watch(client, Polls([later]), state=saved, max_polls=1) == ["10.0.0.3"]
+
+    def test_interrupted_poll(self):
+        client = Client(api_key="k")
+        events = [make_event(3, hour=3), make_event(2, hour=2), make_event(1, hour=1)]
+        state = WatchState()
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json=events)
+            it = client.watch(interval=0, state=state)
+            assert next(it).ip == "10.0.0.3"
+            it.close()
+        # The mark only moves once a poll is complete.
+        assert state.high_water is None
+        assert watch(client, Polls([events]), state=state, max_polls=1) == [
+            "10.0.0.2",
+            "10.0.0.1",
+        ]
+
+    def test_error(self):
+        client = Client(api_key="k")
+        with requests_mock.Mocker() as m:
+            m.get(f"{client.base_url}/search", json={"Error": "x"}, status_code=500)
+            with pytest.raises(APIError):
+                next(client.watch(interval=0))
+
+    def test_fields(self):
+        client = Client(api_key="k")
+        polls = Polls([[make_event(1)]])
+        with requests_mock.Mocker() as m:
+            m.get(
+                f"{client.base_url}/search",
+                json=lambda request, context: polls.handle("", 0),
+            )
+            (event,) = client.watch(interval=0, fields=["ip"], max_polls=1)
+        assert event == ("10.0.0.1",)
+
+    def test_async(self):
+        first = [make_event(1, hour=1)]
+        second = [make_event(2, hour=2), *first]
+        polls = Polls([first], [second])
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            params = request.url.params
+            return httpx.Response(
+                200, json=polls.handle(params["q"], int(params["page"]))
+            )
+
+        client = AsyncClient(api_key="k")
+        client._client = httpx.AsyncClient(
+            base_url=client.base_url, transport=httpx.MockTransport(handler)
+        )
+
+        async def run():
+            return [e.ip async for e in client.watch(interval=0, max_polls=2)]
+
+        assert asyncio.run(run()) == ["10.0.0.1", "10.0.0.2"]
+        assert polls.requests[1][0] == '+time:>"2024-01-09"'
+
+
+class TestWatcher:
+    def test_capacity(self):
+        watcher = Watcher(None, capacity=2)
+        watcher.start()
+        events = [make_event(i) for i in range(3)]
+        new, _ = watcher.page(events)
+        for raw in new:
+            watcher.emit(raw)
+        assert list(watcher.state.seen) == [event_hash(e) for e in events[1:]]
+
+    def test_forgets_days_no_longer_requested(self):
+        watcher = Watcher(None)
+        watcher.start()
+        for raw in [make_event(2, day=12), make_event(1, day=11)]:
+            watcher.emit(raw)
+        watcher.finish()
+        assert watcher.state.high_water == "2024-01-12T00:00:02Z"
+        assert list(watcher.state.seen.values()) == ["2024-01-12"]
+
+    def test_duplicates_in_a_page(self):
+        watcher = Watcher(None)
+        watcher.start()
+        new, more = watcher.page([make_event(1), make_event(1)])
+        assert len(new) == 1
+        assert not more